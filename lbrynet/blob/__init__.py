@@ -2,5 +2,8 @@ from lbrynet.cryptoutils import get_lbry_hash_obj
 
 MAX_BLOB_SIZE = 2 * 2 ** 20
 
+# number of leading blob hash characters used to name the subdirectory a blob is stored in
+BLOB_SHARD_PREFIX_LENGTH = 2
+
 # digest_size is in bytes, and blob hashes are hex encoded
 blobhash_length = get_lbry_hash_obj().digest_size * 2
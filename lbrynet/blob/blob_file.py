@@ -11,9 +11,9 @@ from cryptography.hazmat.primitives.padding import PKCS7
 from lbrynet.cryptoutils import backend, get_lbry_hash_obj
 from lbrynet.error import DownloadCancelledError, InvalidBlobHashError, InvalidDataError
 
-from lbrynet.blob import MAX_BLOB_SIZE, blobhash_length
+from lbrynet.blob import MAX_BLOB_SIZE, BLOB_SHARD_PREFIX_LENGTH, blobhash_length
 from lbrynet.blob.blob_info import BlobInfo
-from lbrynet.blob.writer import HashBlobWriter
+from lbrynet.blob.writer import HashBlobWriter, SpillingHashBlobWriter
 
 log = logging.getLogger(__name__)
 
@@ -36,6 +36,137 @@ def is_valid_blobhash(blobhash: str) -> bool:
     return len(blobhash) == blobhash_length and _hexmatch.match(blobhash)
 
 
+def is_valid_blob_shard(name: str) -> bool:
+    return len(name) == BLOB_SHARD_PREFIX_LENGTH and _hexmatch.match(name)
+
+
+def get_blob_shard_dir(blob_dir: str, blob_hash: str) -> str:
+    return os.path.join(blob_dir, blob_hash[:BLOB_SHARD_PREFIX_LENGTH])
+
+
+def get_blob_path(blob_dir: str, blob_hash: str) -> str:
+    """
+    Blobs are stored in a subdirectory named by the first characters of their hash once that directory exists,
+    blobs that haven't been moved there yet (and all blobs in a directory that isn't sharded) are read from and
+    written to the top level of the blob directory
+    """
+    flat_path = os.path.join(blob_dir, blob_hash)
+    shard_dir = get_blob_shard_dir(blob_dir, blob_hash)
+    if os.path.isfile(flat_path) or not os.path.isdir(shard_dir):
+        return flat_path
+    return os.path.join(shard_dir, blob_hash)
+
+
+class BlobFileStore:
+    """
+    Stores every blob in its own file in the blob directory (or in a shard subdirectory of it)
+
+    The blocking methods are meant to be called from an executor
+    """
+
+    TEMP_DIR = "tmp"
+
+    def __init__(self, blob_dir: str):
+        self.blob_dir = blob_dir
+        self.temp_dir = os.path.join(blob_dir, self.TEMP_DIR)  # for blobs being downloaded
+        self.sharded_only = False  # set once every blob is in a shard subdirectory, so the flat path isn't checked
+
+    def setup(self):
+        if not os.path.isdir(self.temp_dir):
+            os.mkdir(self.temp_dir)
+
+    def remove_temp_files(self):
+        """
+        Remove the temporary files left behind by downloads that were interrupted, this must only be called by the
+        process that downloads blobs and before it starts downloading
+        """
+        for item in os.scandir(self.temp_dir):
+            if item.is_file():
+                os.remove(item.path)
+
+    def close(self):
+        pass
+
+    def scan(self) -> typing.Tuple[typing.Set[str], typing.List[str]]:
+        """
+        Returns the set of all the blob hashes in the store and the list of those stored in the top level of the
+        blob directory
+        """
+        in_shards, flat = set(), []
+        for item in os.scandir(self.blob_dir):
+            if is_valid_blobhash(item.name):
+                flat.append(item.name)
+            elif is_valid_blob_shard(item.name) and item.is_dir():
+                in_shards.update(
+                    shard_item.name for shard_item in os.scandir(item.path) if is_valid_blobhash(shard_item.name)
+                )
+        return in_shards.union(flat), flat
+
+    def get_blob_path(self, blob_hash: str) -> str:
+        if self.sharded_only:
+            return os.path.join(get_blob_shard_dir(self.blob_dir, blob_hash), blob_hash)
+        return get_blob_path(self.blob_dir, blob_hash)
+
+    def _at_blob_path(self, blob_hash: str, func: typing.Callable[[str], typing.Any]):
+        # call func with the path of the blob, while blobs are being moved into the shards one can move between
+        # finding its path and using it, so the other path is tried as well
+        path = self.get_blob_path(blob_hash)
+        try:
+            return func(path)
+        except FileNotFoundError:
+            if self.sharded_only:
+                raise
+            flat_path = os.path.join(self.blob_dir, blob_hash)
+            if path != flat_path:
+                raise
+            return func(os.path.join(get_blob_shard_dir(self.blob_dir, blob_hash), blob_hash))
+
+    def get_length(self, blob_hash: str) -> typing.Optional[int]:
+        """
+        Get the length of a stored blob, or None if it isn't stored
+        """
+        try:
+            return self._at_blob_path(blob_hash, lambda path: os.stat(path).st_size)
+        except FileNotFoundError:
+            return
+
+    def write(self, blob_hash: str, blob_bytes: bytes):
+        with open(self.get_blob_path(blob_hash), 'wb') as write_handle:
+            write_handle.write(blob_bytes)
+
+    def write_file(self, blob_hash: str, temp_path: str):
+        """
+        Store a verified blob from a temporary file in the blob directory, the temporary file is moved or removed
+        """
+        os.replace(temp_path, self.get_blob_path(blob_hash))
+
+    def read(self, blob_hash: str) -> bytes:
+        def _read(path: str) -> bytes:
+            with open(path, 'rb') as handle:
+                return handle.read()
+        return self._at_blob_path(blob_hash, _read)
+
+    def open(self, blob_hash: str) -> typing.Tuple[typing.BinaryIO, int, int]:
+        """
+        Open a blob for sending, returns the file handle and the offset and length of the blob in it. The caller is
+        responsible for closing the handle.
+        """
+        handle = self._at_blob_path(blob_hash, lambda path: open(path, 'rb'))
+        return handle, 0, os.fstat(handle.fileno()).st_size
+
+    def delete(self, blob_hash: str):
+        try:
+            self._at_blob_path(blob_hash, os.remove)
+        except FileNotFoundError:
+            pass
+
+    def compact(self) -> int:
+        """
+        Reclaim the space used by deleted blobs, returns the number of bytes freed
+        """
+        return 0
+
+
 def encrypt_blob_bytes(key: bytes, iv: bytes, unencrypted: bytes) -> typing.Tuple[bytes, str]:
     cipher = Cipher(AES(key), modes.CBC(iv), backend=backend)
     padder = PKCS7(AES.block_size).padder()
@@ -57,30 +188,37 @@ class BlobFile:
 
     def __init__(self, loop: asyncio.BaseEventLoop, blob_dir: str, blob_hash: str,
                  length: typing.Optional[int] = None,
-                 blob_completed_callback: typing.Optional[typing.Callable[['BlobFile'], typing.Awaitable]] = None):
+                 blob_completed_callback: typing.Optional[typing.Callable[['BlobFile'], typing.Awaitable]] = None,
+                 store: typing.Optional[BlobFileStore] = None, spill_to_disk: typing.Optional[bool] = False):
         if not is_valid_blobhash(blob_hash):
             raise InvalidBlobHashError(blob_hash)
         self.loop = loop
         self.blob_hash = blob_hash
         self.length = length
         self.blob_dir = blob_dir
-        self.file_path = os.path.join(blob_dir, self.blob_hash)
+        self.store = store or BlobFileStore(blob_dir)
+        self.spill_to_disk = spill_to_disk
         self.writers: typing.List[HashBlobWriter] = []
+        self.readers = 0
 
         self.verified: asyncio.Event = asyncio.Event(loop=self.loop)
         self.finished_writing = asyncio.Event(loop=loop)
         self.blob_write_lock = asyncio.Lock(loop=loop)
-        if self.file_exists:
-            length = int(os.stat(os.path.join(blob_dir, blob_hash)).st_size)
-            self.length = length
+        stored_length = self.store.get_length(blob_hash)
+        if stored_length is not None:
+            self.length = stored_length
             self.verified.set()
             self.finished_writing.set()
         self.saved_verified_blob = False
         self.blob_completed_callback = blob_completed_callback
 
+    @property
+    def file_path(self) -> str:
+        return self.store.get_blob_path(self.blob_hash)
+
     @property
     def file_exists(self):
-        return os.path.isfile(self.file_path)
+        return self.store.get_length(self.blob_hash) is not None
 
     def writer_finished(self, writer: HashBlobWriter):
         def callback(finished: asyncio.Future):
@@ -94,7 +232,10 @@ class BlobFile:
                 while self.writers:
                     other = self.writers.pop()
                     other.finished.cancel()
-                t = self.loop.create_task(self.save_verified_blob(writer, finished.result()))
+                if isinstance(writer, SpillingHashBlobWriter):
+                    t = self.loop.create_task(self.save_verified_blob_file(writer, finished.result()))
+                else:
+                    t = self.loop.create_task(self.save_verified_blob(writer, finished.result()))
                 t.add_done_callback(lambda *_: self.finished_writing.set())
                 return
             if isinstance(error, (InvalidBlobHashError, InvalidDataError)):
@@ -107,10 +248,9 @@ class BlobFile:
     async def save_verified_blob(self, writer, verified_bytes: bytes):
         def _save_verified():
             # log.debug(f"write blob file {self.blob_hash[:8]} from {writer.peer.address}")
-            if not self.saved_verified_blob and not os.path.isfile(self.file_path):
+            if not self.saved_verified_blob and not self.file_exists:
                 if self.get_length() == len(verified_bytes):
-                    with open(self.file_path, 'wb') as write_handle:
-                        write_handle.write(verified_bytes)
+                    self.store.write(self.blob_hash, verified_bytes)
                     self.saved_verified_blob = True
                 else:
                     raise Exception("length mismatch")
@@ -123,22 +263,62 @@ class BlobFile:
                 await self.blob_completed_callback(self)
             self.verified.set()
 
+    async def save_verified_blob_file(self, writer, temp_path: str):
+        def _save_verified():
+            if not self.saved_verified_blob and not self.file_exists:
+                if self.get_length() == os.stat(temp_path).st_size:
+                    self.store.write_file(self.blob_hash, temp_path)
+                    self.saved_verified_blob = True
+                else:
+                    os.remove(temp_path)
+                    raise Exception("length mismatch")
+            else:
+                os.remove(temp_path)
+
+        async with self.blob_write_lock:
+            if self.verified.is_set():
+                await self.loop.run_in_executor(None, os.remove, temp_path)
+                return
+            await self.loop.run_in_executor(None, _save_verified)
+            if self.blob_completed_callback:
+                await self.blob_completed_callback(self)
+            self.verified.set()
+
     def open_for_writing(self) -> HashBlobWriter:
         if self.file_exists:
             raise OSError(f"File already exists '{self.file_path}'")
         fut = asyncio.Future(loop=self.loop)
-        writer = HashBlobWriter(self.blob_hash, self.get_length, fut)
+        if self.spill_to_disk:
+            writer = SpillingHashBlobWriter(self.blob_hash, self.get_length, fut, self.store.temp_dir)
+        else:
+            writer = HashBlobWriter(self.blob_hash, self.get_length, fut)
         self.writers.append(writer)
         fut.add_done_callback(self.writer_finished(writer))
         return writer
 
-    async def sendfile(self, writer: asyncio.StreamWriter) -> int:
+    async def sendfile(self, writer: asyncio.StreamWriter,
+                       throttle: typing.Optional[typing.Callable[[int], typing.Awaitable]] = None,
+                       chunk_size: int = 2 ** 16) -> int:
         """
         Read and send the file to the writer and return the number of bytes sent
+
+        If given, `throttle` is awaited with the size of each chunk of `chunk_size` bytes before it is sent
         """
 
-        with open(self.file_path, 'rb') as handle:
-            return await self.loop.sendfile(writer.transport, handle, count=self.get_length())
+        self.readers += 1
+        try:
+            handle, offset, length = await self.loop.run_in_executor(None, self.store.open, self.blob_hash)
+            with handle:
+                if not throttle:
+                    return await self.loop.sendfile(writer.transport, handle, offset=offset, count=length)
+                sent = 0
+                while sent < length:
+                    count = min(chunk_size, length - sent)
+                    await throttle(count)
+                    sent += await self.loop.sendfile(writer.transport, handle, offset=offset + sent, count=count)
+                return sent
+        finally:
+            self.readers -= 1
 
     def close(self):
         while self.writers:
@@ -147,19 +327,24 @@ class BlobFile:
     def delete(self):
         self.close()
         self.saved_verified_blob = False
-        if os.path.isfile(self.file_path):
-            os.remove(self.file_path)
+        self.store.delete(self.blob_hash)
         self.verified.clear()
         self.finished_writing.clear()
         self.length = None
 
+    def get_blob_bytes(self) -> bytes:
+        """
+        Read the stored blob
+        """
+
+        return self.store.read(self.blob_hash)
+
     def decrypt(self, key: bytes, iv: bytes) -> bytes:
         """
         Decrypt a BlobFile to plaintext bytes
         """
 
-        with open(self.file_path, "rb") as f:
-            buff = f.read()
+        buff = self.get_blob_bytes()
         if len(buff) != self.length:
             raise ValueError("unexpected length")
         cipher = Cipher(AES(key), modes.CBC(iv), backend=backend)
@@ -169,14 +354,15 @@ class BlobFile:
 
     @classmethod
     async def create_from_unencrypted(cls, loop: asyncio.BaseEventLoop, blob_dir: str, key: bytes,
-                                      iv: bytes, unencrypted: bytes, blob_num: int) -> BlobInfo:
+                                      iv: bytes, unencrypted: bytes, blob_num: int,
+                                      store: typing.Optional[BlobFileStore] = None) -> BlobInfo:
         """
         Create an encrypted BlobFile from plaintext bytes
         """
 
         blob_bytes, blob_hash = encrypt_blob_bytes(key, iv, unencrypted)
         length = len(blob_bytes)
-        blob = cls(loop, blob_dir, blob_hash, length)
+        blob = cls(loop, blob_dir, blob_hash, length, store=store)
         writer = blob.open_for_writing()
         writer.write(blob_bytes)
         await blob.verified.wait()
@@ -1,9 +1,15 @@
 import os
+import time
 import typing
 import asyncio
 import logging
+from collections import OrderedDict
+from lbrynet.conf import Config
 from lbrynet.extras.daemon.storage import SQLiteStorage
-from lbrynet.blob.blob_file import BlobFile, is_valid_blobhash
+from lbrynet.blob import BLOB_SHARD_PREFIX_LENGTH
+from lbrynet.blob.blob_file import BlobFile, BlobFileStore, is_valid_blobhash, get_blob_shard_dir
+from lbrynet.blob.segment_store import SegmentBlobStore
+from lbrynet.blob.memory_cache import BlobMemoryCache
 from lbrynet.stream.descriptor import StreamDescriptor
 
 if typing.TYPE_CHECKING:
@@ -11,51 +17,217 @@ if typing.TYPE_CHECKING:
 
 log = logging.getLogger(__name__)
 
+def make_blob_store(config: Config, blob_dir: str) -> BlobFileStore:
+    if config.blob_storage == 'files':
+        return BlobFileStore(blob_dir)
+    elif config.blob_storage == 'segments':
+        return SegmentBlobStore(blob_dir, config.blob_segment_size * 2**20)
+    raise ValueError(f"unknown blob storage: {config.blob_storage}")
+
 
 class BlobFileManager:
+    SHARD_MIGRATION_BATCH_SIZE = 1000
+    RECONCILE_BATCH_SIZE = 1000
+    DISK_QUOTA_BATCH_SIZE = 1000
+    DISK_QUOTA_INTERVAL = 60
+    STREAM_BLOBS_CACHE_SIZE = 1000
+
     def __init__(self, loop: asyncio.BaseEventLoop, blob_dir: str, storage: SQLiteStorage,
-                 node_data_store: typing.Optional['DictDataStore'] = None):
+                 node_data_store: typing.Optional['DictDataStore'] = None, config: typing.Optional[Config] = None):
         """
         This class stores blobs on the hard disk
 
         blob_dir - directory where blobs are stored
         storage - SQLiteStorage object
+        config - Config object, defaults are used if not given
         """
         self.loop = loop
         self.blob_dir = blob_dir
         self.storage = storage
+        self.config = config or Config()
+        self.store = make_blob_store(self.config, blob_dir)
+        self.memory_cache = BlobMemoryCache(int(self.config.hot_blob_cache_size * 2**20))
+        self.stream_blob_hashes: typing.Dict[str, typing.List[str]] = OrderedDict()  # sd_hash: data blob hashes
         self._node_data_store = node_data_store
         self.completed_blob_hashes: typing.Set[str] = set() if not self._node_data_store\
             else self._node_data_store.completed_blobs
-        self.blobs: typing.Dict[str, BlobFile] = {}
+        self.blobs: typing.Dict[str, BlobFile] = OrderedDict()
+        self.shard_migration_task: typing.Optional[asyncio.Task] = None
+        self.compaction_task: typing.Optional[asyncio.Task] = None
+        self.reconcile_task: typing.Optional[asyncio.Task] = None
+        self.disk_quota_task: typing.Optional[asyncio.Task] = None
+        self.blob_access: typing.Dict[str, typing.Tuple[int, int]] = {}  # blob_hash: (last access time, uploads)
+        # called with (blob_hash, completed) when a blob is completed or a completed blob is removed
+        self.blob_listeners: typing.List[typing.Callable[[str, bool], None]] = []
 
     async def setup(self) -> bool:
-        def get_files_in_blob_dir() -> typing.Set[str]:
-            return {
-                item.name for item in os.scandir(self.blob_dir) if is_valid_blobhash(item.name)
-            }
-
-        in_blobfiles_dir = await self.loop.run_in_executor(None, get_files_in_blob_dir)
-        self.completed_blob_hashes.update(await self.storage.sync_missing_blobs(in_blobfiles_dir))
+        await self.loop.run_in_executor(None, self.store.setup)
+        await self.loop.run_in_executor(None, self.store.remove_temp_files)
+        if self.config.fast_blob_manager_startup:
+            self.completed_blob_hashes.update(await self.storage.get_all_finished_blobs())
+            self.reconcile_task = self.loop.create_task(self.reconcile_completed_blobs())
+        else:
+            in_blobfiles_dir, flat_blob_hashes = await self.loop.run_in_executor(None, self.store.scan)
+            self.completed_blob_hashes.update(await self.storage.sync_missing_blobs(in_blobfiles_dir))
+            if self.config.shard_blob_dir:
+                self.shard_migration_task = self.loop.create_task(self.migrate_to_sharded_layout(flat_blob_hashes))
+        if self.config.blob_storage_limit:
+            self.disk_quota_task = self.loop.create_task(self.run_disk_quota())
         return True
 
+    def _get_missing_blobs(self, blob_hashes: typing.List[str]) -> typing.List[str]:
+        return [blob_hash for blob_hash in blob_hashes if self.store.get_length(blob_hash) is None]
+
+    async def reconcile_completed_blobs(self) -> int:
+        """
+        Check the completed blobs loaded from the database against the blob directory after a fast startup. Blobs
+        that are missing are marked as pending again, returns the number of missing blobs.
+        """
+        completed_at_startup = set(self.completed_blob_hashes)
+        in_blobfiles_dir, flat_blob_hashes = await self.loop.run_in_executor(None, self.store.scan)
+        if self.config.shard_blob_dir:
+            self.shard_migration_task = self.loop.create_task(self.migrate_to_sharded_layout(flat_blob_hashes))
+        maybe_missing = list(completed_at_startup.difference(in_blobfiles_dir))
+        missing = []
+        # check again in case they were written after the scan
+        for start in range(0, len(maybe_missing), self.RECONCILE_BATCH_SIZE):
+            missing.extend(await self.loop.run_in_executor(
+                None, self._get_missing_blobs, maybe_missing[start:start + self.RECONCILE_BATCH_SIZE]
+            ))
+        if missing:
+            for blob_hash in missing:
+                self.completed_blob_hashes.discard(blob_hash)
+                self._notify_blob_listeners(blob_hash, False)
+            await self.storage.set_blobs_pending(missing)
+            log.warning("%i completed blobs are missing from the blob directory", len(missing))
+        log.info("checked %i completed blobs against the blob directory", len(completed_at_startup))
+        return len(missing)
+
+    def _make_shard_dirs(self):
+        for i in range(16 ** BLOB_SHARD_PREFIX_LENGTH):
+            shard_dir = os.path.join(self.blob_dir, format(i, f'0{BLOB_SHARD_PREFIX_LENGTH}x'))
+            if not os.path.isdir(shard_dir):
+                os.mkdir(shard_dir)
+
+    def _move_blobs_to_shards(self, blob_hashes: typing.List[str]) -> int:
+        moved = 0
+        for blob_hash in blob_hashes:
+            flat_path = os.path.join(self.blob_dir, blob_hash)
+            if not os.path.isfile(flat_path):
+                continue
+            os.replace(flat_path, os.path.join(get_blob_shard_dir(self.blob_dir, blob_hash), blob_hash))
+            moved += 1
+        return moved
+
+    def _is_blob_being_written(self, blob_hash: str) -> bool:
+        blob = self.blobs.get(blob_hash)
+        return blob is not None and (bool(blob.writers) or blob.blob_write_lock.locked())
+
+    async def migrate_to_sharded_layout(self, flat_blob_hashes: typing.List[str]):
+        """
+        Move blobs stored directly in the blob directory into their shard subdirectory, in small batches so
+        blobs keep being served while the migration runs. Once the shard directories exist new blobs are
+        written into them, and blobs that haven't been moved yet are still found at their old path.
+        """
+        await self.loop.run_in_executor(None, self._make_shard_dirs)
+        if flat_blob_hashes:
+            log.info("moving %i blobs into blob directory shards", len(flat_blob_hashes))
+        moved = 0
+        skipped = []
+        for start in range(0, len(flat_blob_hashes), self.SHARD_MIGRATION_BATCH_SIZE):
+            batch = []
+            for blob_hash in flat_blob_hashes[start:start + self.SHARD_MIGRATION_BATCH_SIZE]:
+                (skipped if self._is_blob_being_written(blob_hash) else batch).append(blob_hash)
+            moved += await self.loop.run_in_executor(None, self._move_blobs_to_shards, batch)
+        if flat_blob_hashes:
+            log.info("moved %i/%i blobs into blob directory shards", moved, len(flat_blob_hashes))
+        if not skipped:
+            # every blob is in its shard now, stop looking for blobs at the top level of the blob directory
+            self.store.sharded_only = True
+        return moved
+
     def stop(self):
+        if self.shard_migration_task and not self.shard_migration_task.done():
+            self.shard_migration_task.cancel()
+        self.shard_migration_task = None
+        if self.reconcile_task and not self.reconcile_task.done():
+            self.reconcile_task.cancel()
+        self.reconcile_task = None
+        if self.disk_quota_task and not self.disk_quota_task.done():
+            self.disk_quota_task.cancel()
+        self.disk_quota_task = None
+        self.blob_access.clear()
+        self.memory_cache.clear()
+        self.stream_blob_hashes.clear()
+        if self.compaction_task and not self.compaction_task.done():
+            self.compaction_task.cancel()
+        self.compaction_task = None
         while self.blobs:
             _, blob = self.blobs.popitem()
             blob.close()
         self.completed_blob_hashes.clear()
+        self.store.close()
 
     def get_blob(self, blob_hash, length: typing.Optional[int] = None):
         if blob_hash in self.blobs:
+            self.blobs.move_to_end(blob_hash)
             if length and self.blobs[blob_hash].length is None:
                 self.blobs[blob_hash].set_length(length)
-        else:
-            self.blobs[blob_hash] = BlobFile(self.loop, self.blob_dir, blob_hash, length, self.blob_completed)
-        return self.blobs[blob_hash]
+            return self.blobs[blob_hash]
+        blob = BlobFile(
+            self.loop, self.blob_dir, blob_hash, length, self.blob_completed, self.store,
+            self.config.spill_blob_writes_to_disk
+        )
+        self.blobs[blob_hash] = blob
+        self._evict_blobs()
+        return blob
+
+    @staticmethod
+    def _is_blob_pinned(blob: BlobFile) -> bool:
+        return bool(blob.writers) or blob.readers > 0 or blob.blob_write_lock.locked()
+
+    def _evict_blobs(self):
+        # drop the least recently used blob objects over the cache size, skipping those being written or read
+        to_evict = len(self.blobs) - self.config.blob_cache_size
+        if to_evict <= 0:
+            return
+        evicted = []
+        for blob_hash, blob in self.blobs.items():
+            if len(evicted) == to_evict:
+                break
+            if not self._is_blob_pinned(blob):
+                evicted.append(blob_hash)
+        for blob_hash in evicted:
+            del self.blobs[blob_hash]
+
+    def is_blob_verified(self, blob_hash: str) -> bool:
+        """
+        Check if a blob is verified without creating a BlobFile for it
+        """
+        if blob_hash in self.blobs:
+            return self.blobs[blob_hash].get_is_verified()
+        return blob_hash in self.completed_blob_hashes
 
     def get_stream_descriptor(self, sd_hash):
         return StreamDescriptor.from_stream_descriptor_blob(self.loop, self.blob_dir, self.get_blob(sd_hash))
 
+    async def get_stream_availability(self, sd_hash: str) -> typing.Optional[typing.List[bool]]:
+        """
+        Get which of the data blobs of a stream are completed, in order. Returns None if the stream isn't known.
+        """
+        if sd_hash in self.stream_blob_hashes:
+            self.stream_blob_hashes.move_to_end(sd_hash)
+        else:
+            stream_hash = await self.storage.get_stream_hash_for_sd_hash(sd_hash)
+            if not stream_hash:
+                return
+            blob_infos = await self.storage.get_blobs_for_stream(stream_hash)
+            self.stream_blob_hashes[sd_hash] = [blob_info.blob_hash for blob_info in blob_infos
+                                                if blob_info.blob_hash]
+            while len(self.stream_blob_hashes) > self.STREAM_BLOBS_CACHE_SIZE:
+                self.stream_blob_hashes.popitem(last=False)
+        return [self.is_blob_verified(blob_hash) for blob_hash in self.stream_blob_hashes[sd_hash]]
+
     async def blob_completed(self, blob: BlobFile):
         if blob.blob_hash is None:
             raise Exception("Blob hash is None")
@@ -63,24 +235,36 @@ class BlobFileManager:
             raise Exception("Blob has a length of 0")
         if blob.blob_hash not in self.completed_blob_hashes:
             self.completed_blob_hashes.add(blob.blob_hash)
-        await self.storage.add_completed_blob(blob.blob_hash, blob.length)
+            self._notify_blob_listeners(blob.blob_hash, True)
+        if self.blobs.get(blob.blob_hash, blob) is not blob:
+            # the blob object was evicted while it was being downloaded and a new one was made since
+            self.blobs[blob.blob_hash] = blob
+        if self.storage.write_behind:
+            # written with the next batch of queued blob updates, closing the storage writes any that are left
+            self.storage.add_completed_blob(blob.blob_hash, blob.length)
+        else:
+            await self.storage.add_completed_blob(blob.blob_hash, blob.length)
+
+    def _notify_blob_listeners(self, blob_hash: str, completed: bool):
+        for listener in self.blob_listeners:
+            listener(blob_hash, completed)
 
     def check_completed_blobs(self, blob_hashes: typing.List[str]) -> typing.List[str]:
         """Returns of the blobhashes_to_check, which are valid"""
-        blobs = [self.get_blob(b) for b in blob_hashes]
-        return [blob.blob_hash for blob in blobs if blob.get_is_verified()]
+        return [blob_hash for blob_hash in blob_hashes if self.is_blob_verified(blob_hash)]
 
     def delete_blob(self, blob_hash: str):
         if not is_valid_blobhash(blob_hash):
             raise Exception("invalid blob hash to delete")
 
+        self.memory_cache.remove(blob_hash)
         if blob_hash not in self.blobs:
-            if os.path.isfile(os.path.join(self.blob_dir, blob_hash)):
-                os.remove(os.path.join(self.blob_dir, blob_hash))
+            self.store.delete(blob_hash)
         else:
             self.blobs.pop(blob_hash).delete()
-            if blob_hash in self.completed_blob_hashes:
-                self.completed_blob_hashes.remove(blob_hash)
+        if blob_hash in self.completed_blob_hashes:
+            self.completed_blob_hashes.remove(blob_hash)
+            self._notify_blob_listeners(blob_hash, False)
 
     async def delete_blobs(self, blob_hashes: typing.List[str], delete_from_db: typing.Optional[bool] = True):
         for blob_hash in blob_hashes:
@@ -88,3 +272,78 @@ class BlobFileManager:
 
         if delete_from_db:
             await self.storage.delete_blobs_from_db(blob_hashes)
+        if blob_hashes and (not self.compaction_task or self.compaction_task.done()):
+            self.compaction_task = self.loop.create_task(self.compact_store())
+
+    async def set_blobs_pending(self, blob_hashes: typing.List[str]):
+        """
+        Delete blobs from the blob store but keep them in the database as pending, so they can be downloaded again
+        """
+        await self.delete_blobs(blob_hashes, delete_from_db=False)
+        await self.storage.set_blobs_pending(blob_hashes)
+
+    async def get_hot_blob_bytes(self, blob_hash: str) -> typing.Optional[bytes]:
+        """
+        Get the contents of a blob from the memory cache, a blob that has become hot is read into the cache.
+        Returns None if the blob isn't (or can't be) cached, it should be read from the store instead.
+        """
+        if not self.memory_cache.enabled:
+            return
+        blob_bytes = self.memory_cache.get(blob_hash)
+        if blob_bytes is None and self.memory_cache.is_hot(blob_hash) and blob_hash in self.completed_blob_hashes:
+            try:
+                blob_bytes = await self.loop.run_in_executor(None, self.store.read, blob_hash)
+            except OSError:
+                return
+            if blob_hash in self.completed_blob_hashes:  # make sure it wasn't deleted while being read
+                self.memory_cache.put(blob_hash, blob_bytes)
+        return blob_bytes
+
+    def record_blob_access(self, blob_hash: str, uploaded: typing.Optional[bool] = False):
+        if not self.config.blob_storage_limit:
+            return  # the accesses are only flushed and used by the disk quota
+        _, uploads = self.blob_access.get(blob_hash, (0, 0))
+        self.blob_access[blob_hash] = (int(time.time()), uploads + int(uploaded))
+
+    async def flush_blob_access(self):
+        if not self.blob_access:
+            return
+        accesses = [(blob_hash, access_time, uploads) for blob_hash, (access_time, uploads) in self.blob_access.items()]
+        self.blob_access.clear()
+        await self.storage.update_blob_access(accesses)
+
+    async def enforce_disk_quota(self) -> int:
+        """
+        Delete the least recently used and least uploaded blobs until the stored blobs fit in blob_storage_limit,
+        returns the number of bytes freed. Blobs being written or read and the sd and head blobs of our streams
+        are kept.
+        """
+        await self.flush_blob_access()
+        over_limit = await self.storage.get_stored_blobs_length() - self.config.blob_storage_limit * 2**20
+        freed = 0
+        while freed < over_limit:
+            to_delete = []
+            for blob_hash, length in await self.storage.get_coldest_blobs(self.DISK_QUOTA_BATCH_SIZE):
+                if freed >= over_limit:
+                    break
+                if blob_hash in self.blobs and self._is_blob_pinned(self.blobs[blob_hash]):
+                    continue
+                to_delete.append(blob_hash)
+                freed += length
+            if not to_delete:
+                break
+            await self.set_blobs_pending(to_delete)
+        if freed:
+            log.info("deleted %i bytes of blobs to stay under the blob storage limit", freed)
+        return freed
+
+    async def run_disk_quota(self):
+        while True:
+            await self.enforce_disk_quota()
+            await asyncio.sleep(self.DISK_QUOTA_INTERVAL, loop=self.loop)
+
+    async def compact_store(self) -> int:
+        """
+        Reclaim the space left behind by deleted blobs, if the blob store keeps any
+        """
+        return await self.loop.run_in_executor(None, self.store.compact)
@@ -0,0 +1,97 @@
+import time
+import asyncio
+import typing
+import logging
+from lbrynet.cryptoutils import get_lbry_hash_obj
+if typing.TYPE_CHECKING:
+    from lbrynet.blob.blob_manager import BlobFileManager
+
+log = logging.getLogger(__name__)
+
+
+class BlobScrubber:
+    """
+    Re-hashes the completed blobs in the background to find blobs that were corrupted on disk, corrupt blobs are
+    deleted and marked as pending so that they get downloaded again
+    """
+
+    READ_SIZE = 2 ** 16
+    PASS_INTERVAL = 24 * 60 * 60
+
+    def __init__(self, loop: asyncio.BaseEventLoop, blob_manager: 'BlobFileManager', rate_limit: float):
+        self.loop = loop
+        self.blob_manager = blob_manager
+        self.rate_limit = rate_limit  # bytes per second
+        self.scrub_task: typing.Optional[asyncio.Task] = None
+        self.blobs_to_scrub = 0
+        self.scrubbed_blobs = 0
+        self.corrupt_blobs = 0
+        self.finished_passes = 0
+        self.last_pass_finished: typing.Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return self.scrub_task is not None and not self.scrub_task.done()
+
+    def hash_blob(self, blob_hash: str) -> typing.Tuple[typing.Optional[str], int]:
+        """
+        Hash a stored blob, returns the hash and the number of bytes read. The hash is None if the blob is missing.
+        """
+        try:
+            handle, offset, length = self.blob_manager.store.open(blob_hash)
+        except FileNotFoundError:
+            return None, 0
+        hashsum = get_lbry_hash_obj()
+        read = 0
+        with handle:
+            handle.seek(offset)
+            while read < length:
+                data = handle.read(min(self.READ_SIZE, length - read))
+                if not data:
+                    break
+                hashsum.update(data)
+                read += len(data)
+        return hashsum.hexdigest(), read
+
+    async def scrub_blob(self, blob_hash: str) -> int:
+        """
+        Check a blob and mark it pending if it's corrupt, returns the number of bytes read
+        """
+        calculated_hash, read = await self.loop.run_in_executor(None, self.hash_blob, blob_hash)
+        if calculated_hash != blob_hash and blob_hash in self.blob_manager.completed_blob_hashes:
+            log.warning("blob %s is corrupt (%i bytes on disk), marking it pending", blob_hash[:8], read)
+            self.corrupt_blobs += 1
+            await self.blob_manager.set_blobs_pending([blob_hash])
+        return read
+
+    async def scrub(self):
+        """
+        Check every completed blob once, reading at most rate_limit bytes per second
+        """
+        to_scrub = list(self.blob_manager.completed_blob_hashes)
+        self.blobs_to_scrub, self.scrubbed_blobs = len(to_scrub), 0
+        log.info("checking %i blobs for corruption", len(to_scrub))
+        for blob_hash in to_scrub:
+            if blob_hash in self.blob_manager.completed_blob_hashes:
+                started = self.loop.time()
+                read = await self.scrub_blob(blob_hash)
+                await asyncio.sleep(max(0.0, read / self.rate_limit - (self.loop.time() - started)), loop=self.loop)
+            self.scrubbed_blobs += 1
+        self.finished_passes += 1
+        self.last_pass_finished = time.time()
+        log.info("finished checking %i blobs for corruption", len(to_scrub))
+
+    async def _scrub_loop(self):
+        while True:
+            await self.scrub()
+            await asyncio.sleep(self.PASS_INTERVAL, loop=self.loop)
+
+    def start(self):
+        if self.running:
+            raise Exception("already running")
+        self.scrub_task = self.loop.create_task(self._scrub_loop())
+
+    def stop(self):
+        if self.running:
+            self.scrub_task.cancel()
+        self.scrub_task = None
@@ -0,0 +1,61 @@
+import typing
+from collections import OrderedDict
+
+
+class BlobMemoryCache:
+    """
+    Least recently used cache of the contents of hot blobs, holding at most `max_size` bytes
+
+    A blob is hot once it has been asked for `admit_after` times while not cached, so blobs that are only uploaded
+    once don't push the popular ones out.
+    """
+
+    RECENT_REQUESTS_SIZE = 4096
+
+    def __init__(self, max_size: int, admit_after: int = 2):
+        self.max_size = max_size
+        self.admit_after = admit_after
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.blobs: typing.Dict[str, bytes] = OrderedDict()
+        self._recent_requests: typing.Dict[str, int] = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def get(self, blob_hash: str) -> typing.Optional[bytes]:
+        blob_bytes = self.blobs.get(blob_hash)
+        if blob_bytes is not None:
+            self.blobs.move_to_end(blob_hash)
+            self.hits += 1
+            return blob_bytes
+        self.misses += 1
+        self._recent_requests[blob_hash] = self._recent_requests.pop(blob_hash, 0) + 1
+        while len(self._recent_requests) > self.RECENT_REQUESTS_SIZE:
+            self._recent_requests.popitem(last=False)
+
+    def is_hot(self, blob_hash: str) -> bool:
+        return self._recent_requests.get(blob_hash, 0) >= self.admit_after
+
+    def put(self, blob_hash: str, blob_bytes: bytes):
+        if len(blob_bytes) > self.max_size:
+            return
+        self.remove(blob_hash)
+        self._recent_requests.pop(blob_hash, None)
+        self.blobs[blob_hash] = blob_bytes
+        self.size += len(blob_bytes)
+        while self.size > self.max_size:
+            _, evicted = self.blobs.popitem(last=False)
+            self.size -= len(evicted)
+
+    def remove(self, blob_hash: str):
+        blob_bytes = self.blobs.pop(blob_hash, None)
+        if blob_bytes is not None:
+            self.size -= len(blob_bytes)
+
+    def clear(self):
+        self.blobs.clear()
+        self._recent_requests.clear()
+        self.size = 0
@@ -0,0 +1,267 @@
+import os
+import typing
+import sqlite3
+import logging
+import threading
+from lbrynet.blob.blob_file import BlobFileStore
+
+log = logging.getLogger(__name__)
+
+
+class SegmentBlobStore(BlobFileStore):
+    """
+    Appends blobs to large segment files in the 'segments' subdirectory of the blob directory. The segment, offset
+    and length of each blob are kept in a sqlite index in the same directory and in memory for fast lookups.
+
+    Space used by deleted blobs is reclaimed by compact(), which copies the live blobs out of segments that are
+    mostly dead and deletes those segments. Blobs stored in their own file (for example blobs created by publishing
+    before the store was enabled) are still found and served from there.
+    """
+
+    SEGMENTS_DIR = "segments"
+    COMPACT_DEAD_RATIO = 0.5
+
+    def __init__(self, blob_dir: str, max_segment_size: int = 1024 * 2 ** 20):
+        super().__init__(blob_dir)
+        self.segments_dir = os.path.join(blob_dir, self.SEGMENTS_DIR)
+        self.max_segment_size = max_segment_size
+        self.index: typing.Dict[str, typing.Tuple[int, int, int]] = {}  # blob_hash: (segment, offset, length)
+        self.db: typing.Optional[sqlite3.Connection] = None
+        self.active_segment: typing.Optional[int] = None
+        self.active_segment_size = 0  # including the space taken by writes that haven't finished yet
+        self.writing: typing.Dict[int, int] = {}  # segment: number of blobs being written to it
+        self.adding: typing.Set[str] = set()  # blobs being written
+        self.lock = threading.RLock()
+        self.compact_lock = threading.Lock()
+        self.closing = False
+
+    def get_segment_path(self, segment: int) -> str:
+        return os.path.join(self.segments_dir, "%08i.segment" % segment)
+
+    def setup(self):
+        super().setup()
+        if not os.path.isdir(self.segments_dir):
+            os.mkdir(self.segments_dir)
+        self.db = sqlite3.connect(os.path.join(self.segments_dir, "index.sqlite"), check_same_thread=False)
+        self.db.executescript("""
+            pragma journal_mode=WAL;
+            create table if not exists blob_segment (
+                blob_hash char(96) primary key not null,
+                segment integer not null,
+                offset integer not null,
+                length integer not null
+            );
+        """)
+        self.index = {
+            blob_hash: (segment, offset, length)
+            for blob_hash, segment, offset, length in self.db.execute("select * from blob_segment")
+        }
+        segments = [
+            int(name.split('.')[0]) for name in os.listdir(self.segments_dir) if name.endswith('.segment')
+        ]
+        self.active_segment = max(segments) if segments else 0
+        active_path = self.get_segment_path(self.active_segment)
+        self.active_segment_size = os.stat(active_path).st_size if os.path.isfile(active_path) else 0
+        self.closing = False
+
+    def close(self):
+        # a running compaction stops after the blob it is copying, wait for it before closing the index
+        self.closing = True
+        with self.compact_lock:
+            with self.lock:
+                if self.db:
+                    self.db.close()
+                    self.db = None
+
+    def scan(self) -> typing.Tuple[typing.Set[str], typing.List[str]]:
+        in_files, flat = super().scan()
+        with self.lock:
+            return in_files.union(self.index), flat
+
+    def get_length(self, blob_hash: str) -> typing.Optional[int]:
+        entry = self.index.get(blob_hash)
+        if entry:
+            return entry[2]
+        return super().get_length(blob_hash)
+
+    def _reserve_space(self, length: int) -> typing.Tuple[int, int]:
+        # returns the segment and offset to write a blob to, the lock must be held
+        if self.active_segment_size and self.active_segment_size + length > self.max_segment_size:
+            self.active_segment += 1
+            self.active_segment_size = 0
+        offset = self.active_segment_size
+        self.active_segment_size += length
+        return self.active_segment, offset
+
+    def _write_at(self, segment: int, offset: int, blob: typing.Union[bytes, typing.BinaryIO]):
+        # writes go to the space reserved for them, so writes to the same segment don't need the lock
+        fd = os.open(self.get_segment_path(segment), os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            chunks = [blob] if isinstance(blob, bytes) else iter(lambda: blob.read(2 ** 20), b'')
+            for chunk in chunks:
+                view = memoryview(chunk)
+                while view:
+                    written = os.pwrite(fd, view, offset)
+                    offset += written
+                    view = view[written:]
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def write(self, blob_hash: str, blob_bytes: bytes):
+        self._add(blob_hash, blob_bytes, len(blob_bytes))
+
+    def write_file(self, blob_hash: str, temp_path: str):
+        with open(temp_path, 'rb') as temp_handle:
+            self._add(blob_hash, temp_handle, os.fstat(temp_handle.fileno()).st_size)
+        os.remove(temp_path)
+
+    def _add(self, blob_hash: str, blob: typing.Union[bytes, typing.BinaryIO], length: int):
+        """
+        Write the blob into the active segment, only the space for it is reserved and the index updated while
+        holding the lock so opening and reading blobs doesn't wait for the write
+        """
+        with self.lock:
+            if blob_hash in self.index or blob_hash in self.adding:
+                return
+            segment, offset = self._reserve_space(length)
+            self.adding.add(blob_hash)
+            self.writing[segment] = self.writing.get(segment, 0) + 1
+        try:
+            self._write_at(segment, offset, blob)
+            with self.lock:
+                self.db.execute(
+                    "insert or replace into blob_segment values (?, ?, ?, ?)", (blob_hash, segment, offset, length)
+                )
+                self.db.commit()
+                self.index[blob_hash] = (segment, offset, length)
+        finally:
+            with self.lock:
+                self.adding.discard(blob_hash)
+                self.writing[segment] -= 1
+                if not self.writing[segment]:
+                    del self.writing[segment]
+
+    def read(self, blob_hash: str) -> bytes:
+        entry = self.index.get(blob_hash)
+        if not entry:
+            return super().read(blob_hash)
+        handle, offset, length = self.open(blob_hash)
+        with handle:
+            handle.seek(offset)
+            return handle.read(length)
+
+    def open(self, blob_hash: str) -> typing.Tuple[typing.BinaryIO, int, int]:
+        with self.lock:
+            entry = self.index.get(blob_hash)
+            if not entry:
+                return super().open(blob_hash)
+            segment, offset, length = entry
+            # open while holding the lock so compaction can't remove the segment in between
+            return open(self.get_segment_path(segment), 'rb'), offset, length
+
+    def delete(self, blob_hash: str):
+        with self.lock:
+            if blob_hash in self.index:
+                del self.index[blob_hash]
+                self.db.execute("delete from blob_segment where blob_hash=?", (blob_hash, ))
+                self.db.commit()
+        super().delete(blob_hash)
+
+    def get_segment_usage(self) -> typing.Dict[int, typing.Tuple[int, int]]:
+        """
+        Returns {segment: (live bytes, total bytes)} for every segment file
+        """
+        with self.lock:
+            live = {}
+            for segment, _, length in self.index.values():
+                live[segment] = live.get(segment, 0) + length
+            return {
+                segment: (live.get(segment, 0), os.stat(self.get_segment_path(segment)).st_size)
+                for segment in [
+                    int(name.split('.')[0]) for name in os.listdir(self.segments_dir) if name.endswith('.segment')
+                ]
+            }
+
+    def _reserve_segment(self) -> int:
+        # returns a new segment for compaction to copy blobs into, writers move on to the segment after it
+        with self.lock:
+            segment = self.active_segment + 1
+            self.active_segment = segment + 1
+            self.active_segment_size = 0
+            return segment
+
+    def compact(self) -> int:
+        """
+        Copy the live blobs out of mostly dead segments and delete those segments, returns the number of bytes freed.
+
+        The blobs are copied into a segment of their own without holding the lock, so writes and deletes aren't
+        blocked by the copy. The lock is only taken to point the index at the copies of the blobs that are still
+        live and unchanged, and to remove the old segment.
+        """
+        with self.compact_lock:
+            with self.lock:
+                # segments still being written to aren't compacted until the writes are done
+                candidates = [
+                    (segment, live_bytes, total_bytes)
+                    for segment, (live_bytes, total_bytes) in sorted(self.get_segment_usage().items())
+                    if segment < self.active_segment and segment not in self.writing and total_bytes and
+                    (total_bytes - live_bytes) / total_bytes >= self.COMPACT_DEAD_RATIO
+                ]
+            if not candidates:
+                return 0
+            freed = 0
+            target = self._reserve_segment()
+            target_handle = open(self.get_segment_path(target), 'ab')
+            try:
+                for segment, live_bytes, total_bytes in candidates:
+                    if self.closing:
+                        break
+                    with self.lock:
+                        to_move = [
+                            (blob_hash, (blob_segment, offset, length))
+                            for blob_hash, (blob_segment, offset, length) in self.index.items()
+                            if blob_segment == segment
+                        ]
+                    copied = []
+                    with open(self.get_segment_path(segment), 'rb') as old_segment:
+                        for blob_hash, entry in to_move:
+                            if self.closing:
+                                break
+                            _, offset, length = entry
+                            if target_handle.tell() and target_handle.tell() + length > self.max_segment_size:
+                                target_handle.flush()
+                                os.fsync(target_handle.fileno())
+                                target_handle.close()
+                                target = self._reserve_segment()
+                                target_handle = open(self.get_segment_path(target), 'ab')
+                            old_segment.seek(offset)
+                            new_offset = target_handle.tell()
+                            target_handle.write(old_segment.read(length))
+                            copied.append((blob_hash, entry, (target, new_offset, length)))
+                    if self.closing:
+                        # leave the segment as it is, the partial copies are dead space in the target
+                        break
+                    target_handle.flush()
+                    os.fsync(target_handle.fileno())
+                    with self.lock:
+                        # skip blobs that were deleted (or deleted and written again) while being copied
+                        moved = [
+                            (blob_hash, new_entry) for blob_hash, old_entry, new_entry in copied
+                            if self.index.get(blob_hash) == old_entry
+                        ]
+                        self.db.executemany(
+                            "insert or replace into blob_segment values (?, ?, ?, ?)",
+                            [(blob_hash, ) + new_entry for blob_hash, new_entry in moved]
+                        )
+                        self.db.commit()
+                        self.index.update(moved)
+                        os.remove(self.get_segment_path(segment))
+                    freed += total_bytes - live_bytes
+                    log.info("compacted blob segment %i, moved %i blobs and freed %i bytes", segment, len(moved),
+                             total_bytes - live_bytes)
+            finally:
+                target_handle.close()
+                if not os.path.getsize(self.get_segment_path(target)):
+                    os.remove(self.get_segment_path(target))
+            return freed
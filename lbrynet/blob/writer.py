@@ -1,6 +1,8 @@
+import os
 import typing
 import logging
 import asyncio
+import tempfile
 from io import BytesIO
 from lbrynet.error import InvalidBlobHashError, InvalidDataError
 from lbrynet.cryptoutils import get_lbry_hash_obj
@@ -58,10 +60,38 @@ class HashBlobWriter:
                     f"blob hash is {blob_hash} vs expected {self.expected_blob_hash}"
                 ))
             elif self.finished and not (self.finished.done() or self.finished.cancelled()):
-                self.finished.set_result(self.buffer.getvalue())
+                self.finished.set_result(self.get_result())
             self.close_handle()
 
+    def get_result(self):
+        return self.buffer.getvalue()
+
     def close_handle(self):
         if self.buffer is not None:
             self.buffer.close()
             self.buffer = None
+
+
+class SpillingHashBlobWriter(HashBlobWriter):
+    """
+    Writes the blob into a temporary file in the temporary directory of the blob store as it is received rather
+    than holding it in memory. The finished future is set to the path of the temporary file once the blob hash is
+    verified, the temporary file is removed if the blob is invalid or the download is cancelled.
+    """
+
+    def __init__(self, expected_blob_hash: str, get_length: typing.Callable[[], int],
+                 finished: asyncio.Future, temp_dir: str):
+        fd, self.temp_path = tempfile.mkstemp(prefix=expected_blob_hash[:16] + '.', suffix='.tmp', dir=temp_dir)
+        self.temp_verified = False
+        super().__init__(expected_blob_hash, get_length, finished)
+        self.buffer = os.fdopen(fd, 'wb')
+
+    def get_result(self) -> str:
+        self.buffer.close()
+        self.temp_verified = True
+        return self.temp_path
+
+    def close_handle(self):
+        super().close_handle()
+        if not self.temp_verified and os.path.isfile(self.temp_path):
+            os.remove(self.temp_path)
@@ -3,16 +3,20 @@ import logging
 import typing
 import binascii
 from lbrynet.error import InvalidBlobHashError, InvalidDataError
-from lbrynet.blob_exchange.serialization import BlobResponse, BlobRequest
+from lbrynet.blob.writer import HashBlobWriter
+from lbrynet.blob_exchange.serialization import BlobResponse, BlobRequest, BinaryFrame, BINARY_FRAMING
 if typing.TYPE_CHECKING:
     from lbrynet.blob.blob_file import BlobFile
-    from lbrynet.blob.writer import HashBlobWriter
 
 log = logging.getLogger(__name__)
 
 
 class BlobExchangeClientProtocol(asyncio.Protocol):
-    def __init__(self, loop: asyncio.BaseEventLoop, peer_timeout: typing.Optional[float] = 10):
+    def __init__(self, loop: asyncio.BaseEventLoop, peer_timeout: typing.Optional[float] = 10,
+                 binary_framing: typing.Optional[bool] = None):
+        """
+        :param binary_framing: if the peer understands binary frames, None to ask it with the first blob request
+        """
         self.loop = loop
         self.peer_port: typing.Optional[int] = None
         self.peer_address: typing.Optional[str] = None
@@ -24,7 +28,15 @@ class BlobExchangeClientProtocol(asyncio.Protocol):
 
         self._blob_bytes_received = 0
         self._response_fut: asyncio.Future = None
-        self.buf = b''
+        self._pipelined_requests = 0  # number of requests sent ahead of the one being received
+        self.buf = bytearray()
+        self._scanned = 0  # bytes at the start of the buffer known not to contain the end of the response
+        self.binary_framing = binary_framing
+        self._framing_requested = False
+        self._binary_response = False  # if the response being received is binary framed
+        self.closed_by_peer = False  # if the peer closed the connection rather than us
+        # if we closed the connection because another download finished the blob first, which isn't the peer's fault
+        self.finished_elsewhere = False
 
     def data_received(self, data: bytes):
         log.debug("%s:%d -- got %s bytes -- %s bytes on buffer -- %s blob bytes received",
@@ -35,17 +47,31 @@ class BlobExchangeClientProtocol(asyncio.Protocol):
             if self._response_fut and not self._response_fut.done():
                 self._response_fut.cancel()
             return
-        if self._blob_bytes_received and not self.writer.closed():
-            return self._write(data)
+        if not self._response_fut or (self._response_fut.done() and (not self.writer or self.writer.closed())):
+            # the current request is done, hold on to the bytes for the next pipelined request
+            self.buf.extend(data)
+            return
+        if self._response_fut.done():
+            # the response was received, the rest is blob data
+            return self._write(memoryview(data))
 
-        response = BlobResponse.deserialize(self.buf + data)
-        if not response.responses and not self._response_fut.done():
-            self.buf += data
+        self.buf.extend(data)
+        try:
+            response, header_length = self._parse_response()
+        except ValueError as err:
+            log.warning("invalid response from %s:%i: %s", self.peer_address, self.peer_port, err)
+            self._response_fut.set_exception(InvalidDataError(str(err)))
             return
-        else:
-            self.buf = b''
+        if not response:
+            return
+        if self._framing_requested:
+            framing_response = response.get_framing_response()
+            self.binary_framing = bool(framing_response and framing_response.framing == BINARY_FRAMING)
+            self._framing_requested = False
+        # swap in a new buffer, any bytes received past the end of this blob go into it
+        buf, self.buf, self._scanned = self.buf, bytearray(), 0
 
-        if response.responses and self.blob:
+        if self.blob:
             blob_response = response.get_blob_response()
             if blob_response and not blob_response.error and blob_response.blob_hash == self.blob.blob_hash:
                 # set the expected length for the incoming blob if we didn't know it
@@ -54,22 +80,44 @@ class BlobExchangeClientProtocol(asyncio.Protocol):
                 # the server started sending a blob we didn't request
                 log.warning("mismatch with self.blob %s", self.blob.blob_hash)
                 return
-        if response.responses:
-            log.debug("got response from %s:%i <- %s", self.peer_address, self.peer_port, response.to_dict())
-            # fire the Future with the response to our request
-            self._response_fut.set_result(response)
-        if response.blob_data and self.writer and not self.writer.closed():
-            # log.debug("got %i blob bytes from %s:%i", len(response.blob_data), self.peer_address, self.peer_port)
+        log.debug("got response from %s:%i <- %s", self.peer_address, self.peer_port, response.to_dict())
+        # fire the Future with the response to our request
+        self._response_fut.set_result(response)
+        if len(buf) > header_length and self.writer and not self.writer.closed():
             # write blob bytes if we're writing a blob and have blob bytes to write
-            self._write(response.blob_data)
+            self._write(memoryview(buf)[header_length:])
+
+    def _parse_response(self) -> typing.Tuple[typing.Optional[BlobResponse], int]:
+        if self._binary_response:
+            frame, used = BinaryFrame.deserialize(self.buf)
+            if not frame:
+                return None, 0
+            return BlobResponse.from_frame(frame), used
+        response, header_length = BlobResponse.deserialize_header(self.buf, self._scanned)
+        if not response:
+            self._scanned = len(self.buf)
+        return response, header_length
 
+    def _make_blob_request(self, blob_hash: str) -> bytes:
+        self._binary_response = bool(self.binary_framing)
+        if self._binary_response:
+            return BinaryFrame.make_blob_request(blob_hash)
+        if self.binary_framing is None:
+            self._framing_requested = True
+        return BlobRequest.make_request_for_blob_hash(
+            blob_hash, request_binary_framing=self.binary_framing is None
+        ).serialize()
 
-    def _write(self, data):
-        if len(data) > (self.blob.get_length() - self._blob_bytes_received):
-            data = data[:(self.blob.get_length() - self._blob_bytes_received)]
-            log.warning("got more than asked from %s:%d, probable sendfile bug", self.peer_address, self.peer_port)
-        else:
-            data = data
+    def _write(self, data: memoryview):
+        remaining = self.blob.get_length() - self._blob_bytes_received
+        if len(data) > remaining:
+            if self._pipelined_requests:
+                # the rest is the response to the next request
+                self.buf.extend(data[remaining:])
+            else:
+                log.warning("got more than asked from %s:%d, probable sendfile bug", self.peer_address,
+                            self.peer_port)
+            data = data[:remaining]
         self._blob_bytes_received += len(data)
         try:
             self.writer.write(data)
@@ -82,15 +130,14 @@ class BlobExchangeClientProtocol(asyncio.Protocol):
             if self._response_fut and not self._response_fut.done():
                 self._response_fut.set_exception(err)
 
-    async def _download_blob(self) -> typing.Tuple[int, typing.Optional[asyncio.Transport]]:
+    async def _download_blob(self, send_request: bool = True) -> typing.Tuple[int, typing.Optional[asyncio.Transport]]:
         """
         :return: download success (bool), keep connection (bool)
         """
-        request = BlobRequest.make_request_for_blob_hash(self.blob.blob_hash)
         try:
-            msg = request.serialize()
-            log.debug("send request to %s:%i -> %s", self.peer_address, self.peer_port, msg.decode())
-            self.transport.write(msg)
+            if send_request:
+                log.debug("send request for %s to %s:%i", self.blob.blob_hash[:8], self.peer_address, self.peer_port)
+                self.transport.write(self._make_blob_request(self.blob.blob_hash))
             response: BlobResponse = await asyncio.wait_for(self._response_fut, self.peer_timeout, loop=self.loop)
             availability_response = response.get_availability_response()
             price_response = response.get_price_response()
@@ -122,7 +169,18 @@ class BlobExchangeClientProtocol(asyncio.Protocol):
                 f" timeout in {self.peer_timeout}"
             log.debug(msg)
             msg = f"downloaded {self.blob.blob_hash[:8]} from {self.peer_address}:{self.peer_port}"
-            await asyncio.wait_for(self.writer.finished, self.peer_timeout, loop=self.loop)
+            finished = self.writer.finished
+            await asyncio.wait([finished], timeout=self.peer_timeout, loop=self.loop)
+            if not finished.done():
+                finished.cancel()
+                raise asyncio.TimeoutError()
+            if finished.cancelled():
+                # another download finished the blob first, the rest of it is still on its way so drop the connection
+                log.debug("%s was downloaded elsewhere before %s:%i finished sending it", self.blob.blob_hash[:8],
+                          self.peer_address, self.peer_port)
+                self.finished_elsewhere = True
+                return self._blob_bytes_received, self.close()
+            finished.result()
             log.info(msg)
             # await self.blob.finished_writing.wait()  not necessary, but a dangerous change. TODO: is it needed?
             return self._blob_bytes_received, self.transport
@@ -138,20 +196,37 @@ class BlobExchangeClientProtocol(asyncio.Protocol):
         if self.writer and not self.writer.closed():
             self.writer.close_handle()
         self._response_fut = None
+        self._pipelined_requests = 0
+        self._framing_requested = False
         self.writer = None
         self.blob = None
         if self.transport:
             self.transport.close()
         self.transport = None
-        self.buf = b''
+        self.buf, self._scanned = bytearray(), 0
+
+    @staticmethod
+    def _needs_download(blob: 'BlobFile') -> bool:
+        return not (blob.get_is_verified() or blob.file_exists or blob.blob_write_lock.locked())
 
-    async def download_blob(self, blob: 'BlobFile') -> typing.Tuple[int, typing.Optional[asyncio.Transport]]:
-        if blob.get_is_verified() or blob.file_exists or blob.blob_write_lock.locked():
+    async def download_blob(self, blob: 'BlobFile',
+                            pipelined: bool = False) -> typing.Tuple[int, typing.Optional[asyncio.Transport]]:
+        if not pipelined and not self._needs_download(blob):
             return 0, self.transport
         try:
-            self.blob, self.writer, self._blob_bytes_received = blob, blob.open_for_writing(), 0
+            if pipelined and (blob.get_is_verified() or blob.file_exists):
+                # the blob was finished elsewhere since it was requested, the response still has to be read
+                writer = HashBlobWriter(blob.blob_hash, blob.get_length, asyncio.Future(loop=self.loop))
+            else:
+                writer = blob.open_for_writing()
+            self.blob, self.writer, self._blob_bytes_received = blob, writer, 0
             self._response_fut = asyncio.Future(loop=self.loop)
-            return await self._download_blob()
+            if self.buf:
+                self.data_received(b'')  # the response may have arrived before we got to this request
+            return await self._download_blob(send_request=not pipelined)
+        except ConnectionError:
+            self.close()
+            return self._blob_bytes_received, None
         except OSError as e:
             log.error("race happened downloading from %s:%i", self.peer_address, self.peer_port)
             # i'm not sure how to fix this race condition - jack
@@ -166,6 +241,62 @@ class BlobExchangeClientProtocol(asyncio.Protocol):
             self.close()
             raise
 
+    async def download_blobs(self, blobs: typing.List['BlobFile']) -> typing.Tuple[typing.List[int],
+                                                                                  typing.Optional[asyncio.Transport]]:
+        """
+        Send the requests for all of the blobs at once and receive the responses in order, the server
+        starts sending the next blob as soon as the previous one is sent rather than waiting a round trip
+        """
+        received = [0 for _ in blobs]
+        to_request = [i for i, blob in enumerate(blobs) if self._needs_download(blob)]
+        if not to_request:
+            return received, self.transport
+        self.buf, self._scanned = bytearray(), 0
+        msg = b''.join(self._make_blob_request(blobs[i].blob_hash) for i in to_request)
+        log.debug("send %i pipelined requests to %s:%i", len(to_request), self.peer_address, self.peer_port)
+        self.transport.write(msg)
+        self._pipelined_requests = len(to_request)
+        for i in to_request:
+            self._pipelined_requests -= 1
+            received[i], transport = await self.download_blob(blobs[i], pipelined=True)
+            if not transport:
+                return received, None
+        return received, self.transport
+
+    async def request_stream_availability(self, sd_hash: str) -> typing.Tuple[typing.Optional[typing.List[bool]],
+                                                                            typing.Optional[asyncio.Transport]]:
+        """
+        Ask which of the blobs of a stream the peer has, returns None for the availability if the peer
+        doesn't support the request
+        """
+        self.buf, self._scanned = bytearray(), 0
+        self._response_fut = asyncio.Future(loop=self.loop)
+        request = BlobRequest.make_request_for_stream_availability(sd_hash)
+        log.debug("send request to %s:%i -> %s", self.peer_address, self.peer_port, request.to_dict())
+        self._binary_response = bool(self.binary_framing)
+        msg = BinaryFrame.make_message(request) if self._binary_response else request.serialize()
+        try:
+            self.transport.write(msg)
+            response: BlobResponse = await asyncio.wait_for(self._response_fut, self.peer_timeout, loop=self.loop)
+        except (asyncio.TimeoutError, ConnectionError):
+            return None, self.close()
+        except asyncio.CancelledError:
+            self.close()
+            raise
+        availability_response = response.get_stream_availability_response()
+        if not availability_response:
+            log.debug("%s:%i doesn't support stream availability requests", self.peer_address, self.peer_port)
+            return None, self.transport
+        if availability_response.sd_hash != sd_hash:
+            log.warning("stream availability response doesn't match our request from %s:%i",
+                        self.peer_address, self.peer_port)
+            return None, self.close()
+        try:
+            return availability_response.get_available(), self.transport
+        except (ValueError, binascii.Error):
+            log.warning("invalid stream availability bitmap from %s:%i", self.peer_address, self.peer_port)
+            return None, self.close()
+
     def connection_made(self, transport: asyncio.Transport):
         self.transport = transport
         self.peer_address, self.peer_port = self.transport.get_extra_info('peername')
@@ -174,31 +305,80 @@ class BlobExchangeClientProtocol(asyncio.Protocol):
     def connection_lost(self, reason):
         log.debug("connection lost to %s:%i (reason: %s, %s)", self.peer_address, self.peer_port, str(reason),
                   str(type(reason)))
+        self.closed_by_peer = self.transport is not None  # close() lets go of the transport before closing it
+        if self._response_fut and not self._response_fut.done():
+            self._response_fut.set_exception(ConnectionResetError("connection lost"))
         self.close()
 
 
 async def request_blob(loop: asyncio.BaseEventLoop, blob: 'BlobFile', address: str, tcp_port: int,
                        peer_connect_timeout: float, blob_download_timeout: float,
-                       connected_transport: asyncio.Transport = None)\
+                       connected_transport: asyncio.Transport = None,
+                       protocol: typing.Optional[BlobExchangeClientProtocol] = None)\
         -> typing.Tuple[int, typing.Optional[asyncio.Transport]]:
     """
     Returns [<downloaded blob>, <keep connection>]
     """
 
-    protocol = BlobExchangeClientProtocol(loop, blob_download_timeout)
-    if connected_transport and not connected_transport.is_closing():
-        connected_transport.set_protocol(protocol)
-        protocol.connection_made(connected_transport)
-        log.debug("reusing connection for %s:%d", address, tcp_port)
-    else:
-        connected_transport = None
+    protocol = protocol or BlobExchangeClientProtocol(loop, blob_download_timeout)
     try:
-        if not connected_transport:
-            await asyncio.wait_for(loop.create_connection(lambda: protocol, address, tcp_port),
-                                   peer_connect_timeout, loop=loop)
+        connected_transport = await _connect(loop, protocol, address, tcp_port, peer_connect_timeout,
+                                             connected_transport)
         if blob.get_is_verified() or blob.file_exists:
             # file exists but not verified means someone is writing right now, give it time, come back later
             return 0, connected_transport
         return await protocol.download_blob(blob)
     except (asyncio.TimeoutError, ConnectionRefusedError, ConnectionAbortedError, OSError):
         return 0, None
+
+
+async def request_blobs(loop: asyncio.BaseEventLoop, blobs: typing.List['BlobFile'], address: str, tcp_port: int,
+                        peer_connect_timeout: float, blob_download_timeout: float,
+                        connected_transport: asyncio.Transport = None,
+                        protocol: typing.Optional[BlobExchangeClientProtocol] = None)\
+        -> typing.Tuple[typing.List[int], typing.Optional[asyncio.Transport]]:
+    """
+    Pipeline the requests for several blobs over one connection
+
+    Returns [<bytes received for each blob>, <keep connection>]
+    """
+
+    protocol = protocol or BlobExchangeClientProtocol(loop, blob_download_timeout)
+    try:
+        await _connect(loop, protocol, address, tcp_port, peer_connect_timeout, connected_transport)
+        return await protocol.download_blobs(blobs)
+    except (asyncio.TimeoutError, ConnectionRefusedError, ConnectionAbortedError, OSError):
+        return [0 for _ in blobs], None
+
+
+async def request_stream_availability(loop: asyncio.BaseEventLoop, sd_hash: str, address: str, tcp_port: int,
+                                      peer_connect_timeout: float, peer_timeout: float,
+                                      connected_transport: asyncio.Transport = None,
+                                      protocol: typing.Optional[BlobExchangeClientProtocol] = None)\
+        -> typing.Tuple[typing.Optional[typing.List[bool]], typing.Optional[asyncio.Transport]]:
+    """
+    Returns [<which blobs of the stream the peer has>, <keep connection>]
+    """
+
+    protocol = protocol or BlobExchangeClientProtocol(loop, peer_timeout)
+    try:
+        await _connect(loop, protocol, address, tcp_port, peer_connect_timeout, connected_transport)
+        return await protocol.request_stream_availability(sd_hash)
+    except (asyncio.TimeoutError, ConnectionRefusedError, ConnectionAbortedError, OSError):
+        return None, None
+
+
+async def _connect(loop: asyncio.BaseEventLoop, protocol: BlobExchangeClientProtocol, address: str, tcp_port: int,
+                   peer_connect_timeout: float, connected_transport: asyncio.Transport = None)\
+        -> typing.Optional[asyncio.Transport]:
+    if connected_transport and not connected_transport.is_closing():
+        previous_protocol = connected_transport.get_protocol()
+        if protocol.binary_framing is None and isinstance(previous_protocol, BlobExchangeClientProtocol):
+            # the framing was negotiated by an earlier request on the connection
+            protocol.binary_framing = previous_protocol.binary_framing
+        connected_transport.set_protocol(protocol)
+        protocol.connection_made(connected_transport)
+        log.debug("reusing connection for %s:%d", address, tcp_port)
+        return connected_transport
+    await asyncio.wait_for(loop.create_connection(lambda: protocol, address, tcp_port),
+                           peer_connect_timeout, loop=loop)
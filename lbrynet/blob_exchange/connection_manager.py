@@ -0,0 +1,210 @@
+import socket
+import asyncio
+import typing
+import logging
+from lbrynet.blob_exchange.client import BlobExchangeClientProtocol, request_blob, request_blobs
+from lbrynet.blob_exchange.client import request_stream_availability
+from lbrynet.blob_exchange.peer_quality import PeerQualityStore
+if typing.TYPE_CHECKING:
+    from lbrynet.blob.blob_file import BlobFile
+
+log = logging.getLogger(__name__)
+
+
+class ConnectionManager:
+    """
+    Pool of blob exchange connections shared by every blob download in the daemon
+
+    Connections are kept open after a request and reused by the next request to the same peer, regardless of
+    which download made it. The number of connections to a single peer is limited and connections left idle
+    for longer than `idle_timeout` are closed. The speed, connect latency and failures of every peer are
+    recorded in `peer_quality`.
+    """
+
+    def __init__(self, loop: asyncio.BaseEventLoop, max_connections_per_peer: int = 4, idle_timeout: float = 30.0):
+        self.loop = loop
+        self.max_connections_per_peer = max_connections_per_peer
+        self.idle_timeout = idle_timeout
+        self.idle: typing.Dict[typing.Tuple[str, int], typing.List[typing.Tuple[asyncio.Transport, float]]] = {}
+        self.active: typing.Dict[typing.Tuple[str, int], int] = {}
+        self.peer_quality = PeerQualityStore(loop)
+        self.unpipelined_peers: typing.Set[typing.Tuple[str, int]] = set()
+        self._slots: typing.Dict[typing.Tuple[str, int], asyncio.Semaphore] = {}
+        self._idle_check: typing.Optional[asyncio.Handle] = None
+
+    @property
+    def idle_connections(self) -> int:
+        return sum(len(transports) for transports in self.idle.values())
+
+    @property
+    def active_connections(self) -> int:
+        return sum(self.active.values())
+
+    def get_score(self, address: str, tcp_port: int) -> float:
+        return self.peer_quality.get_score(address, tcp_port)
+
+    def _get_idle_transport(self, key: typing.Tuple[str, int]) -> typing.Optional[asyncio.Transport]:
+        transports = self.idle.get(key, [])
+        while transports:
+            transport, _ = transports.pop()
+            if not transport.is_closing():
+                return transport
+        self.idle.pop(key, None)
+
+    def _put_idle_transport(self, key: typing.Tuple[str, int], transport: asyncio.Transport):
+        self.idle.setdefault(key, []).append((transport, self.loop.time()))
+        if not self._idle_check:
+            self._idle_check = self.loop.call_later(self.idle_timeout, self.close_idle_connections)
+
+    def close_idle_connections(self):
+        self._idle_check = None
+        now = self.loop.time()
+        next_check = None
+        for key in list(self.idle.keys()):
+            keep = []
+            for transport, idle_since in self.idle[key]:
+                if transport.is_closing():
+                    continue
+                if now - idle_since >= self.idle_timeout:
+                    log.debug("closing idle connection to %s:%i", *key)
+                    transport.close()
+                    continue
+                keep.append((transport, idle_since))
+                next_check = idle_since if next_check is None else min(next_check, idle_since)
+            if keep:
+                self.idle[key] = keep
+            else:
+                del self.idle[key]
+                if not self.active.get(key):
+                    self._slots.pop(key, None)
+        if next_check is not None:
+            self._idle_check = self.loop.call_later(
+                max(0.0, next_check + self.idle_timeout - now), self.close_idle_connections
+            )
+
+    async def _connect(self, address: str, tcp_port: int,
+                       peer_connect_timeout: float) -> typing.Optional[asyncio.Transport]:
+        start = self.loop.time()
+        try:
+            transport, _ = await asyncio.wait_for(
+                self.loop.create_connection(asyncio.Protocol, address, tcp_port), peer_connect_timeout, loop=self.loop
+            )
+        except (asyncio.TimeoutError, OSError):
+            self.peer_quality.record_failure(address, tcp_port)
+            return
+        self.peer_quality.record_connect(address, tcp_port, self.loop.time() - start)
+        sock = transport.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        return transport
+
+    async def _request(self, address: str, tcp_port: int, peer_connect_timeout: float,
+                       protocol: BlobExchangeClientProtocol,
+                       make_request: typing.Callable[[asyncio.Transport], typing.Awaitable],
+                       score: bool = True):
+        """
+        Make a request with `protocol` over an idle connection to the peer or a new one, returns None if the peer
+        can't be connected to
+        """
+        key = (address, tcp_port)
+        if key not in self._slots:
+            self._slots[key] = asyncio.Semaphore(self.max_connections_per_peer, loop=self.loop)
+        slot = self._slots[key]
+        async with slot:
+            self.active[key] = self.active.get(key, 0) + 1
+            try:
+                connected_transport = self._get_idle_transport(key) or \
+                                      await self._connect(address, tcp_port, peer_connect_timeout)
+                if not connected_transport:
+                    return
+                start = self.loop.time()
+                received, transport = await make_request(connected_transport)
+                if transport and not transport.is_closing():
+                    self._put_idle_transport(key, transport)
+                if score:
+                    bytes_received = received if isinstance(received, int) else sum(received)
+                    if not transport and not protocol.finished_elsewhere:
+                        self.peer_quality.record_failure(address, tcp_port)
+                    elif bytes_received:
+                        self.peer_quality.record_download(address, tcp_port, bytes_received,
+                                                          self.loop.time() - start)
+                return received, transport
+            finally:
+                self.active[key] -= 1
+                if not self.active[key]:
+                    del self.active[key]
+
+    async def request_blob(self, blob: 'BlobFile', address: str, tcp_port: int, peer_connect_timeout: float,
+                           blob_download_timeout: float) -> typing.Tuple[int, typing.Optional[asyncio.Transport]]:
+        """
+        Request a blob over a pooled connection, waits for a free slot if the peer connection limit is reached
+
+        Returns [<bytes received>, <connection kept>], the kept connection is returned to the pool and
+        should not be used by the caller.
+        """
+        protocol = BlobExchangeClientProtocol(self.loop, blob_download_timeout)
+        return await self._request(
+            address, tcp_port, peer_connect_timeout, protocol, lambda connected_transport: request_blob(
+                self.loop, blob, address, tcp_port, peer_connect_timeout, blob_download_timeout,
+                connected_transport=connected_transport, protocol=protocol
+            )
+        ) or (0, None)
+
+    async def request_blobs(self, blobs: typing.List['BlobFile'], address: str, tcp_port: int,
+                            peer_connect_timeout: float, blob_download_timeout: float)\
+            -> typing.Tuple[typing.List[int], typing.Optional[asyncio.Transport]]:
+        """
+        Pipeline the requests for several blobs over one pooled connection
+
+        Peers that close the connection without sending anything when sent pipelined requests (older versions)
+        get the requests one at a time from then on.
+        """
+        key = (address, tcp_port)
+        if len(blobs) > 1 and key not in self.unpipelined_peers:
+            protocol = BlobExchangeClientProtocol(self.loop, blob_download_timeout)
+            result = await self._request(
+                address, tcp_port, peer_connect_timeout, protocol, lambda connected_transport: request_blobs(
+                    self.loop, blobs, address, tcp_port, peer_connect_timeout, blob_download_timeout,
+                    connected_transport=connected_transport, protocol=protocol
+                )
+            )
+            if not result:
+                return [0 for _ in blobs], None
+            received, transport = result
+            if transport or any(received) or not protocol.closed_by_peer:
+                # a failed connect or read doesn't mean the peer can't take pipelined requests
+                return received, transport
+            log.info("%s:%i doesn't support pipelined blob requests", address, tcp_port)
+            self.unpipelined_peers.add(key)
+        received, transport = [0 for _ in blobs], None
+        for i, blob in enumerate(blobs):
+            received[i], transport = await self.request_blob(
+                blob, address, tcp_port, peer_connect_timeout, blob_download_timeout
+            )
+            if not transport:
+                break
+        return received, transport
+
+    async def request_stream_availability(self, sd_hash: str, address: str, tcp_port: int,
+                                          peer_connect_timeout: float, peer_timeout: float)\
+            -> typing.Tuple[typing.Optional[typing.List[bool]], typing.Optional[asyncio.Transport]]:
+        """
+        Ask a peer which blobs of a stream it has over a pooled connection
+        """
+        protocol = BlobExchangeClientProtocol(self.loop, peer_timeout)
+        return await self._request(
+            address, tcp_port, peer_connect_timeout, protocol, lambda connected_transport: request_stream_availability(
+                self.loop, sd_hash, address, tcp_port, peer_connect_timeout, peer_timeout,
+                connected_transport=connected_transport, protocol=protocol
+            ), score=False
+        ) or (None, None)
+
+    def stop(self):
+        if self._idle_check:
+            self._idle_check.cancel()
+            self._idle_check = None
+        while self.idle:
+            _, transports = self.idle.popitem()
+            for transport, _ in transports:
+                transport.close()
+        self.unpipelined_peers.clear()
@@ -2,7 +2,7 @@ import asyncio
 import typing
 import logging
 from lbrynet.utils import drain_tasks
-from lbrynet.blob_exchange.client import request_blob
+from lbrynet.blob_exchange.connection_manager import ConnectionManager
 if typing.TYPE_CHECKING:
     from lbrynet.conf import Config
     from lbrynet.dht.node import Node
@@ -14,21 +14,80 @@ log = logging.getLogger(__name__)
 
 
 class BlobDownloader:
-    BAN_TIME = 10.0  # fixme: when connection manager gets implemented, move it out from here
+    BAN_TIME = 10.0  # seconds a peer that failed a request is ignored by this download
+    AVAILABILITY_TTL = 30.0  # how long to trust a peer's stream availability bitmap before asking again
+    PIPELINE_DEPTH = 4  # most blobs requested from a peer at once
+
     def __init__(self, loop: asyncio.BaseEventLoop, config: 'Config', blob_manager: 'BlobFileManager',
-                 peer_queue: asyncio.Queue):
+                 peer_queue: asyncio.Queue, connection_manager: typing.Optional[ConnectionManager] = None):
         self.loop = loop
         self.config = config
         self.blob_manager = blob_manager
         self.peer_queue = peer_queue
+        # requests made at once, lowered by the stream manager to share its connection budget between downloads
+        self.max_connections = config.max_connections_per_download
         self.active_connections: typing.Dict['KademliaPeer', asyncio.Task] = {}  # active request_blob calls
+        self.peers: typing.Set['KademliaPeer'] = set()  # every peer taken from the peer queue
+        self.downloading = 0  # running download_blob calls
+        self.downloading_blobs: typing.Dict[str, 'BlobFile'] = {}  # blobs of the running download_blob calls
+        self.requested: typing.Dict[str, typing.Set[asyncio.Task]] = {}  # blob hash: running requests for it
         self.ignored: typing.Dict['KademliaPeer', int] = {}
         self.scores: typing.Dict['KademliaPeer', int] = {}
-        self.connections: typing.Dict['KademliaPeer', asyncio.Transport] = {}
+        self._owns_connection_manager = connection_manager is None
+        self.connection_manager = connection_manager or ConnectionManager(
+            loop, config.max_connections_per_peer, config.idle_peer_connection_timeout
+        )
         self.time_since_last_blob = loop.time()
+        self.sd_hash: typing.Optional[str] = None
+        self.stream_blob_positions: typing.Dict[str, int] = {}
+        # peer: (when it was asked, which stream blobs it has or None if it doesn't support the request)
+        self.stream_availability: typing.Dict['KademliaPeer', typing.Tuple[float, typing.Optional[
+            typing.List[bool]]]] = {}
+        self.availability_requests: typing.Dict['KademliaPeer', asyncio.Task] = {}
+
+    def set_stream(self, sd_hash: str, blob_hashes: typing.List[str]):
+        """
+        Set the stream the blobs being downloaded belong to, peers are then asked which of its blobs they have
+        so blobs are only requested from peers that have them
+        """
+        self.sd_hash = sd_hash
+        self.stream_blob_positions = {blob_hash: i for i, blob_hash in enumerate(blob_hashes)}
+        self.stream_availability.clear()
+
+    def peer_has_blob(self, peer: 'KademliaPeer', blob_hash: str) -> typing.Optional[bool]:
+        """
+        Whether the peer's availability bitmap says it has the blob, None if it isn't known
+        """
+        position = self.stream_blob_positions.get(blob_hash)
+        _, available = self.stream_availability.get(peer, (None, None))
+        if position is None or available is None or len(available) != len(self.stream_blob_positions):
+            return None
+        return available[position]
+
+    async def request_availability_from_peer(self, peer: 'KademliaPeer'):
+        sd_hash = self.sd_hash
+        available, _ = await self.connection_manager.request_stream_availability(
+            sd_hash, peer.address, peer.tcp_port, self.config.peer_connect_timeout, self.config.blob_download_timeout
+        )
+        if sd_hash == self.sd_hash:
+            self.stream_availability[peer] = (self.loop.time(), available)
+
+    def update_availability(self, peers: typing.List['KademliaPeer']):
+        if not self.sd_hash:
+            return
+        now = self.loop.time()
+        for peer in peers:
+            if peer in self.ignored or peer in self.availability_requests:
+                continue
+            asked, available = self.stream_availability.get(peer, (None, None))
+            if asked is not None and (available is None or now - asked < self.AVAILABILITY_TTL):
+                continue
+            task = self.loop.create_task(self.request_availability_from_peer(peer))
+            task.add_done_callback(lambda _, peer=peer: self.availability_requests.pop(peer, None))
+            self.availability_requests[peer] = task
 
     def should_race_continue(self, blob: 'BlobFile'):
-        if len(self.active_connections) >= self.config.max_connections_per_download:
+        if len(self.active_connections) >= self.max_connections:
             return False
         # if a peer won 3 or more blob races and is active as a downloader, stop the race so bandwidth improves
         # the safe net side is that any failure will reset the peer score, triggering the race back
@@ -38,26 +97,71 @@ class BlobDownloader:
         #       return False
         return not (blob.get_is_verified() or blob.file_exists)
 
-    async def request_blob_from_peer(self, blob: 'BlobFile', peer: 'KademliaPeer'):
-        if blob.get_is_verified():
+    def get_pipelined_blobs(self, blob: 'BlobFile', peer: 'KademliaPeer') -> typing.List['BlobFile']:
+        """
+        Pick the blobs to request from the peer along with `blob`: the other blobs being downloaded that the peer's
+        availability bitmap says it has and that aren't requested from any peer yet
+        """
+        blobs = [blob]
+        for other in self.downloading_blobs.values():
+            if len(blobs) >= self.PIPELINE_DEPTH:
+                break
+            if other is blob or self.requested.get(other.blob_hash) or not self.peer_has_blob(peer, other.blob_hash):
+                continue
+            if not (other.get_is_verified() or other.file_exists or other.blob_write_lock.locked()):
+                blobs.append(other)
+        return blobs
+
+    def _start_request(self, blobs: typing.List['BlobFile'], peer: 'KademliaPeer') -> asyncio.Task:
+        task = self.loop.create_task(self.request_blob_from_peer(blobs, peer))
+        self.active_connections[peer] = task
+        for blob in blobs:
+            self.requested.setdefault(blob.blob_hash, set()).add(task)
+
+        def remove_request(_):
+            for blob in blobs:
+                tasks = self.requested.get(blob.blob_hash)
+                if tasks is not None:
+                    tasks.discard(task)
+                    if not tasks:
+                        del self.requested[blob.blob_hash]
+
+        task.add_done_callback(remove_request)
+        return task
+
+    def _has_other_pending_blobs(self, task: asyncio.Task, blob_hash: str) -> bool:
+        # if a request pipelined for several blobs still has other blobs to download
+        return any(
+            task in tasks and other_hash != blob_hash and other_hash in self.downloading_blobs
+            and not self.downloading_blobs[other_hash].get_is_verified()
+            for other_hash, tasks in self.requested.items()
+        )
+
+    async def request_blob_from_peer(self, blobs: typing.List['BlobFile'], peer: 'KademliaPeer'):
+        blobs = [blob for blob in blobs if not blob.get_is_verified()]
+        if not blobs:
             return
         self.scores[peer] = self.scores.get(peer, 0) - 1  # starts losing score, to account for cancelled ones
-        transport = self.connections.get(peer)
         start = self.loop.time()
-        bytes_received, transport = await request_blob(
-            self.loop, blob, peer.address, peer.tcp_port, self.config.peer_connect_timeout,
-            self.config.blob_download_timeout, connected_transport=transport
-        )
-        if bytes_received == blob.get_length():
+        if len(blobs) > 1:
+            received, transport = await self.connection_manager.request_blobs(
+                blobs, peer.address, peer.tcp_port, self.config.peer_connect_timeout,
+                self.config.blob_download_timeout
+            )
+        else:
+            bytes_received, transport = await self.connection_manager.request_blob(
+                blobs[0], peer.address, peer.tcp_port, self.config.peer_connect_timeout,
+                self.config.blob_download_timeout
+            )
+            received = [bytes_received]
+        bytes_received = sum(received)
+        if any(blob_received == blob.get_length() for blob, blob_received in zip(blobs, received)):
             self.time_since_last_blob = self.loop.time()
         if not transport and peer not in self.ignored:
             self.ignored[peer] = self.loop.time()
             log.debug("drop peer %s:%i", peer.address, peer.tcp_port)
-            if peer in self.connections:
-                del self.connections[peer]
         elif transport:
             log.debug("keep peer %s:%i", peer.address, peer.tcp_port)
-            self.connections[peer] = transport
             rough_speed = (bytes_received / (self.loop.time() - start)) if bytes_received else 0
             self.scores[peer] = rough_speed
 
@@ -69,12 +173,18 @@ class BlobDownloader:
             except asyncio.TimeoutError:
                 pass
         tasks = [self.loop.create_task(get_and_re_add_peers()), self.loop.create_task(blob.verified.wait())]
-        active_tasks = list(self.active_connections.values())
+        active_tasks = list(self.active_connections.values()) + list(self.availability_requests.values())
         try:
             await asyncio.wait(tasks + active_tasks, loop=self.loop, return_when='FIRST_COMPLETED')
         finally:
             drain_tasks(tasks)
 
+    def get_score(self, peer: 'KademliaPeer') -> float:
+        # fall back to the speed seen by other downloads (and earlier runs) for peers this download hasn't tried yet
+        if peer in self.scores:
+            return self.scores[peer]
+        return self.connection_manager.get_score(peer.address, peer.tcp_port)
+
     def cleanup_active(self):
         to_remove = [peer for (peer, task) in self.active_connections.items() if task.done()]
         for peer in to_remove:
@@ -90,52 +200,83 @@ class BlobDownloader:
             self.ignored.pop(banned_peer)
 
     async def download_blob(self, blob_hash: str, length: typing.Optional[int] = None) -> 'BlobFile':
+        """
+        Download a blob, racing the best peers for it
+
+        Several blobs can be downloaded at once, each peer is only sent one request at a time and each blob only
+        races its share of the peers so they go to different peers. No more than `max_connections` requests are
+        made at once. A request to a peer also asks for the other blobs being downloaded that the peer has and no
+        other peer was asked for, up to `PIPELINE_DEPTH` blobs, which the peer sends back to back.
+        """
         blob = self.blob_manager.get_blob(blob_hash, length)
         if blob.get_is_verified():
             return blob
+        requests: typing.Dict['KademliaPeer', asyncio.Task] = {}  # the requests made for this blob
+        self.downloading += 1
+        self.downloading_blobs[blob_hash] = blob
         try:
+            # let the downloads started along with this one count towards the share of the peers
+            await asyncio.sleep(0, loop=self.loop)
             while not blob.get_is_verified():
-                batch: typing.List['KademliaPeer'] = []
                 while not self.peer_queue.empty():
-                    batch.extend(self.peer_queue.get_nowait())
-                batch.sort(key=lambda peer: self.scores.get(peer, 0), reverse=True)
+                    self.peers.update(self.peer_queue.get_nowait())
+                batch = [peer for peer in self.peers if peer not in self.ignored]
+                self.update_availability(batch)
+                # only race the peers known to have the blob, falling back to the ones that weren't asked
+                has_blob = {peer: self.peer_has_blob(peer, blob_hash) for peer in batch}
+                candidates = [peer for peer in has_blob if has_blob[peer]] or \
+                             [peer for peer in has_blob if has_blob[peer] is None]
+                candidates.sort(key=self.get_score, reverse=True)
                 log.debug(
                     "running, %d peers, %d ignored, %d active",
                     len(batch), len(self.ignored), len(self.active_connections)
                 )
-                for peer in batch:
-                    if not self.should_race_continue(blob):
+                share = max(1, len(batch) // self.downloading)
+                for peer in candidates:
+                    if not self.should_race_continue(blob) or len(self.requested.get(blob_hash, ())) >= share:
                         break
                     if peer not in self.active_connections and peer not in self.ignored:
-                        log.debug("request %s from %s:%i", blob_hash[:8], peer.address, peer.tcp_port)
-                        t = self.loop.create_task(self.request_blob_from_peer(blob, peer))
-                        self.active_connections[peer] = t
+                        blobs = self.get_pipelined_blobs(blob, peer)
+                        log.debug("request %s from %s:%i", ", ".join(b.blob_hash[:8] for b in blobs), peer.address,
+                                  peer.tcp_port)
+                        requests[peer] = self._start_request(blobs, peer)
                 await self.new_peer_or_finished(blob)
                 self.cleanup_active()
-                if batch:
-                    self.peer_queue.put_nowait(set(batch).difference(self.ignored))
-                else:
+                if not batch:
                     self.clearbanned()
             blob.close()
             log.debug("downloaded %s", blob_hash[:8])
             return blob
         finally:
-            while self.active_connections:
-                self.active_connections.popitem()[1].cancel()
+            self.downloading -= 1
+            if self.downloading_blobs.get(blob_hash) is blob:
+                del self.downloading_blobs[blob_hash]
+            for peer, task in requests.items():
+                if self._has_other_pending_blobs(task, blob_hash):
+                    continue  # the rest of the pipelined blobs are still coming
+                task.cancel()
+                if self.active_connections.get(peer) is task:
+                    del self.active_connections[peer]
 
     def close(self):
+        while self.active_connections:
+            self.active_connections.popitem()[1].cancel()
+        while self.availability_requests:
+            self.availability_requests.popitem()[1].cancel()
         self.scores.clear()
         self.ignored.clear()
-        for transport in self.connections.values():
-            transport.close()
+        self.peers.clear()
+        self.stream_availability.clear()
+        if self._owns_connection_manager:
+            self.connection_manager.stop()
 
 
 async def download_blob(loop, config: 'Config', blob_manager: 'BlobFileManager', node: 'Node',
-                        blob_hash: str) -> 'BlobFile':
+                        blob_hash: str, connection_manager: typing.Optional[ConnectionManager] = None) -> 'BlobFile':
     search_queue = asyncio.Queue(loop=loop, maxsize=config.max_connections_per_download)
     search_queue.put_nowait(blob_hash)
     peer_queue, accumulate_task = node.accumulate_peers(search_queue)
-    downloader = BlobDownloader(loop, config, blob_manager, peer_queue)
+    downloader = BlobDownloader(loop, config, blob_manager, peer_queue, connection_manager)
     try:
         return await downloader.download_blob(blob_hash)
     finally:
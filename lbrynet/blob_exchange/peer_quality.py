@@ -0,0 +1,111 @@
+import time
+import asyncio
+import typing
+import logging
+if typing.TYPE_CHECKING:
+    from lbrynet.extras.daemon.storage import SQLiteStorage
+
+log = logging.getLogger(__name__)
+
+
+class PeerStats:
+    def __init__(self, throughput: float = 0.0, connect_latency: typing.Optional[float] = None,
+                 failure_rate: float = 0.0, last_seen: int = 0):
+        self.throughput = throughput  # bytes per second
+        self.connect_latency = connect_latency  # seconds
+        self.failure_rate = failure_rate  # 0 to 1
+        self.last_seen = last_seen
+
+    @property
+    def score(self) -> float:
+        return self.throughput * (1.0 - self.failure_rate)
+
+
+class PeerQualityStore:
+    """
+    Moving averages of the throughput, connect latency and failure rate of every peer blobs were requested from,
+    shared by all downloads and saved in the database so they outlive the daemon
+
+    Each new measurement makes up `alpha` of the average. Peers not seen for `PEER_EXPIRATION` seconds are
+    forgotten.
+    """
+
+    PEER_EXPIRATION = 30 * 24 * 60 * 60
+    SAVE_INTERVAL = 60.0
+
+    def __init__(self, loop: asyncio.BaseEventLoop, alpha: float = 0.3):
+        self.loop = loop
+        self.alpha = alpha
+        self.peers: typing.Dict[typing.Tuple[str, int], PeerStats] = {}
+        self.storage: typing.Optional['SQLiteStorage'] = None
+        self._changed: typing.Set[typing.Tuple[str, int]] = set()
+        self._save_call: typing.Optional[asyncio.Handle] = None
+
+    def _average(self, average: typing.Optional[float], value: float) -> float:
+        if average is None:
+            return value
+        return average + self.alpha * (value - average)
+
+    def _get_stats(self, address: str, tcp_port: int) -> PeerStats:
+        key = (address, tcp_port)
+        if key not in self.peers:
+            self.peers[key] = PeerStats()
+        self.peers[key].last_seen = int(time.time())
+        self._changed.add(key)
+        if self.storage and not self._save_call:
+            self._save_call = self.loop.call_later(self.SAVE_INTERVAL, lambda: self.loop.create_task(self.save()))
+        return self.peers[key]
+
+    def get_stats(self, address: str, tcp_port: int) -> typing.Optional[PeerStats]:
+        return self.peers.get((address, tcp_port))
+
+    def get_score(self, address: str, tcp_port: int) -> float:
+        stats = self.peers.get((address, tcp_port))
+        return 0.0 if not stats else stats.score
+
+    def record_connect(self, address: str, tcp_port: int, latency: float):
+        stats = self._get_stats(address, tcp_port)
+        stats.connect_latency = self._average(stats.connect_latency, latency)
+
+    def record_download(self, address: str, tcp_port: int, bytes_received: int, duration: float):
+        stats = self._get_stats(address, tcp_port)
+        throughput = bytes_received / max(duration, 0.001)
+        stats.throughput = throughput if not stats.throughput else self._average(stats.throughput, throughput)
+        stats.failure_rate = self._average(stats.failure_rate, 0.0)
+
+    def record_failure(self, address: str, tcp_port: int):
+        stats = self._get_stats(address, tcp_port)
+        stats.failure_rate = self._average(stats.failure_rate, 1.0)
+
+    async def open(self, storage: 'SQLiteStorage'):
+        """
+        Load the saved peers and save the changes to them from now on
+        """
+        seen_since = int(time.time()) - self.PEER_EXPIRATION
+        for address, tcp_port, throughput, connect_latency, failure_rate, last_seen in \
+                await storage.get_peer_quality(seen_since):
+            if (address, tcp_port) not in self.peers:
+                self.peers[(address, tcp_port)] = PeerStats(throughput, connect_latency, failure_rate, last_seen)
+        self.storage = storage
+        log.info("loaded the stats of %i peers", len(self.peers))
+
+    async def save(self):
+        self._save_call = None
+        if not self.storage or not self._changed:
+            return
+        changed, self._changed = self._changed, set()
+        rows = []
+        for address, tcp_port in changed:
+            stats = self.peers[(address, tcp_port)]
+            rows.append((address, tcp_port, stats.throughput, stats.connect_latency, stats.failure_rate,
+                         stats.last_seen))
+        await self.storage.save_peer_quality(rows, int(time.time()) - self.PEER_EXPIRATION)
+
+    async def close(self):
+        """
+        Save the remaining changes and stop saving
+        """
+        if self._save_call:
+            self._save_call.cancel()
+        await self.save()
+        self.storage = None
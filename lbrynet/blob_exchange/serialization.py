@@ -1,6 +1,9 @@
 import typing
 import json
+import struct
 import logging
+import binascii
+from lbrynet.blob import MAX_BLOB_SIZE, blobhash_length
 
 log = logging.getLogger(__name__)
 
@@ -134,23 +137,193 @@ class BlobErrorResponse(BlobMessage):
         }
 
 
+def encode_bitmap(bits: typing.List[bool]) -> str:
+    bitmap = bytearray((len(bits) + 7) // 8)
+    for i, bit in enumerate(bits):
+        if bit:
+            bitmap[i // 8] |= 0x80 >> (i % 8)
+    return binascii.hexlify(bitmap).decode()
+
+
+def decode_bitmap(bitmap: str, count: int) -> typing.List[bool]:
+    bitmap = binascii.unhexlify(bitmap)
+    if len(bitmap) != (count + 7) // 8:
+        raise ValueError("bitmap length doesn't match the number of blobs")
+    return [bool(bitmap[i // 8] & (0x80 >> (i % 8))) for i in range(count)]
+
+
+class BlobStreamAvailabilityRequest(BlobMessage):
+    key = 'requested_stream_availability'
+
+    def __init__(self, requested_stream_availability: str, **kwargs) -> None:
+        self.sd_hash = requested_stream_availability
+
+    def to_dict(self) -> typing.Dict:
+        return {
+            self.key: self.sd_hash
+        }
+
+
+class BlobStreamAvailabilityResponse(BlobMessage):
+    """
+    Which of the blobs of a stream (in order, not counting the sd blob and the stream terminator) are available.
+    A server that doesn't know the stream responds with no blobs.
+    """
+
+    key = 'stream_availability'
+
+    def __init__(self, **response: typing.Dict) -> None:
+        stream_availability = response[self.key]
+        self.sd_hash = stream_availability['sd_hash']
+        self.blob_count = stream_availability['blobs']
+        self.bitmap = stream_availability['bitmap']
+
+    @classmethod
+    def make_response(cls, sd_hash: str, available: typing.List[bool]) -> 'BlobStreamAvailabilityResponse':
+        return cls(**{cls.key: {'sd_hash': sd_hash, 'blobs': len(available), 'bitmap': encode_bitmap(available)}})
+
+    def get_available(self) -> typing.List[bool]:
+        return decode_bitmap(self.bitmap, self.blob_count)
+
+    def to_dict(self) -> typing.Dict:
+        return {
+            self.key: {'sd_hash': self.sd_hash, 'blobs': self.blob_count, 'bitmap': self.bitmap}
+        }
+
+
+BINARY_FRAMING = 'binary'
+
+
+class BlobFramingRequest(BlobMessage):
+    """
+    Asks the server if it understands binary frames (see `BinaryFrame`), sent along with the first request on
+    a connection
+    """
+
+    key = 'requested_framing'
+
+    def __init__(self, requested_framing: str, **kwargs) -> None:
+        self.requested_framing = requested_framing
+
+    def to_dict(self) -> typing.Dict:
+        return {
+            self.key: self.requested_framing
+        }
+
+
+class BlobFramingResponse(BlobMessage):
+    key = 'framing'
+
+    def __init__(self, framing: str, **kwargs) -> None:
+        self.framing = framing
+
+    def to_dict(self) -> typing.Dict:
+        return {
+            self.key: self.framing
+        }
+
+
+class BinaryFrame:
+    """
+    Length prefixed binary message, used in place of JSON once the server has said it understands them
+
+    A frame is a one byte type and the four byte length of the payload, followed by the payload. Blob requests and
+    not found responses carry the raw blob hash, blob frames carry the raw blob hash followed by the blob bytes and
+    message frames carry a JSON request or response. JSON messages start with '{', so the first byte of a message
+    tells which kind it is.
+    """
+
+    REQUEST_BLOB = 1
+    BLOB = 2
+    BLOB_NOT_FOUND = 3
+    MESSAGE = 4
+
+    header = struct.Struct('>BI')
+    hash_length = blobhash_length // 2
+    max_payload_length = MAX_BLOB_SIZE + hash_length
+
+    def __init__(self, frame_type: int, blob_hash: typing.Optional[str] = None, data_length: int = 0,
+                 message: typing.Optional[bytes] = None) -> None:
+        self.frame_type = frame_type
+        self.blob_hash = blob_hash
+        self.data_length = data_length  # blob bytes following the header of a blob frame
+        self.message = message
+
+    @classmethod
+    def is_frame(cls, data: typing.Union[bytes, bytearray]) -> bool:
+        return bool(data) and cls.REQUEST_BLOB <= data[0] <= cls.MESSAGE
+
+    @classmethod
+    def _make(cls, frame_type: int, payload: bytes, data_length: int = 0) -> bytes:
+        return cls.header.pack(frame_type, len(payload) + data_length) + payload
+
+    @classmethod
+    def make_blob_request(cls, blob_hash: str) -> bytes:
+        return cls._make(cls.REQUEST_BLOB, binascii.unhexlify(blob_hash))
+
+    @classmethod
+    def make_blob_header(cls, blob_hash: str, length: int) -> bytes:
+        """
+        The start of a blob frame, the blob bytes are sent after it
+        """
+        return cls._make(cls.BLOB, binascii.unhexlify(blob_hash), length)
+
+    @classmethod
+    def make_blob_not_found(cls, blob_hash: str) -> bytes:
+        return cls._make(cls.BLOB_NOT_FOUND, binascii.unhexlify(blob_hash))
+
+    @classmethod
+    def make_message(cls, message: typing.Union['BlobRequest', 'BlobResponse']) -> bytes:
+        return cls._make(cls.MESSAGE, message.serialize())
+
+    @classmethod
+    def deserialize(cls, data: typing.Union[bytes, bytearray]) -> typing.Tuple[typing.Optional['BinaryFrame'], int]:
+        """
+        Deserialize the frame at the start of the data, the blob bytes of a blob frame aren't included
+
+        :return: the frame (None if it hasn't been fully received) and how many bytes of the data it used
+        """
+        if len(data) < cls.header.size:
+            return None, 0
+        frame_type, length = cls.header.unpack_from(data)
+        if not cls.REQUEST_BLOB <= frame_type <= cls.MESSAGE:
+            raise ValueError("unknown frame type %i" % frame_type)
+        if length > cls.max_payload_length:
+            raise ValueError("frame too long (%i bytes)" % length)
+        if frame_type == cls.MESSAGE:
+            if len(data) < cls.header.size + length:
+                return None, 0
+            end = cls.header.size + length
+            return cls(frame_type, message=bytes(data[cls.header.size:end])), end
+        if length < cls.hash_length or (frame_type != cls.BLOB and length != cls.hash_length):
+            raise ValueError("invalid frame length %i" % length)
+        end = cls.header.size + cls.hash_length
+        if len(data) < end:
+            return None, 0
+        blob_hash = binascii.hexlify(data[cls.header.size:end]).decode()
+        return cls(frame_type, blob_hash, length - cls.hash_length), end
+
+
 blob_request_types = typing.Union[BlobPriceRequest, BlobAvailabilityRequest, BlobDownloadRequest,
-                                  BlobPaymentAddressRequest]
+                                  BlobPaymentAddressRequest, BlobStreamAvailabilityRequest, BlobFramingRequest]
 blob_response_types = typing.Union[BlobPriceResponse, BlobAvailabilityResponse, BlobDownloadResponse,
-                                   BlobErrorResponse, BlobPaymentAddressResponse]
+                                   BlobErrorResponse, BlobPaymentAddressResponse, BlobStreamAvailabilityResponse,
+                                   BlobFramingResponse]
 
 
-def _parse_blob_response(response_msg: bytes) -> typing.Tuple[typing.Optional[typing.Dict], bytes]:
+def _parse_blob_response(response_msg: typing.Union[bytes, bytearray],
+                         curr_pos: int = 0) -> typing.Tuple[typing.Optional[typing.Dict], int]:
     # scenarios:
     #   <json>
     #   <blob bytes>
     #   <json><blob bytes>
+    # returns the response and where it ends in the message, the search for the end of the response starts from
+    # curr_pos so a buffer that is still being received doesn't get scanned again from the beginning
 
-    curr_pos = 0
     while True:
         next_close_paren = response_msg.find(b'}', curr_pos)
         if next_close_paren == -1:
-            return None, response_msg
+            return None, 0
         curr_pos = next_close_paren + 1
         try:
             response = json.loads(response_msg[:curr_pos])
@@ -160,12 +333,34 @@ def _parse_blob_response(response_msg: bytes) -> typing.Tuple[typing.Optional[ty
                     BlobPaymentAddressResponse.key,
                     BlobAvailabilityResponse.key,
                     BlobPriceResponse.key,
-                    BlobDownloadResponse.key
+                    BlobDownloadResponse.key,
+                    BlobStreamAvailabilityResponse.key,
+                    BlobFramingResponse.key
         }
         if isinstance(response, dict) and response.keys():
             if set(response.keys()).issubset(possible_response_keys):
-                return response, response_msg[curr_pos:]
-        return None, response_msg
+                return response, curr_pos
+        return None, 0
+
+
+def _parse_blob_requests(request_msg: typing.Union[bytes, bytearray]) -> typing.Tuple[typing.List[typing.Dict], int]:
+    # a client may send several requests without waiting for the responses:
+    #   <json><json><partial json>
+    # returns the complete requests and how many bytes of the message they took up
+
+    decoder = json.JSONDecoder()
+    message = request_msg.decode()
+    requests = []
+    curr_pos = 0
+    while True:
+        while curr_pos < len(message) and message[curr_pos].isspace():
+            curr_pos += 1
+        if message.find('}', curr_pos) == -1:
+            return requests, len(message[:curr_pos].encode())
+        request, curr_pos = decoder.raw_decode(message, curr_pos)
+        if not isinstance(request, dict):
+            raise ValueError("blob request is not an object")
+        requests.append(request)
 
 
 class BlobRequest:
@@ -203,24 +398,60 @@ class BlobRequest:
         if response:
             return response
 
+    def get_stream_availability_request(self) -> typing.Optional[BlobStreamAvailabilityRequest]:
+        response = self._get_request(BlobStreamAvailabilityRequest)
+        if response:
+            return response
+
+    def get_framing_request(self) -> typing.Optional[BlobFramingRequest]:
+        response = self._get_request(BlobFramingRequest)
+        if response:
+            return response
+
     def serialize(self) -> bytes:
         return json.dumps(self.to_dict()).encode()
 
     @classmethod
-    def deserialize(cls, data: bytes) -> 'BlobRequest':
-        request = json.loads(data)
+    def _from_dict(cls, request: typing.Dict) -> 'BlobRequest':
         return cls([
             request_type(**request)
             for request_type in (BlobPriceRequest, BlobAvailabilityRequest, BlobDownloadRequest,
-                                 BlobPaymentAddressRequest)
+                                 BlobPaymentAddressRequest, BlobStreamAvailabilityRequest, BlobFramingRequest)
             if request_type.key in request
         ])
 
     @classmethod
-    def make_request_for_blob_hash(cls, blob_hash: str) -> 'BlobRequest':
-        return cls(
-            [BlobAvailabilityRequest([blob_hash]), BlobPriceRequest(0.0), BlobDownloadRequest(blob_hash)]
-        )
+    def from_frame(cls, frame: BinaryFrame) -> 'BlobRequest':
+        if frame.frame_type == BinaryFrame.REQUEST_BLOB:
+            return cls([BlobDownloadRequest(frame.blob_hash)])
+        if frame.frame_type == BinaryFrame.MESSAGE:
+            return cls.deserialize(frame.message)
+        raise ValueError("frame type %i is not a request" % frame.frame_type)
+
+    @classmethod
+    def deserialize(cls, data: bytes) -> 'BlobRequest':
+        return cls._from_dict(json.loads(data))
+
+    @classmethod
+    def deserialize_requests(cls, data: typing.Union[bytes, bytearray]) -> typing.Tuple[typing.List['BlobRequest'],
+                                                                                         int]:
+        """
+        Deserialize the complete requests in the data, returns the requests and the number of bytes they used
+        """
+        requests, used = _parse_blob_requests(data)
+        return [cls._from_dict(request) for request in requests], used
+
+    @classmethod
+    def make_request_for_blob_hash(cls, blob_hash: str, request_binary_framing: bool = False) -> 'BlobRequest':
+        requests = [BlobAvailabilityRequest([blob_hash]), BlobPriceRequest(0.0), BlobDownloadRequest(blob_hash)]
+        if request_binary_framing:
+            requests.append(BlobFramingRequest(BINARY_FRAMING))
+        return cls(requests)
+
+    @classmethod
+    def make_request_for_stream_availability(cls, sd_hash: str) -> 'BlobRequest':
+        # servers that don't know this request still answer the price request, so they don't leave us waiting
+        return cls([BlobPriceRequest(0.0), BlobStreamAvailabilityRequest(sd_hash)])
 
 
 class BlobResponse:
@@ -265,19 +496,65 @@ class BlobResponse:
         if response:
             return response
 
+    def get_stream_availability_response(self) -> typing.Optional[BlobStreamAvailabilityResponse]:
+        response = self._get_response(BlobStreamAvailabilityResponse)
+        if response:
+            return response
+
+    def get_framing_response(self) -> typing.Optional[BlobFramingResponse]:
+        response = self._get_response(BlobFramingResponse)
+        if response:
+            return response
+
     def serialize(self) -> bytes:
         return json.dumps(self.to_dict()).encode()
 
     @classmethod
-    def deserialize(cls, data: bytes) -> 'BlobResponse':
-        response, extra = _parse_blob_response(data)
-        requests = []
-        if response:
-            requests.extend([
-                response_type(**response)
-                for response_type in (BlobPriceResponse, BlobAvailabilityResponse, BlobDownloadResponse,
-                                      BlobErrorResponse, BlobPaymentAddressResponse)
-                if response_type.key in response
+    def _from_dict(cls, response: typing.Dict, blob_data: typing.Optional[bytes] = None) -> 'BlobResponse':
+        return cls([
+            response_type(**response)
+            for response_type in (BlobPriceResponse, BlobAvailabilityResponse, BlobDownloadResponse,
+                                  BlobErrorResponse, BlobPaymentAddressResponse, BlobStreamAvailabilityResponse,
+                                  BlobFramingResponse)
+            if response_type.key in response
+        ], blob_data)
+
+    @classmethod
+    def from_frame(cls, frame: BinaryFrame) -> 'BlobResponse':
+        """
+        Make the response equivalent to a frame, a blob frame is an accepted request for the blob
+        """
+        if frame.frame_type == BinaryFrame.BLOB:
+            return cls([
+                BlobAvailabilityResponse([frame.blob_hash]),
+                BlobPriceResponse(BlobPriceResponse.rate_accepted),
+                BlobDownloadResponse(incoming_blob={'blob_hash': frame.blob_hash, 'length': frame.data_length})
             ])
-        return cls(requests, extra)
+        if frame.frame_type == BinaryFrame.BLOB_NOT_FOUND:
+            return cls([BlobAvailabilityResponse([])])
+        if frame.frame_type == BinaryFrame.MESSAGE:
+            return cls._from_dict(json.loads(frame.message))
+        raise ValueError("frame type %i is not a response" % frame.frame_type)
+
+    @classmethod
+    def deserialize(cls, data: bytes) -> 'BlobResponse':
+        response, header_length = _parse_blob_response(data)
+        if not response:
+            return cls([], data)
+        return cls._from_dict(response, data[header_length:])
+
+    @classmethod
+    def deserialize_header(cls, data: typing.Union[bytes, bytearray],
+                           scan_from: int = 0) -> typing.Tuple[typing.Optional['BlobResponse'], int]:
+        """
+        Deserialize the response at the start of the data without copying the blob bytes after it
+
+        :param scan_from: position to start looking for the end of the response, the data before it is known
+                          not to contain a complete response
+        :return: the response (None if it hasn't been fully received) and its length in bytes
+        """
+        response, header_length = _parse_blob_response(data, scan_from)
+        if not response:
+            return None, 0
+        return cls._from_dict(response), header_length
 
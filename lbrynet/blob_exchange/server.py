@@ -1,38 +1,89 @@
+import re
 import asyncio
 import binascii
 import logging
 import typing
-from json.decoder import JSONDecodeError
+from collections import deque
 from lbrynet.blob_exchange.serialization import BlobResponse, BlobRequest, blob_response_types
 from lbrynet.blob_exchange.serialization import BlobAvailabilityResponse, BlobPriceResponse, BlobDownloadResponse, \
-    BlobPaymentAddressResponse
+    BlobPaymentAddressResponse, BlobStreamAvailabilityResponse, BlobFramingResponse, BinaryFrame, BINARY_FRAMING
+from lbrynet.blob_exchange.upload_scheduler import UploadScheduler
+from lbrynet.blob_exchange.server_metrics import BlobServerMetrics
 
 if typing.TYPE_CHECKING:
     from lbrynet.blob.blob_manager import BlobFileManager
 
 log = logging.getLogger(__name__)
 
+# JSON requests never contain these bytes, binary frames start with one
+FRAME_START = re.compile(b'[%s-%s]' % (bytes([BinaryFrame.REQUEST_BLOB]), bytes([BinaryFrame.MESSAGE])))
+
 
 class BlobServerProtocol(asyncio.Protocol):
-    def __init__(self, loop: asyncio.BaseEventLoop, blob_manager: 'BlobFileManager', lbrycrd_address: str):
+    def __init__(self, loop: asyncio.BaseEventLoop, blob_manager: 'BlobFileManager', lbrycrd_address: str,
+                 upload_scheduler: typing.Optional[UploadScheduler] = None,
+                 metrics: typing.Optional[BlobServerMetrics] = None):
         self.loop = loop
         self.blob_manager = blob_manager
+        self.upload_scheduler = upload_scheduler or UploadScheduler(loop)
+        self.metrics = metrics or BlobServerMetrics()
         self.server_task: asyncio.Task = None
         self.started_listening = asyncio.Event(loop=self.loop)
-        self.buf = b''
+        self.buf = bytearray()
         self.transport = None
         self.lbrycrd_address = lbrycrd_address
+        self.request_queue: typing.Deque[typing.Tuple[BlobRequest, bool]] = deque()  # (request, binary framed)
+        self.request_task: typing.Optional[asyncio.Task] = None
+        self.can_write = asyncio.Event(loop=self.loop)
+        self.can_write.set()
 
     def connection_made(self, transport):
         self.transport = transport
+        self.metrics.connection_made()
+
+    def pause_writing(self):
+        self.can_write.clear()
+
+    def resume_writing(self):
+        self.can_write.set()
 
-    def send_response(self, responses: typing.List[blob_response_types]):
+    def connection_lost(self, exc):
+        self.metrics.connection_lost()
+        self.can_write.set()
+        self.request_queue.clear()
+        if self.request_task and not self.request_task.done():
+            self.request_task.cancel()
+        self.request_task = None
+
+    def send_response(self, responses: typing.List[blob_response_types], binary: bool = False):
         to_send = []
         while responses:
             to_send.append(responses.pop())
-        self.transport.write(BlobResponse(to_send).serialize())
+        if binary:
+            self.transport.write(BinaryFrame.make_message(BlobResponse(to_send)))
+        else:
+            self.transport.write(BlobResponse(to_send).serialize())
+
+    async def send_blob_bytes(self, blob_bytes: bytes,
+                              throttle: typing.Optional[typing.Callable[[int], typing.Awaitable]] = None,
+                              chunk_size: int = 2 ** 16) -> int:
+        """
+        Write a blob held in memory to the transport, waiting for the write buffer to drain as sendfile would
+        """
+        view = memoryview(blob_bytes)
+        if not throttle:
+            chunk_size = len(view)
+        for start in range(0, len(view), chunk_size):
+            chunk = view[start:start + chunk_size]
+            if throttle:
+                await throttle(len(chunk))
+            if not self.transport or self.transport.is_closing():
+                raise ConnectionResetError()
+            self.transport.write(chunk)
+            await self.can_write.wait()
+        return len(view)
 
-    async def handle_request(self, request: BlobRequest):
+    async def handle_request(self, request: BlobRequest, binary: bool = False):
         addr = self.transport.get_extra_info('peername')
         peer_address, peer_port = addr
 
@@ -49,67 +100,154 @@ class BlobServerProtocol(asyncio.Protocol):
         price_request = request.get_price_request()
         if price_request:
             responses.append(BlobPriceResponse(blob_data_payment_rate='RATE_ACCEPTED'))
+        stream_availability_request = request.get_stream_availability_request()
+        if stream_availability_request:
+            sd_hash = stream_availability_request.sd_hash
+            available = await self.blob_manager.get_stream_availability(sd_hash)
+            responses.append(BlobStreamAvailabilityResponse.make_response(sd_hash, available or []))
+        framing_request = request.get_framing_request()
+        if framing_request and framing_request.requested_framing == BINARY_FRAMING:
+            responses.append(BlobFramingResponse(BINARY_FRAMING))
         download_request = request.get_blob_request()
+        self.metrics.record_request(peer_address, None if not download_request else download_request.requested_blob)
 
         if download_request:
             blob = self.blob_manager.get_blob(download_request.requested_blob)
             if blob.get_is_verified():
-                incoming_blob = {'blob_hash': blob.blob_hash, 'length': blob.length}
-                responses.append(BlobDownloadResponse(incoming_blob=incoming_blob))
-                self.send_response(responses)
-                log.debug("send %s to %s:%i", blob.blob_hash[:8], peer_address, peer_port)
+                scheduler = self.upload_scheduler
+                # only look up whether this is a sd or head blob if it would have to wait for an upload slot
+                priority = scheduler.full and bool(await self.blob_manager.storage.should_announce(blob.blob_hash))
+                await scheduler.wait_for_slot(peer_address, priority)
                 try:
-                    sent = await blob.sendfile(self)
+                    if binary:
+                        # the blob frame stands in for the availability and price responses
+                        responses.clear()
+                        self.transport.write(BinaryFrame.make_blob_header(blob.blob_hash, blob.length))
+                    else:
+                        incoming_blob = {'blob_hash': blob.blob_hash, 'length': blob.length}
+                        responses.append(BlobDownloadResponse(incoming_blob=incoming_blob))
+                        self.send_response(responses)
+                    log.debug("send %s to %s:%i", blob.blob_hash[:8], peer_address, peer_port)
+                    throttle = None if not scheduler.throttled else lambda size: scheduler.throttle(peer_address, size)
+                    send_start = self.loop.time()
+                    blob_bytes = await self.blob_manager.get_hot_blob_bytes(blob.blob_hash)
+                    if blob_bytes is not None:
+                        sent = await self.send_blob_bytes(blob_bytes, throttle)
+                    else:
+                        sent = await blob.sendfile(self, throttle=throttle)
                 except (ConnectionResetError, BrokenPipeError, RuntimeError, OSError):
+                    self.metrics.record_error(peer_address, blob.blob_hash)
+                    self.request_queue.clear()
                     if self.transport:
                         self.transport.close()
                     return
+                finally:
+                    scheduler.release(peer_address)
                 log.info("sent %s (%i bytes) to %s:%i", blob.blob_hash[:8], sent, peer_address, peer_port)
+                self.metrics.record_upload(peer_address, blob.blob_hash, sent, self.loop.time() - send_start)
+                self.blob_manager.record_blob_access(blob.blob_hash, uploaded=True)
+            else:
+                self.metrics.record_not_found(peer_address, blob.blob_hash)
+                if binary:
+                    responses.clear()
+                    self.transport.write(BinaryFrame.make_blob_not_found(blob.blob_hash))
         if responses:
-            self.send_response(responses)
+            self.send_response(responses, binary)
         # self.transport.close()
 
+    async def handle_requests(self):
+        # requests are answered one at a time so that pipelined responses are sent in the order requested, the
+        # next blob starts streaming as soon as the previous one has been sent
+        while self.request_queue:
+            await self.handle_request(*self.request_queue.popleft())
+        self.request_task = None
+
+    def _parse_requests(self) -> typing.List[typing.Tuple[BlobRequest, bool]]:
+        """
+        Parse the complete JSON requests and binary frames at the start of the buffer and remove them from it
+        """
+        requests = []
+        while self.buf:
+            if BinaryFrame.is_frame(self.buf):
+                frame, used = BinaryFrame.deserialize(self.buf)
+                if not frame:
+                    break
+                del self.buf[:used]
+                requests.append((BlobRequest.from_frame(frame), True))
+                continue
+            frame_start = FRAME_START.search(self.buf)
+            json_requests, used = BlobRequest.deserialize_requests(
+                self.buf if not frame_start else self.buf[:frame_start.start()]
+            )
+            if not used:
+                break
+            del self.buf[:used]
+            requests.extend((request, False) for request in json_requests)
+        return requests
+
     def data_received(self, data):
-        request = None
+        requests = None
         if data:
-            message, separator, remainder = data.rpartition(b'}')
-            if not separator:
-                self.buf += data
+            self.buf.extend(data)
+            if b'}' not in data and not BinaryFrame.is_frame(self.buf):
                 return
             try:
-                request = BlobRequest.deserialize(self.buf + data)
-                self.buf = remainder
-            except JSONDecodeError:
+                requests = self._parse_requests()
+            except ValueError:
                 addr = self.transport.get_extra_info('peername')
                 peer_address, peer_port = addr
+                self.metrics.record_error(peer_address)
                 log.error("failed to decode blob request from %s:%i (%i bytes): %s", peer_address, peer_port,
                           len(data), '' if not data else binascii.hexlify(data).decode())
-        if not request:
+                self.transport.close()
+                return
+            if not requests and BinaryFrame.is_frame(self.buf):
+                return  # the rest of the frame is on its way
+        if not requests:
             addr = self.transport.get_extra_info('peername')
             peer_address, peer_port = addr
+            self.metrics.record_error(peer_address)
             log.warning("failed to decode blob request from %s:%i", peer_address, peer_port)
             self.transport.close()
             return
-        self.loop.create_task(self.handle_request(request))
+        self.request_queue.extend(requests)
+        if not self.request_task:
+            self.request_task = self.loop.create_task(self.handle_requests())
 
 
 class BlobServer:
-    def __init__(self, loop: asyncio.BaseEventLoop, blob_manager: 'BlobFileManager', lbrycrd_address: str):
+    def __init__(self, loop: asyncio.BaseEventLoop, blob_manager: 'BlobFileManager', lbrycrd_address: str,
+                 max_concurrent_uploads: int = 0, upload_rate_limit: float = 0.0, peer_upload_rate_limit: float = 0.0):
+        """
+        :param max_concurrent_uploads: number of blobs to send at once, further uploads wait in a queue (0 for no
+                                       limit)
+        :param upload_rate_limit: bytes per second to send to all peers (0 for no limit)
+        :param peer_upload_rate_limit: bytes per second to send to each peer (0 for no limit)
+        """
         self.loop = loop
         self.blob_manager = blob_manager
         self.server_task: asyncio.Task = None
         self.started_listening = asyncio.Event(loop=self.loop)
         self.lbrycrd_address = lbrycrd_address
         self.server_protocol_class = BlobServerProtocol
+        self.upload_scheduler = UploadScheduler(
+            loop, max_concurrent_uploads, upload_rate_limit, peer_upload_rate_limit
+        )
+        self.metrics = BlobServerMetrics()
 
-    def start_server(self, port: int, interface: typing.Optional[str] = '0.0.0.0'):
+    def start_server(self, port: int, interface: typing.Optional[str] = '0.0.0.0', reuse_port: bool = False):
+        """
+        :param reuse_port: share the port with other processes listening on it with SO_REUSEPORT
+        """
         if self.server_task is not None:
             raise Exception("already running")
 
         async def _start_server():
             server = await self.loop.create_server(
-                lambda: self.server_protocol_class(self.loop, self.blob_manager, self.lbrycrd_address),
-                interface, port
+                lambda: self.server_protocol_class(
+                    self.loop, self.blob_manager, self.lbrycrd_address, self.upload_scheduler, self.metrics
+                ),
+                interface, port, reuse_port=reuse_port or None
             )
             self.started_listening.set()
             log.info("Blob server listening on TCP %s:%i", interface, port)
@@ -0,0 +1,159 @@
+import typing
+from collections import OrderedDict
+
+# upper bounds in seconds of the blob send time histogram buckets, the last bucket holds the slower sends
+SEND_TIME_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class TrafficStats:
+    def __init__(self):
+        self.requests = 0
+        self.blobs_sent = 0
+        self.bytes_sent = 0
+        self.not_found = 0
+        self.errors = 0
+        self.send_times = [0] * (len(SEND_TIME_BUCKETS) + 1)
+        self.send_time_total = 0.0
+
+    def record_send_time(self, duration: float):
+        for i, upper_bound in enumerate(SEND_TIME_BUCKETS):
+            if duration <= upper_bound:
+                break
+        else:
+            i = len(SEND_TIME_BUCKETS)
+        self.send_times[i] += 1
+        self.send_time_total += duration
+
+    def add(self, stats: typing.Dict):
+        self.requests += stats['requests']
+        self.blobs_sent += stats['blobs_sent']
+        self.bytes_sent += stats['bytes_sent']
+        self.not_found += stats['not_found']
+        self.errors += stats['errors']
+        self.send_times = [a + b for a, b in zip(self.send_times, stats['send_times'])]
+        self.send_time_total += stats['send_time_total']
+
+    def to_dict(self) -> typing.Dict:
+        return {
+            'requests': self.requests,
+            'blobs_sent': self.blobs_sent,
+            'bytes_sent': self.bytes_sent,
+            'not_found': self.not_found,
+            'errors': self.errors,
+            'send_times': list(self.send_times),
+            'send_time_total': self.send_time_total
+        }
+
+
+class BlobServerMetrics:
+    """
+    Counts the requests, uploads, bytes sent and errors of the blob server, in total and per blob and peer address,
+    along with a histogram of how long blobs took to send
+
+    Only the `max_tracked` most recently active blobs and peers are broken out, the totals count everything.
+    """
+
+    def __init__(self, max_tracked: int = 1000):
+        self.max_tracked = max_tracked
+        self.active_connections = 0
+        self.connections = 0
+        self.total = TrafficStats()
+        self.blobs: typing.Dict[str, TrafficStats] = OrderedDict()
+        self.peers: typing.Dict[str, TrafficStats] = OrderedDict()
+
+    def _get_stats(self, tracked: typing.Dict[str, TrafficStats], key: str) -> TrafficStats:
+        stats = tracked.get(key)
+        if stats is None:
+            stats = tracked[key] = TrafficStats()
+            while len(tracked) > self.max_tracked:
+                tracked.popitem(last=False)
+        else:
+            tracked.move_to_end(key)
+        return stats
+
+    def _get_all_stats(self, peer_address: str,
+                       blob_hash: typing.Optional[str] = None) -> typing.List[TrafficStats]:
+        all_stats = [self.total, self._get_stats(self.peers, peer_address)]
+        if blob_hash:
+            all_stats.append(self._get_stats(self.blobs, blob_hash))
+        return all_stats
+
+    def connection_made(self):
+        self.active_connections += 1
+        self.connections += 1
+
+    def connection_lost(self):
+        self.active_connections -= 1
+
+    def record_request(self, peer_address: str, blob_hash: typing.Optional[str] = None):
+        for stats in self._get_all_stats(peer_address, blob_hash):
+            stats.requests += 1
+
+    def record_upload(self, peer_address: str, blob_hash: str, sent: int, duration: float):
+        for stats in self._get_all_stats(peer_address, blob_hash):
+            stats.blobs_sent += 1
+            stats.bytes_sent += sent
+            stats.record_send_time(duration)
+
+    def record_not_found(self, peer_address: str, blob_hash: str):
+        for stats in self._get_all_stats(peer_address, blob_hash):
+            stats.not_found += 1
+
+    def record_error(self, peer_address: str, blob_hash: typing.Optional[str] = None):
+        for stats in self._get_all_stats(peer_address, blob_hash):
+            stats.errors += 1
+
+    def to_snapshot(self) -> typing.Dict:
+        return {
+            'active_connections': self.active_connections,
+            'connections': self.connections,
+            'total': self.total.to_dict(),
+            'blobs': {blob_hash: stats.to_dict() for blob_hash, stats in self.blobs.items()},
+            'peers': {address: stats.to_dict() for address, stats in self.peers.items()}
+        }
+
+    def add_snapshot(self, snapshot: typing.Dict):
+        """
+        Add the counts of another blob server, from its to_snapshot()
+        """
+        self.active_connections += snapshot['active_connections']
+        self.connections += snapshot['connections']
+        self.total.add(snapshot['total'])
+        for blob_hash, stats in snapshot['blobs'].items():
+            self._get_stats(self.blobs, blob_hash).add(stats)
+        for address, stats in snapshot['peers'].items():
+            self._get_stats(self.peers, address).add(stats)
+
+    @staticmethod
+    def _format_stats(stats: TrafficStats) -> typing.Dict:
+        formatted = stats.to_dict()
+        del formatted['send_times'], formatted['send_time_total']
+        formatted['send_time'] = {
+            'average': 0.0 if not stats.blobs_sent else round(stats.send_time_total / stats.blobs_sent, 4),
+            'histogram': [
+                {'le': upper_bound, 'count': count}
+                for upper_bound, count in zip(SEND_TIME_BUCKETS + (None,), stats.send_times)
+            ]
+        }
+        return formatted
+
+    def to_dict(self, top: int = 10) -> typing.Dict:
+        """
+        Totals along with the `top` blobs and peers we sent the most bytes
+        """
+        def by_bytes_sent(tracked: typing.Dict[str, TrafficStats]):
+            return sorted(tracked.items(), key=lambda item: item[1].bytes_sent, reverse=True)[:top]
+
+        return {
+            'active_connections': self.active_connections,
+            'connections': self.connections,
+            'total': self._format_stats(self.total),
+            'blobs': [
+                dict(blob_hash=blob_hash, **self._format_stats(stats))
+                for blob_hash, stats in by_bytes_sent(self.blobs)
+            ],
+            'peers': [
+                dict(address=address, **self._format_stats(stats))
+                for address, stats in by_bytes_sent(self.peers)
+            ]
+        }
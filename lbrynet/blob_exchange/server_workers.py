@@ -0,0 +1,222 @@
+import os
+import json
+import math
+import socket
+import asyncio
+import logging
+import typing
+import multiprocessing
+from multiprocessing.connection import Connection
+from lbrynet.conf import Config
+from lbrynet.blob_exchange.server import BlobServer
+from lbrynet.blob_exchange.server_metrics import BlobServerMetrics
+
+if typing.TYPE_CHECKING:
+    from lbrynet.blob.blob_manager import BlobFileManager
+
+log = logging.getLogger(__name__)
+
+# settings the workers need from the daemon's config
+WORKER_SETTINGS = (
+    'data_dir', 'blob_storage', 'hot_blob_cache_size', 'spill_blob_writes_to_disk', 'blob_storage_limit'
+)
+# seconds between the metrics snapshots the workers send to the daemon
+METRICS_INTERVAL = 5.0
+
+
+def can_use_workers(config: Config) -> bool:
+    # the segment store keeps its index in memory, so only the daemon knows where new blobs are
+    return hasattr(socket, 'SO_REUSEPORT') and config.blob_storage == 'files'
+
+
+class BlobUpdatesProtocol(asyncio.Protocol):
+    """
+    Receives the blobs the daemon completed or removed, one per line: '+<blob hash>' or '-<blob hash>'
+    """
+
+    def __init__(self, blob_manager: 'BlobFileManager', closed: asyncio.Future):
+        self.blob_manager = blob_manager
+        self.closed = closed
+        self.buf = bytearray()
+
+    def data_received(self, data: bytes):
+        self.buf.extend(data)
+        end = self.buf.rfind(b'\n')
+        if end == -1:
+            return
+        lines = self.buf[:end].split(b'\n')
+        del self.buf[:end + 1]
+        for line in lines:
+            blob_hash = line[1:].decode()
+            # the blob may have been asked for before it was completed, or it may have been deleted
+            blob = self.blob_manager.blobs.pop(blob_hash, None)
+            if blob:
+                blob.close()
+            if line[:1] == b'+':
+                self.blob_manager.completed_blob_hashes.add(blob_hash)
+            else:
+                self.blob_manager.completed_blob_hashes.discard(blob_hash)
+                self.blob_manager.memory_cache.remove(blob_hash)
+
+    def connection_lost(self, exc):
+        if not self.closed.done():
+            self.closed.set_result(None)
+
+
+class WorkerMetricsProtocol(asyncio.Protocol):
+    """
+    Receives the metrics snapshots of a worker, one JSON object per line
+    """
+
+    def __init__(self, worker_metrics: typing.Dict[int, typing.Dict], worker: int):
+        self.worker_metrics = worker_metrics
+        self.worker = worker
+        self.buf = bytearray()
+
+    def data_received(self, data: bytes):
+        self.buf.extend(data)
+        end = self.buf.rfind(b'\n')
+        if end == -1:
+            return
+        latest = self.buf[:end].rsplit(b'\n', 1)[-1]
+        del self.buf[:end + 1]
+        self.worker_metrics[self.worker] = json.loads(latest.decode())
+
+
+async def serve_blobs(settings: typing.Dict, blob_dir: str, lbrycrd_address: str, port: int, interface: str,
+                      max_concurrent_uploads: int, upload_rate_limit: float, peer_upload_rate_limit: float,
+                      updates: Connection, metrics: Connection, ready: multiprocessing.Event):
+    from lbrynet.extras.daemon.storage import SQLiteStorage
+    from lbrynet.blob.blob_manager import BlobFileManager
+
+    loop = asyncio.get_event_loop()
+    conf = Config(**settings)
+    storage = SQLiteStorage(conf, os.path.join(conf.data_dir, "lbrynet.sqlite"))
+    await storage.open()
+    blob_manager = BlobFileManager(loop, blob_dir, storage, config=conf)
+    # not BlobFileManager.setup, the daemon owns the blob directory and removes its leftover temporary files
+    await loop.run_in_executor(None, blob_manager.store.setup)
+    closed = loop.create_future()
+    await loop.connect_read_pipe(lambda: BlobUpdatesProtocol(blob_manager, closed), updates)
+    server = BlobServer(
+        loop, blob_manager, lbrycrd_address, max_concurrent_uploads, upload_rate_limit, peer_upload_rate_limit
+    )
+    server.start_server(port, interface, reuse_port=True)
+    await server.started_listening.wait()
+    metrics_transport, _ = await loop.connect_write_pipe(asyncio.Protocol, metrics)
+    ready.set()
+    last_flush = loop.time()
+    try:
+        # the daemon closes the pipe when it stops (or dies)
+        while not closed.done():
+            await asyncio.wait([closed], timeout=METRICS_INTERVAL, loop=loop)
+            metrics_transport.write(json.dumps(server.metrics.to_snapshot()).encode() + b'\n')
+            if loop.time() - last_flush >= blob_manager.DISK_QUOTA_INTERVAL:
+                last_flush = loop.time()
+                await blob_manager.flush_blob_access()
+        await blob_manager.flush_blob_access()
+    finally:
+        metrics_transport.close()
+        server.stop_server()
+        blob_manager.stop()
+        await storage.close()
+
+
+def run_worker(settings: typing.Dict, blob_dir: str, lbrycrd_address: str, port: int, interface: str,
+               max_concurrent_uploads: int, upload_rate_limit: float, peer_upload_rate_limit: float,
+               updates: Connection, metrics: Connection, ready: multiprocessing.Event):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)-8s %(name)s:%(lineno)d: %(message)s")
+    try:
+        asyncio.get_event_loop().run_until_complete(serve_blobs(
+            settings=settings, blob_dir=blob_dir, lbrycrd_address=lbrycrd_address, port=port, interface=interface,
+            max_concurrent_uploads=max_concurrent_uploads, upload_rate_limit=upload_rate_limit,
+            peer_upload_rate_limit=peer_upload_rate_limit, updates=updates, metrics=metrics, ready=ready
+        ))
+    except KeyboardInterrupt:
+        pass
+
+
+class BlobServerWorkers:
+    """
+    Serves blobs from `worker_count` processes listening on the blob server port with SO_REUSEPORT, so uploads
+    don't run in the daemon's event loop and can use more than one core
+
+    The workers read the blobs from the blob directory and open the database to look up streams. They are sent the
+    completed blob hashes when they start and each blob the daemon completes or removes after that, and send back
+    snapshots of their metrics every `METRICS_INTERVAL` seconds. The upload limits are split evenly between the
+    workers.
+    """
+
+    def __init__(self, loop: asyncio.BaseEventLoop, config: Config, blob_manager: 'BlobFileManager',
+                 lbrycrd_address: str, worker_count: int):
+        self.loop = loop
+        self.config = config
+        self.blob_manager = blob_manager
+        self.lbrycrd_address = lbrycrd_address
+        self.worker_count = worker_count
+        self.workers: typing.List[typing.Tuple[multiprocessing.Process, asyncio.WriteTransport]] = []
+        self.metrics_transports: typing.List[asyncio.ReadTransport] = []
+        self.worker_metrics: typing.Dict[int, typing.Dict] = {}  # worker number: latest metrics snapshot
+
+    @property
+    def metrics(self) -> BlobServerMetrics:
+        metrics = BlobServerMetrics()
+        for snapshot in self.worker_metrics.values():
+            metrics.add_snapshot(snapshot)
+        return metrics
+
+    def blob_changed(self, blob_hash: str, completed: bool):
+        line = (b'+' if completed else b'-') + blob_hash.encode() + b'\n'
+        for _, updates in self.workers:
+            updates.write(line)
+
+    async def start(self, port: int, interface: str = '0.0.0.0', start_timeout: float = 30.0):
+        context = multiprocessing.get_context('spawn')
+        settings = {name: getattr(self.config, name) for name in WORKER_SETTINGS}
+        max_concurrent_uploads = math.ceil(self.config.max_concurrent_blob_uploads / self.worker_count)
+        upload_rate_limit = self.config.blob_upload_rate_limit * 2**20 / self.worker_count
+        peer_upload_rate_limit = self.config.peer_blob_upload_rate_limit * 2**20
+        readies = []
+        self.blob_manager.blob_listeners.append(self.blob_changed)
+        for worker in range(self.worker_count):
+            reader, writer = context.Pipe(duplex=False)
+            metrics_reader, metrics_writer = context.Pipe(duplex=False)
+            ready = context.Event()
+            process = context.Process(
+                target=run_worker, daemon=True, args=(
+                    settings, self.blob_manager.blob_dir, self.lbrycrd_address, port, interface,
+                    max_concurrent_uploads, upload_rate_limit, peer_upload_rate_limit, reader, metrics_writer, ready
+                )
+            )
+            process.start()
+            reader.close()
+            metrics_writer.close()
+            metrics_transport, _ = await self.loop.connect_read_pipe(
+                lambda: WorkerMetricsProtocol(self.worker_metrics, worker), metrics_reader
+            )
+            self.metrics_transports.append(metrics_transport)
+            updates, _ = await self.loop.connect_write_pipe(asyncio.Protocol, writer)
+            updates.write(b''.join(b'+' + blob_hash.encode() + b'\n'
+                                   for blob_hash in self.blob_manager.completed_blob_hashes))
+            self.workers.append((process, updates))
+            readies.append(ready)
+        for ready in readies:
+            if not await self.loop.run_in_executor(None, ready.wait, start_timeout):
+                raise Exception("blob server worker didn't start")
+        log.info("%i blob server workers listening on TCP %s:%i", self.worker_count, interface, port)
+
+    async def stop(self, timeout: float = 10.0):
+        if self.blob_changed in self.blob_manager.blob_listeners:
+            self.blob_manager.blob_listeners.remove(self.blob_changed)
+        workers, self.workers = self.workers, []
+        for _, updates in workers:
+            updates.close()
+        for process, _ in workers:
+            await self.loop.run_in_executor(None, process.join, timeout)
+            if process.is_alive():
+                process.terminate()
+        metrics_transports, self.metrics_transports = self.metrics_transports, []
+        for metrics_transport in metrics_transports:
+            metrics_transport.close()
+        if workers:
+            log.info("stopped %i blob server workers", len(workers))
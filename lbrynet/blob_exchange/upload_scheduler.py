@@ -0,0 +1,113 @@
+import asyncio
+import typing
+
+
+class RateLimiter:
+    """
+    Spaces out transfers so that on average no more than `rate` bytes per second are sent
+    """
+
+    def __init__(self, loop: asyncio.BaseEventLoop, rate: float):
+        self.loop = loop
+        self.rate = rate  # bytes per second
+        self.next_free = loop.time()
+
+    @property
+    def idle(self) -> bool:
+        return self.next_free <= self.loop.time()
+
+    def reserve(self, size: int) -> float:
+        """
+        Reserve the bandwidth to send `size` bytes, returns how long to wait before sending them
+        """
+        now = self.loop.time()
+        start = max(now, self.next_free)
+        self.next_free = start + size / self.rate
+        return start - now
+
+
+class UploadScheduler:
+    """
+    Decides when blob uploads may start and how fast they may go
+
+    At most `max_concurrent_uploads` blobs are sent at once (0 for no limit). When all the upload slots are taken,
+    waiting uploads of sd and head blobs go first, then uploads to the peers with the fewest running uploads so one
+    aggressive downloader can't take every slot. Uploads are throttled to `rate_limit` bytes per second overall and
+    `peer_rate_limit` bytes per second for each peer (0 for no limit).
+    """
+
+    def __init__(self, loop: asyncio.BaseEventLoop, max_concurrent_uploads: int = 0, rate_limit: float = 0.0,
+                 peer_rate_limit: float = 0.0):
+        self.loop = loop
+        self.max_concurrent_uploads = max_concurrent_uploads
+        self.peer_rate_limit = peer_rate_limit
+        self.rate_limiter = RateLimiter(loop, rate_limit) if rate_limit else None
+        self.peer_rate_limiters: typing.Dict[str, RateLimiter] = {}
+        self.uploading: typing.Dict[str, int] = {}  # peer address: running uploads
+        self.waiting: typing.List[typing.Tuple[bool, int, str, asyncio.Future]] = []
+        self._waiter_count = 0
+
+    @property
+    def throttled(self) -> bool:
+        return self.rate_limiter is not None or self.peer_rate_limit > 0
+
+    @property
+    def running_uploads(self) -> int:
+        return sum(self.uploading.values())
+
+    @property
+    def full(self) -> bool:
+        return bool(self.max_concurrent_uploads) and (
+            self.running_uploads >= self.max_concurrent_uploads or bool(self.waiting)
+        )
+
+    def _start(self, peer_address: str):
+        self.uploading[peer_address] = self.uploading.get(peer_address, 0) + 1
+
+    async def wait_for_slot(self, peer_address: str, priority: bool = False):
+        """
+        Wait until the upload to the peer may start, every call must be followed by a call to `release`
+        """
+        if not self.full:
+            self._start(peer_address)
+            return
+        self._waiter_count += 1
+        waiter = (not priority, self._waiter_count, peer_address, self.loop.create_future())
+        self.waiting.append(waiter)
+        try:
+            await waiter[3]
+        except asyncio.CancelledError:
+            if waiter in self.waiting:
+                self.waiting.remove(waiter)
+            elif not waiter[3].cancelled():  # the slot was handed to us as we got cancelled
+                self.release(peer_address)
+            raise
+
+    def release(self, peer_address: str):
+        self.uploading[peer_address] -= 1
+        if not self.uploading[peer_address]:
+            del self.uploading[peer_address]
+            limiter = self.peer_rate_limiters.get(peer_address)
+            if limiter and limiter.idle:
+                del self.peer_rate_limiters[peer_address]
+        while self.waiting and self.running_uploads < self.max_concurrent_uploads:
+            waiter = min(self.waiting, key=lambda w: (w[0], self.uploading.get(w[2], 0), w[1]))
+            self.waiting.remove(waiter)
+            if waiter[3].done():
+                continue
+            self._start(waiter[2])
+            waiter[3].set_result(None)
+
+    async def throttle(self, peer_address: str, size: int):
+        """
+        Wait until `size` more bytes may be sent to the peer
+        """
+        delay = 0.0
+        if self.rate_limiter:
+            delay = self.rate_limiter.reserve(size)
+        if self.peer_rate_limit:
+            if peer_address not in self.peer_rate_limiters:
+                self.peer_rate_limiters[peer_address] = RateLimiter(self.loop, self.peer_rate_limit)
+            delay = max(delay, self.peer_rate_limiters[peer_address].reserve(size))
+        if delay:
+            await asyncio.sleep(delay, loop=self.loop)
@@ -460,6 +460,37 @@ class Config(CLIConfig):
         previous_names=['lbryum_wallet_dir'], metavar='DIR'
     )
 
+    # blob storage
+    shard_blob_dir = Toggle(
+        "Store blobs in subdirectories named by the first characters of their hash rather than in one flat directory."
+        " Existing blobs are moved into the subdirectories in the background.", False
+    )
+    blob_storage = String(
+        "How blobs are kept on disk: 'files' stores each blob in its own file, 'segments' appends blobs into large"
+        " segment files indexed by offset, which is easier on the filesystem when there are millions of blobs.", 'files'
+    )
+    blob_segment_size = Integer("Maximum size of a blob segment file in MB, when blob_storage is 'segments'.", 1024)
+    fast_blob_manager_startup = Toggle(
+        "Load the completed blobs from the database at startup without scanning the blob directory first. The blob"
+        " directory is checked in the background afterwards and blobs found to be missing are marked as pending.", False
+    )
+    blob_cache_size = Integer(
+        "Maximum number of blob objects kept in memory, the least recently used are dropped first. Blobs that are"
+        " being downloaded or uploaded are always kept.", 10000
+    )
+    blob_storage_limit = Integer(
+        "Disk space in MB that blobs are allowed to use, the least recently used and least uploaded blobs are deleted"
+        " in the background to stay under it. The sd and head blobs of our streams are kept. 0 means no limit.", 0
+    )
+    blob_scrub_rate = Float(
+        "MB per second of completed blobs to re-hash in the background to find blobs corrupted on disk, corrupt blobs"
+        " are marked as pending so they are downloaded again. Set to 0 to disable.", 0.0
+    )
+    spill_blob_writes_to_disk = Toggle(
+        "Write blobs being downloaded into a temporary file in the blob directory as they are received instead of"
+        " holding them in memory until they are verified, the file is renamed into place once the hash matches.", False
+    )
+
     # network
     use_upnp = Toggle(
         "Use UPnP to setup temporary port redirects for the DHT and the hosting of blobs. If you manually forward"
@@ -469,6 +500,23 @@ class Config(CLIConfig):
     tcp_port = Integer("TCP port to listen for incoming blob requests", 3333, previous_names=['peer_port'])
     network_interface = String("Interface to use for the DHT and blob exchange", '0.0.0.0')
 
+    # blob uploads
+    max_concurrent_blob_uploads = Integer(
+        "Maximum number of blobs to upload at once, further requests wait in a queue where descriptor and first data"
+        " blobs go first and peers with the fewest uploads are served before the rest. Set to 0 for no limit.", 0
+    )
+    blob_upload_rate_limit = Float("MB per second to upload to all peers combined. Set to 0 for no limit.", 0.0)
+    peer_blob_upload_rate_limit = Float("MB per second to upload to a single peer. Set to 0 for no limit.", 0.0)
+    hot_blob_cache_size = Float(
+        "MB of memory to keep the contents of frequently uploaded blobs in, so they don't have to be read from disk"
+        " for every upload. Set to 0 to disable.", 32.0
+    )
+    blob_server_workers = Integer(
+        "Number of extra processes to serve blobs from, they share tcp_port with SO_REUSEPORT so uploads don't slow"
+        " down the daemon. The upload limits are split between them. Requires SO_REUSEPORT and blob_storage 'files'."
+        " Set to 0 to serve blobs from the daemon.", 0
+    )
+
     # routing table
     split_buckets_under_index = Integer(
         "Routing table bucket index below which we always split the bucket if given a new key to add to it and "
@@ -492,10 +540,35 @@ class Config(CLIConfig):
         "Number of blobs to iteratively announce at once, set to 0 to disable", 10,
         previous_names=['concurrent_announcers']
     )
+    blob_write_behind_interval = Float(
+        "Seconds to queue blob completions and announcements for before writing them to the database together in"
+        " one transaction, queued updates are written on shutdown. Set to 0 to write each one immediately.", 0.0
+    )
     max_connections_per_download = Integer(
         "Maximum number of peers to connect to while downloading a blob", 8,
         previous_names=['max_connections_per_stream']
     )
+    max_connections_per_peer = Integer(
+        "Maximum number of connections to a single peer, shared by all running downloads", 4
+    )
+    max_concurrent_downloads = Integer(
+        "Maximum number of streams to download at once, the others wait in a queue. Downloads started with get go"
+        " ahead of the ones resumed on startup, pausing them if needed. Set to 0 to not limit it.", 5
+    )
+    max_download_connections = Integer(
+        "Maximum number of blob requests made at once by all the running downloads, split evenly between them."
+        " Each download still makes no more than max_connections_per_download.", 32
+    )
+    stream_read_ahead_blobs = Integer(
+        "Number of blobs of a stream to download at once, the blobs after the one being decrypted are fetched from"
+        " other peers in the meantime. Limited by max_connections_per_download and stream_read_ahead_memory.", 4
+    )
+    stream_read_ahead_memory = Integer(
+        "MB of memory that blobs being downloaded ahead of the one being decrypted may take up.", 16
+    )
+    idle_peer_connection_timeout = Float(
+        "Seconds to keep an idle connection to a peer open for reuse by the next blob request", 30.0
+    )
     fixed_peer_delay = Float(
         "Amount of seconds before adding the reflector servers as potential peers to download from in case dht"
         "peers are not found or are slow", 2.0
@@ -503,6 +576,11 @@ class Config(CLIConfig):
     max_key_fee = MaxKeyFee(
         "Don't download streams with fees exceeding this amount", {'currency': 'USD', 'amount': 50.0}
     )
+    save_files = Toggle(
+        "Write a decrypted copy of downloaded streams to the download directory by default. When disabled only the"
+        " blobs are downloaded, the stream can still be played from /stream/<sd_hash> or saved later with"
+        " file_save.", True
+    )
 
     # reflector settings
     reflect_streams = Toggle(
@@ -3,6 +3,7 @@ import asyncio
 from lbrynet.conf import Config
 from lbrynet.error import ComponentStartConditionNotMet
 from lbrynet.dht.peer import PeerManager
+from lbrynet.blob_exchange.connection_manager import ConnectionManager
 
 log = logging.getLogger(__name__)
 
@@ -44,6 +45,9 @@ class ComponentManager:
         self.components = set()
         self.started = asyncio.Event(loop=self.loop)
         self.peer_manager = peer_manager or PeerManager(asyncio.get_event_loop_policy().get_event_loop())
+        self.connection_manager = ConnectionManager(
+            self.loop, conf.max_connections_per_peer, conf.idle_peer_connection_timeout
+        )
 
         for component_name, component_class in self.default_component_classes.items():
             if component_name in override_components:
@@ -132,6 +136,7 @@ class ComponentManager:
             ]
             if needing_stop:
                 await asyncio.wait(needing_stop)
+        self.connection_manager.stop()
 
     def all_components_running(self, *component_names):
         """
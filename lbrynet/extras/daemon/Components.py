@@ -17,7 +17,9 @@ from lbrynet.conf import HEADERS_FILE_SHA256_CHECKSUM
 from lbrynet.dht.node import Node
 from lbrynet.dht.blob_announcer import BlobAnnouncer
 from lbrynet.blob.blob_manager import BlobFileManager
+from lbrynet.blob.blob_scrubber import BlobScrubber
 from lbrynet.blob_exchange.server import BlobServer
+from lbrynet.blob_exchange.server_workers import BlobServerWorkers, can_use_workers
 from lbrynet.stream.stream_manager import StreamManager
 from lbrynet.extras.daemon.Component import Component
 from lbrynet.extras.daemon.exchange_rate_manager import ExchangeRateManager
@@ -32,6 +34,7 @@ log = logging.getLogger(__name__)
 
 DATABASE_COMPONENT = "database"
 BLOB_COMPONENT = "blob_manager"
+BLOB_SCRUBBER_COMPONENT = "blob_scrubber"
 HEADERS_COMPONENT = "blockchain_headers"
 WALLET_COMPONENT = "wallet"
 DHT_COMPONENT = "dht"
@@ -63,7 +66,7 @@ class DatabaseComponent(Component):
 
     @staticmethod
     def get_current_db_revision():
-        return 9
+        return 12
 
     @property
     def revision_filename(self):
@@ -102,8 +105,10 @@ class DatabaseComponent(Component):
             self.conf, os.path.join(self.conf.data_dir, "lbrynet.sqlite")
         )
         await self.storage.open()
+        await self.component_manager.connection_manager.peer_quality.open(self.storage)
 
     async def stop(self):
+        await self.component_manager.connection_manager.peer_quality.close()
         await self.storage.close()
         self.storage = None
 
@@ -292,7 +297,7 @@ class BlobComponent(Component):
             if dht_node:
                 data_store = dht_node.protocol.data_store
         self.blob_manager = BlobFileManager(asyncio.get_event_loop(), os.path.join(self.conf.data_dir, "blobfiles"),
-                                            storage, data_store)
+                                            storage, data_store, self.conf)
         return await self.blob_manager.setup()
 
     async def stop(self):
@@ -300,9 +305,47 @@ class BlobComponent(Component):
 
     async def get_status(self):
         count = 0
+        hot_blob_cache = {'size': 0, 'blobs': 0, 'hits': 0, 'misses': 0}
         if self.blob_manager:
             count = len(self.blob_manager.completed_blob_hashes)
-        return {'finished_blobs': count}
+            cache = self.blob_manager.memory_cache
+            hot_blob_cache = {'size': cache.size, 'blobs': len(cache.blobs), 'hits': cache.hits, 'misses': cache.misses}
+        return {'finished_blobs': count, 'hot_blob_cache': hot_blob_cache}
+
+
+class BlobScrubberComponent(Component):
+    component_name = BLOB_SCRUBBER_COMPONENT
+    depends_on = [BLOB_COMPONENT, DATABASE_COMPONENT]
+
+    def __init__(self, component_manager):
+        super().__init__(component_manager)
+        self.blob_scrubber: BlobScrubber = None
+
+    @property
+    def component(self) -> typing.Optional[BlobScrubber]:
+        return self.blob_scrubber
+
+    async def start(self):
+        blob_manager = self.component_manager.get_component(BLOB_COMPONENT)
+        self.blob_scrubber = BlobScrubber(asyncio.get_event_loop(), blob_manager, self.conf.blob_scrub_rate * 2**20)
+        if self.conf.blob_scrub_rate:
+            self.blob_scrubber.start()
+            log.info("Started blob scrubber")
+
+    async def stop(self):
+        self.blob_scrubber.stop()
+
+    async def get_status(self):
+        if not self.blob_scrubber:
+            return
+        return {
+            'running': self.blob_scrubber.running,
+            'blobs_to_scrub': self.blob_scrubber.blobs_to_scrub,
+            'scrubbed_blobs': self.blob_scrubber.scrubbed_blobs,
+            'corrupt_blobs': self.blob_scrubber.corrupt_blobs,
+            'finished_passes': self.blob_scrubber.finished_passes,
+            'last_pass_finished': self.blob_scrubber.last_pass_finished
+        }
 
 
 class DHTComponent(Component):
@@ -413,7 +456,9 @@ class StreamManagerComponent(Component):
         if not self.stream_manager:
             return
         return {
-            'managed_files': len(self.stream_manager.streams)
+            'managed_files': len(self.stream_manager.streams),
+            'running_downloads': len(self.stream_manager.running_downloaders),
+            'queued_downloads': len(self.stream_manager.download_queue.queued)
         }
 
     async def start(self):
@@ -427,7 +472,8 @@ class StreamManagerComponent(Component):
         log.info('Starting the file manager')
         loop = asyncio.get_event_loop()
         self.stream_manager = StreamManager(
-            loop, self.conf, blob_manager, wallet, storage, node, self.component_manager.analytics_manager
+            loop, self.conf, blob_manager, wallet, storage, node, self.component_manager.analytics_manager,
+            self.component_manager.connection_manager
         )
         await self.stream_manager.start()
         log.info('Done setting up file manager')
@@ -439,14 +485,38 @@ class StreamManagerComponent(Component):
 class PeerProtocolServerComponent(Component):
     component_name = PEER_PROTOCOL_SERVER_COMPONENT
     depends_on = [UPNP_COMPONENT, BLOB_COMPONENT, WALLET_COMPONENT]
+    UPLOAD_REPORT_INTERVAL = 1800
 
     def __init__(self, component_manager):
         super().__init__(component_manager)
         self.blob_server: BlobServer = None
+        self.blob_server_workers: typing.Optional[BlobServerWorkers] = None
+        self.report_uploads_task: typing.Optional[asyncio.Task] = None
+        self.reported_bytes_uploaded = 0
 
     @property
-    def component(self) -> typing.Optional[BlobServer]:
-        return self.blob_server
+    def component(self) -> typing.Optional[typing.Union[BlobServer, BlobServerWorkers]]:
+        return self.blob_server or self.blob_server_workers
+
+    async def get_status(self):
+        if not self.component:
+            return
+        metrics = self.component.metrics
+        return {
+            'workers': 0 if not self.blob_server_workers else self.blob_server_workers.worker_count,
+            'active_connections': metrics.active_connections,
+            'blobs_sent': metrics.total.blobs_sent,
+            'bytes_sent': metrics.total.bytes_sent
+        }
+
+    async def report_uploads(self):
+        analytics_manager = self.component_manager.analytics_manager
+        while True:
+            await asyncio.sleep(self.UPLOAD_REPORT_INTERVAL)
+            bytes_sent = self.component.metrics.total.bytes_sent
+            if bytes_sent > self.reported_bytes_uploaded:
+                await analytics_manager.send_blob_bytes_uploaded(bytes_sent - self.reported_bytes_uploaded)
+                self.reported_bytes_uploaded = bytes_sent
 
     async def start(self):
         log.info("start blob server")
@@ -455,13 +525,32 @@ class PeerProtocolServerComponent(Component):
         wallet: LbryWalletManager = self.component_manager.get_component(WALLET_COMPONENT)
         peer_port = self.conf.tcp_port
         address = await wallet.get_unused_address()
-        self.blob_server = BlobServer(asyncio.get_event_loop(), blob_manager, address)
-        self.blob_server.start_server(peer_port, interface=self.conf.network_interface)
-        await self.blob_server.started_listening.wait()
+        if self.conf.blob_server_workers > 0:
+            if can_use_workers(self.conf):
+                self.blob_server_workers = BlobServerWorkers(
+                    asyncio.get_event_loop(), self.conf, blob_manager, address, self.conf.blob_server_workers
+                )
+                await self.blob_server_workers.start(peer_port, interface=self.conf.network_interface)
+            else:
+                log.warning("blob server workers need SO_REUSEPORT and blob_storage 'files', serving blobs from the "
+                            "daemon")
+        if not self.blob_server_workers:
+            self.blob_server = BlobServer(
+                asyncio.get_event_loop(), blob_manager, address, self.conf.max_concurrent_blob_uploads,
+                self.conf.blob_upload_rate_limit * 2**20, self.conf.peer_blob_upload_rate_limit * 2**20
+            )
+            self.blob_server.start_server(peer_port, interface=self.conf.network_interface)
+            await self.blob_server.started_listening.wait()
+        if self.component_manager.analytics_manager:
+            self.report_uploads_task = asyncio.create_task(self.report_uploads())
 
     async def stop(self):
+        if self.report_uploads_task and not self.report_uploads_task.done():
+            self.report_uploads_task.cancel()
         if self.blob_server:
             self.blob_server.stop_server()
+        if self.blob_server_workers:
+            await self.blob_server_workers.stop()
 
 
 class UPnPComponent(Component):
@@ -20,13 +20,14 @@ from lbrynet import utils
 from lbrynet.conf import Config, Setting
 from lbrynet.blob.blob_file import is_valid_blobhash
 from lbrynet.blob_exchange.downloader import download_blob
-from lbrynet.error import DownloadSDTimeout, ComponentsNotStarted
+from lbrynet.error import DownloadSDTimeout, DownloadDataTimeout, ComponentsNotStarted
 from lbrynet.error import NullFundsError, NegativeFundsError, ComponentStartConditionNotMet
 from lbrynet.extras import system_info
 from lbrynet.extras.daemon import analytics
 from lbrynet.extras.daemon.Components import WALLET_COMPONENT, DATABASE_COMPONENT, DHT_COMPONENT, BLOB_COMPONENT
 from lbrynet.extras.daemon.Components import STREAM_MANAGER_COMPONENT
 from lbrynet.extras.daemon.Components import EXCHANGE_RATE_MANAGER_COMPONENT, UPNP_COMPONENT
+from lbrynet.extras.daemon.Components import PEER_PROTOCOL_SERVER_COMPONENT
 from lbrynet.extras.daemon.ComponentManager import RequiredCondition
 from lbrynet.extras.daemon.ComponentManager import ComponentManager
 from lbrynet.extras.daemon.json_response_encoder import JSONResponseEncoder
@@ -36,6 +37,7 @@ from lbrynet.wallet.account import Account as LBCAccount
 from lbrynet.wallet.dewies import dewies_to_lbc, lbc_to_dewies
 from lbrynet.schema.claim import Claim
 from lbrynet.schema.uri import parse_lbry_uri, URIParseError
+from lbrynet.schema.mime_types import guess_media_type
 from lbrynet.extras.daemon.comment_client import jsonrpc_batch, jsonrpc_post, rpc_body
 
 
@@ -273,6 +275,7 @@ class Daemon(metaclass=JSONRPCServerType):
         app.router.add_get('/lbryapi', self.handle_old_jsonrpc)
         app.router.add_post('/lbryapi', self.handle_old_jsonrpc)
         app.router.add_post('/', self.handle_old_jsonrpc)
+        app.router.add_get('/stream/{sd_hash}', self.handle_stream_range_request)
         self.runner = web.AppRunner(app)
 
     @property
@@ -452,6 +455,49 @@ class Daemon(metaclass=JSONRPCServerType):
             content_type='application/json'
         )
 
+    async def handle_stream_range_request(self, request: web.Request):
+        """
+        Stream the decrypted contents of a stream, supports Range requests so players can seek without the whole
+        stream being downloaded first
+        """
+        sd_hash = request.match_info['sd_hash']
+        if not is_valid_blobhash(sd_hash):
+            raise web.HTTPNotFound()
+        if not self.component_manager.get_components_status().get(STREAM_MANAGER_COMPONENT):
+            raise web.HTTPServiceUnavailable(text="the stream manager is not running")
+        try:
+            reader = await self.stream_manager.get_stream_reader(sd_hash)
+        except DownloadSDTimeout:
+            raise web.HTTPGatewayTimeout(text=f"failed to download sd blob {sd_hash} within timeout")
+        try:
+            size = reader.size
+            try:
+                http_range = request.http_range
+            except ValueError:
+                raise web.HTTPRequestRangeNotSatisfiable(headers={'Content-Range': f'bytes */{size}'})
+            start, stop = http_range.start, http_range.stop
+            if start is not None and start < 0:  # the last -start bytes
+                start, stop = max(size + start, 0), None
+            start = start or 0
+            end = size - 1 if stop is None else min(stop, size) - 1
+            if start >= size or end < start:
+                raise web.HTTPRequestRangeNotSatisfiable(headers={'Content-Range': f'bytes */{size}'})
+            headers = {
+                'Accept-Ranges': 'bytes',
+                'Content-Type': guess_media_type(reader.descriptor.suggested_file_name)[0],
+                'Content-Length': str(end - start + 1)
+            }
+            if 'Range' in request.headers:
+                headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response = web.StreamResponse(status=206 if 'Range' in request.headers else 200, headers=headers)
+            await response.prepare(request)
+            async for data in reader.read(start, end):
+                await response.write(data)
+            await response.write_eof()
+            return response
+        finally:
+            self.stream_manager.release_stream_reader(reader)
+
     async def _process_rpc_call(self, data):
         args = data.get('params', {})
 
@@ -639,6 +685,7 @@ class Daemon(metaclass=JSONRPCServerType):
                 'skipped_components': (list) [names of skipped components (str)],
                 'startup_status': { Does not include components which have been skipped
                     'blob_manager': (bool),
+                    'blob_scrubber': (bool),
                     'blockchain_headers': (bool),
                     'database': (bool),
                     'dht': (bool),
@@ -670,12 +717,34 @@ class Daemon(metaclass=JSONRPCServerType):
                 },
                 'blob_manager': {
                     'finished_blobs': (int) number of finished blobs in the blob manager,
+                    'hot_blob_cache': {
+                        'size': (int) bytes of blobs held in memory for uploading,
+                        'blobs': (int) number of blobs held in memory,
+                        'hits': (int) uploads served from memory,
+                        'misses': (int) uploads read from disk,
+                    }
+                },
+                'blob_scrubber': {
+                    'running': (bool),
+                    'blobs_to_scrub': (int) number of blobs to check in the current pass,
+                    'scrubbed_blobs': (int) number of blobs checked in the current pass,
+                    'corrupt_blobs': (int) number of corrupt blobs found,
+                    'finished_passes': (int) number of times all the blobs were checked,
+                    'last_pass_finished': (float) timestamp of the end of the last pass,
                 },
                 'hash_announcer': {
                     'announce_queue_size': (int) number of blobs currently queued to be announced
                 },
+                'peer_protocol_server': {
+                    'workers': (int) number of worker processes serving blobs, 0 if served by the daemon,
+                    'active_connections': (int) number of peers connected to the blob server,
+                    'blobs_sent': (int) number of blobs uploaded,
+                    'bytes_sent': (int) number of blob bytes uploaded,
+                },
                 'stream_manager': {
                     'managed_files': (int) count of files in the stream manager,
+                    'running_downloads': (int) count of streams downloading,
+                    'queued_downloads': (int) count of streams waiting for a download slot,
                 },
                 'upnp': {
                     'aioupnp_version': (str),
@@ -827,24 +896,27 @@ class Daemon(metaclass=JSONRPCServerType):
     @requires(WALLET_COMPONENT, EXCHANGE_RATE_MANAGER_COMPONENT, BLOB_COMPONENT, DATABASE_COMPONENT,
               STREAM_MANAGER_COMPONENT,
               conditions=[WALLET_IS_UNLOCKED])
-    async def jsonrpc_get(self, uri, file_name=None, timeout=None):
+    async def jsonrpc_get(self, uri, file_name=None, timeout=None, save_file=None):
         """
         Download stream from a LBRY name.
 
         Usage:
             get <uri> [<file_name> | --file_name=<file_name>] [<timeout> | --timeout=<timeout>]
+                [--save_file=<save_file>]
 
 
         Options:
             --uri=<uri>              : (str) uri of the content to download
             --file_name=<file_name>  : (str) specified name for the downloaded file
             --timeout=<timeout>      : (int) download timeout in number of seconds
+            --save_file=<save_file>  : (bool) save the decrypted file to the download directory, if false only the
+                                       blobs are downloaded. Defaults to the save_files setting
 
         Returns: {File}
         """
         try:
             stream = await self.stream_manager.download_stream_from_uri(
-                uri, self.exchange_rate_manager, file_name, timeout
+                uri, self.exchange_rate_manager, file_name, timeout, save_file
             )
             if not stream:
                 raise DownloadSDTimeout(uri)
@@ -1480,6 +1552,43 @@ class Daemon(metaclass=JSONRPCServerType):
             )
         return msg
 
+    @requires(STREAM_MANAGER_COMPONENT)
+    async def jsonrpc_file_save(self, file_name=None, download_directory=None, **kwargs):
+        """
+        Write the decrypted file of a stream that was downloaded without saving one, or whose file was deleted
+
+        Usage:
+            file_save [--file_name=<file_name>] [--download_directory=<download_directory>] [--sd_hash=<sd_hash>]
+                      [--stream_hash=<stream_hash>] [--rowid=<rowid>] [--claim_id=<claim_id>] [--txid=<txid>]
+                      [--nout=<nout>] [--claim_name=<claim_name>] [--channel_claim_id=<channel_claim_id>]
+                      [--channel_name=<channel_name>]
+
+        Options:
+            --file_name=<file_name>                      : (str) name to save the file as, defaults to the
+                                                           suggested file name of the stream
+            --download_directory=<download_directory>    : (str) directory to save the file to, defaults to the
+                                                           download directory
+            --sd_hash=<sd_hash>                          : (str) save file with matching sd hash
+            --stream_hash=<stream_hash>                  : (str) save file with matching stream hash
+            --rowid=<rowid>                              : (int) save file with matching row id
+            --claim_id=<claim_id>                        : (str) save file with matching claim id
+            --txid=<txid>                                : (str) save file with matching claim txid
+            --nout=<nout>                                : (int) save file with matching claim nout
+            --claim_name=<claim_name>                    : (str) save file with matching claim name
+            --channel_claim_id=<channel_claim_id>        : (str) save file with matching channel claim id
+            --channel_name=<channel_name>                : (str) save file with matching channel claim name
+
+        Returns: {File}
+        """
+
+        streams = self.stream_manager.get_filtered_streams(**kwargs)
+        if len(streams) != 1:
+            raise Exception(f'Unable to find a single file for {kwargs}, found {len(streams)}')
+        stream = streams[0]
+        if not await self.stream_manager.save_file(stream, file_name, download_directory):
+            raise DownloadDataTimeout(stream.sd_hash)
+        return stream
+
     @requires(STREAM_MANAGER_COMPONENT)
     async def jsonrpc_file_delete(self, delete_from_download_dir=False, delete_all=False, **kwargs):
         """
@@ -2193,7 +2302,10 @@ class Daemon(metaclass=JSONRPCServerType):
                 )
 
         claim = Claim()
-        claim.stream.update(file_path=file_path, sd_hash='0'*96, **kwargs)
+        # unless previewing, the file hash is calculated while the stream is created instead of reading the file twice
+        claim.stream.update(
+            file_path=file_path, sd_hash='0'*96, file_hash_bytes=None if preview else b'\x00'*32, **kwargs
+        )
         tx = await Transaction.claim_create(
             name, claim, amount, claim_address, [account], account, channel
         )
@@ -2202,6 +2314,7 @@ class Daemon(metaclass=JSONRPCServerType):
         if not preview:
             file_stream = await self.stream_manager.create_stream(file_path)
             claim.stream.source.sd_hash = file_stream.sd_hash
+            claim.stream.source.file_hash_bytes = file_stream.descriptor.file_sha256
             new_txo.script.generate()
             if channel:
                 new_txo.sign(channel)
@@ -2350,7 +2463,10 @@ class Daemon(metaclass=JSONRPCServerType):
             self.valid_address_or_error(kwargs['fee_address'])
 
         claim = Claim.from_bytes(old_txo.claim.to_bytes())
-        claim.stream.update(file_path=file_path, **kwargs)
+        # unless previewing, the file hash is calculated while the stream is created instead of reading the file twice
+        claim.stream.update(
+            file_path=file_path, file_hash_bytes=None if preview else b'\x00'*32, **kwargs
+        )
         tx = await Transaction.claim_update(
             old_txo, claim, amount, claim_address, [account], account, channel
         )
@@ -2360,6 +2476,7 @@ class Daemon(metaclass=JSONRPCServerType):
             if file_path is not None:
                 file_stream = await self.stream_manager.create_stream(file_path)
                 new_txo.claim.stream.source.sd_hash = file_stream.sd_hash
+                new_txo.claim.stream.source.file_hash_bytes = file_stream.descriptor.file_sha256
                 new_txo.script.generate()
             if channel:
                 new_txo.sign(channel)
@@ -2774,10 +2891,12 @@ class Daemon(metaclass=JSONRPCServerType):
             (str) Success/Fail message or (dict) decoded data
         """
 
-        blob = await download_blob(asyncio.get_event_loop(), self.conf, self.blob_manager, self.dht_node, blob_hash)
+        blob = await download_blob(
+            asyncio.get_event_loop(), self.conf, self.blob_manager, self.dht_node, blob_hash,
+            self.component_manager.connection_manager
+        )
         if read:
-            with open(blob.file_path, 'rb') as handle:
-                return handle.read().decode()
+            return (await self.blob_manager.loop.run_in_executor(None, blob.get_blob_bytes)).decode()
         else:
             return "Downloaded blob %s" % blob_hash
 
@@ -2930,15 +3049,49 @@ class Daemon(metaclass=JSONRPCServerType):
         else:
             blobs = list(self.blob_manager.completed_blob_hashes)
         if needed:
-            blobs = [blob_hash for blob_hash in blobs if not self.blob_manager.get_blob(blob_hash).get_is_verified()]
+            blobs = [blob_hash for blob_hash in blobs if not self.blob_manager.is_blob_verified(blob_hash)]
         if finished:
-            blobs = [blob_hash for blob_hash in blobs if self.blob_manager.get_blob(blob_hash).get_is_verified()]
+            blobs = [blob_hash for blob_hash in blobs if self.blob_manager.is_blob_verified(blob_hash)]
         page_size = page_size or len(blobs)
         page = page or 0
         start_index = page * page_size
         stop_index = start_index + page_size
         return blobs[start_index:stop_index]
 
+    @requires(PEER_PROTOCOL_SERVER_COMPONENT)
+    def jsonrpc_blob_server_stats(self, top=None):
+        """
+        Get the traffic of the blob server, in total and for the blobs and peers it sent the most bytes
+
+        Usage:
+            blob_server_stats [--top=<top>]
+
+        Options:
+            --top=<top>     : (int) number of blobs and peers to list, defaults to 10
+
+        Returns:
+            (dict) blob server traffic
+            {
+                'active_connections': (int) number of peers connected now,
+                'connections': (int) number of connections accepted,
+                'total': {
+                    'requests': (int) number of requests received,
+                    'blobs_sent': (int) number of blobs uploaded,
+                    'bytes_sent': (int) number of blob bytes uploaded,
+                    'not_found': (int) number of requests for blobs we don't have,
+                    'errors': (int) number of failed uploads and undecodable requests,
+                    'send_time': {
+                        'average': (float) average seconds to send a blob,
+                        'histogram': (list) [{'le': (float) seconds or null for slower, 'count': (int)}]
+                    }
+                },
+                'blobs': (list) [{'blob_hash': (str), <the same fields as 'total'>}],
+                'peers': (list) [{'address': (str), <the same fields as 'total'>}]
+            }
+        """
+        server = self.component_manager.get_component(PEER_PROTOCOL_SERVER_COMPONENT)
+        return server.metrics.to_dict(10 if top is None else int(top))
+
     @requires(BLOB_COMPONENT)
     async def jsonrpc_blob_reflect(self, blob_hashes, reflector_server=None):
         """
@@ -197,6 +197,9 @@ class AnalyticsManager:
             )
         )
 
+    async def send_blob_bytes_uploaded(self, bytes_uploaded: int):
+        await self.track(self._event(BLOB_BYTES_UPLOADED, {'bytes': bytes_uploaded}))
+
     async def send_claim_action(self, action):
         await self.track(self._event(CLAIM_ACTION, {'action': action}))
 
@@ -22,6 +22,12 @@ def migrate_db(conf, start, end):
             from .migrate7to8 import do_migration
         elif current == 8:
             from .migrate8to9 import do_migration
+        elif current == 9:
+            from .migrate9to10 import do_migration
+        elif current == 10:
+            from .migrate10to11 import do_migration
+        elif current == 11:
+            from .migrate11to12 import do_migration
         else:
             raise Exception("DB migration of version {} to {} is not available".format(current,
                                                                                        current+1))
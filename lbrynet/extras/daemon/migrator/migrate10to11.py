@@ -0,0 +1,24 @@
+import sqlite3
+import os
+
+
+def do_migration(conf):
+    db_path = os.path.join(conf.data_dir, "lbrynet.sqlite")
+    connection = sqlite3.connect(db_path)
+    cursor = connection.cursor()
+
+    cursor.executescript(
+        """
+        create table if not exists peer_quality (
+            address text not null,
+            tcp_port integer not null,
+            throughput real not null,
+            connect_latency real,
+            failure_rate real not null,
+            last_seen integer not null,
+            primary key (address, tcp_port)
+        );
+        """
+    )
+    connection.commit()
+    connection.close()
@@ -0,0 +1,20 @@
+import sqlite3
+import os
+
+
+def do_migration(conf):
+    db_path = os.path.join(conf.data_dir, "lbrynet.sqlite")
+    connection = sqlite3.connect(db_path)
+    cursor = connection.cursor()
+
+    cursor.executescript(
+        """
+        create table if not exists file_assembly (
+            stream_hash text primary key not null,
+            output_path text not null,
+            decrypted_blobs blob not null
+        );
+        """
+    )
+    connection.commit()
+    connection.close()
@@ -0,0 +1,20 @@
+import sqlite3
+import os
+
+
+def do_migration(conf):
+    db_path = os.path.join(conf.data_dir, "lbrynet.sqlite")
+    connection = sqlite3.connect(db_path)
+    cursor = connection.cursor()
+
+    cursor.executescript(
+        """
+        create table if not exists blob_access (
+            blob_hash char(96) primary key not null,
+            last_access_time integer not null,
+            upload_count integer not null default 0
+        );
+        """
+    )
+    connection.commit()
+    connection.close()
@@ -193,6 +193,8 @@ def delete_stream(transaction: sqlite3.Connection, descriptor: 'StreamDescriptor
     transaction.execute("delete from stream_blob where stream_hash=?", (descriptor.stream_hash,))
     transaction.execute("delete from stream where stream_hash=? ", (descriptor.stream_hash,))
     transaction.executemany("delete from blob where blob_hash=?", blob_hashes)
+    transaction.executemany("delete from blob_access where blob_hash=?", blob_hashes)
+    transaction.execute("delete from file_assembly where stream_hash=?", (descriptor.stream_hash,))
 
 
 def store_file(transaction: sqlite3.Connection, stream_hash: str, file_name: str, download_directory: str,
@@ -275,6 +277,28 @@ class SQLiteStorage(SQLiteMixin):
                 timestamp integer,
                 primary key (sd_hash, reflector_address)
             );
+
+            create table if not exists blob_access (
+                blob_hash char(96) primary key not null,
+                last_access_time integer not null,
+                upload_count integer not null default 0
+            );
+
+            create table if not exists peer_quality (
+                address text not null,
+                tcp_port integer not null,
+                throughput real not null,
+                connect_latency real,
+                failure_rate real not null,
+                last_seen integer not null,
+                primary key (address, tcp_port)
+            );
+
+            create table if not exists file_assembly (
+                stream_hash text primary key not null,
+                output_path text not null,
+                decrypted_blobs blob not null
+            );
     """
 
     def __init__(self, conf: Config, path, loop=None, time_getter: typing.Optional[typing.Callable[[], float]] = None):
@@ -283,6 +307,18 @@ class SQLiteStorage(SQLiteMixin):
         self.content_claim_callbacks = {}
         self.loop = loop or asyncio.get_event_loop()
         self.time_getter = time_getter or time.time
+        # blob bookkeeping queued to be written in one transaction, see write_behind
+        self._queued_completed_blobs: typing.Dict[str, int] = {}
+        self._queued_announced_blobs: typing.Dict[str, int] = {}
+        self._queued_writes_flushed: typing.Optional[asyncio.Future] = None
+        self._flush_call: typing.Optional[asyncio.Handle] = None
+
+    async def close(self):
+        if self._flush_call:
+            self._flush_call.cancel()
+            self._flush_call = None
+        await self.flush_queued_writes()
+        await super().close()
 
     async def run_and_return_one_or_none(self, query, *args):
         for row in await self.db.execute_fetchall(query, args):
@@ -296,7 +332,70 @@ class SQLiteStorage(SQLiteMixin):
 
     # # # # # # # # # blob functions # # # # # # # # #
 
+    @property
+    def write_behind(self) -> bool:
+        """
+        If blob completions and announcements are queued and written together in one transaction every
+        blob_write_behind_interval seconds, rather than each in their own transaction
+        """
+        return self.conf.blob_write_behind_interval > 0
+
+    def _queue_write(self) -> asyncio.Future:
+        if not self._queued_writes_flushed:
+            self._queued_writes_flushed = self.loop.create_future()
+            self._flush_call = self.loop.call_later(
+                self.conf.blob_write_behind_interval, lambda: self.loop.create_task(self.flush_queued_writes())
+            )
+        return self._queued_writes_flushed
+
+    async def flush_queued_writes(self):
+        """
+        Write the queued blob completions and announcements in one transaction
+        """
+        completed, self._queued_completed_blobs = self._queued_completed_blobs, {}
+        announced, self._queued_announced_blobs = self._queued_announced_blobs, {}
+        flushed, self._queued_writes_flushed = self._queued_writes_flushed, None
+        self._flush_call = None
+        if not (completed or announced):
+            if flushed and not flushed.done():
+                flushed.set_result(None)
+            return
+
+        def _write_queued(transaction: sqlite3.Connection):
+            transaction.executemany(
+                "insert or ignore into blob values (?, ?, ?, ?, ?, ?, ?)",
+                [(blob_hash, length, 0, 0, "pending", 0, 0) for blob_hash, length in completed.items()]
+            )
+            transaction.executemany(
+                "update blob set status='finished' where blob.blob_hash=?", [(blob_hash, ) for blob_hash in completed]
+            )
+            transaction.executemany(
+                "update blob set next_announce_time=?, last_announced_time=?, single_announce=0 "
+                "where blob_hash=?",
+                [(int(last_announced + (data_expiration / 2)), int(last_announced), blob_hash)
+                 for blob_hash, last_announced in announced.items()]
+            )
+
+        try:
+            await self.db.run(_write_queued)
+        except Exception as err:
+            log.exception("failed to write %i completed and %i announced blobs", len(completed), len(announced))
+            if flushed and not flushed.done():
+                flushed.set_exception(err)
+            return
+        if flushed and not flushed.done():
+            flushed.set_result(None)
+
+    def _drop_queued_writes(self, blob_hashes: typing.List[str]):
+        for blob_hash in blob_hashes:
+            self._queued_completed_blobs.pop(blob_hash, None)
+            self._queued_announced_blobs.pop(blob_hash, None)
+
     def add_completed_blob(self, blob_hash: str, length: int):
+        if self.write_behind:
+            self._queued_completed_blobs[blob_hash] = length
+            return self._queue_write()
+
         def _add_blob(transaction: sqlite3.Connection):
             transaction.execute(
                 "insert or ignore into blob values (?, ?, ?, ?, ?, ?, ?)",
@@ -343,6 +442,11 @@ class SQLiteStorage(SQLiteMixin):
         )
 
     def update_last_announced_blobs(self, blob_hashes: typing.List[str]):
+        if self.write_behind:
+            last_announced = self.time_getter()
+            self._queued_announced_blobs.update({blob_hash: last_announced for blob_hash in blob_hashes})
+            return self._queue_write()
+
         def _update_last_announced_blobs(transaction: sqlite3.Connection):
             last_announced = self.time_getter()
             return transaction.executemany(
@@ -390,15 +494,60 @@ class SQLiteStorage(SQLiteMixin):
         return self.db.run(get_and_update)
 
     def delete_blobs_from_db(self, blob_hashes):
+        self._drop_queued_writes(blob_hashes)
+
         def delete_blobs(transaction):
             transaction.executemany(
                 "delete from blob where blob_hash=?;", [(blob_hash,) for blob_hash in blob_hashes]
             )
+            transaction.executemany(
+                "delete from blob_access where blob_hash=?;", [(blob_hash,) for blob_hash in blob_hashes]
+            )
         return self.db.run_with_foreign_keys_disabled(delete_blobs)
 
     def get_all_blob_hashes(self):
         return self.run_and_return_list("select blob_hash from blob")
 
+    def update_blob_access(self, accesses: typing.List[typing.Tuple[str, int, int]]):
+        """
+        Record the last access time and the number of new uploads for each (blob_hash, time, uploads)
+        """
+        def _update_blob_access(transaction: sqlite3.Connection):
+            transaction.executemany(
+                "insert or ignore into blob_access values (?, 0, 0)", [(blob_hash, ) for blob_hash, _, _ in accesses]
+            )
+            transaction.executemany(
+                "update blob_access set last_access_time=max(last_access_time, ?), upload_count=upload_count+? "
+                "where blob_hash=?", [(access_time, uploads, blob_hash) for blob_hash, access_time, uploads in accesses]
+            )
+        return self.db.run(_update_blob_access)
+
+    async def get_stored_blobs_length(self) -> int:
+        return await self.run_and_return_one_or_none(
+            "select coalesce(sum(blob_length), 0) from blob where status='finished'"
+        )
+
+    def get_coldest_blobs(self, limit: int) -> typing.Awaitable[typing.List[typing.Tuple[str, int]]]:
+        """
+        Get the hashes and lengths of the least recently accessed and least uploaded finished blobs, blobs that are
+        announced (sd and head blobs of our streams) are never included
+        """
+        return self.db.execute_fetchall(
+            "select b.blob_hash, b.blob_length from blob b "
+            "left outer join blob_access a on a.blob_hash=b.blob_hash "
+            "where b.status='finished' and b.should_announce=0 "
+            "order by coalesce(a.last_access_time, 0), coalesce(a.upload_count, 0) limit ?", (limit, )
+        )
+
+    def set_blobs_pending(self, blob_hashes: typing.List[str]):
+        self._drop_queued_writes(blob_hashes)
+
+        def _set_blobs_pending(transaction: sqlite3.Connection):
+            transaction.executemany(
+                "update blob set status='pending' where blob_hash=?", [(blob_hash, ) for blob_hash in blob_hashes]
+            )
+        return self.db.run(_set_blobs_pending)
+
     def sync_missing_blobs(self, blob_files: typing.Set[str]) -> typing.Awaitable[typing.Set[str]]:
         def _sync_blobs(transaction: sqlite3.Connection) -> typing.Set[str]:
             to_update = [
@@ -509,6 +658,23 @@ class SQLiteStorage(SQLiteMixin):
             stream_hash
         ))
 
+    def get_decrypted_blobs(self, stream_hash: str, output_path: str) -> typing.Awaitable[typing.Optional[bytes]]:
+        """
+        Get the bitmap of the blobs decrypted into a partially assembled file of the stream, bit `n % 8` of byte
+        `n // 8` is set once blob `n` is written
+        """
+        return self.run_and_return_one_or_none(
+            "select decrypted_blobs from file_assembly where stream_hash=? and output_path=?", stream_hash, output_path
+        )
+
+    def save_decrypted_blobs(self, stream_hash: str, output_path: str, decrypted_blobs: bytes):
+        return self.db.execute(
+            "insert or replace into file_assembly values (?, ?, ?)", (stream_hash, output_path, decrypted_blobs)
+        )
+
+    def delete_decrypted_blobs(self, stream_hash: str):
+        return self.db.execute("delete from file_assembly where stream_hash=?", (stream_hash, ))
+
     async def recover_streams(self, descriptors_and_sds: typing.List[typing.Tuple['StreamDescriptor', 'BlobFile']],
                               download_directory: str):
         def _recover(transaction: sqlite3.Connection):
@@ -775,3 +941,27 @@ class SQLiteStorage(SQLiteMixin):
             "where r.timestamp is null or r.timestamp < ?",
             int(self.time_getter()) - 86400
         )
+
+    # # # # # # # # # peer functions # # # # # # # # #
+
+    def get_peer_quality(self, seen_since: int) -> typing.Awaitable[
+            typing.List[typing.Tuple[str, int, float, typing.Optional[float], float, int]]]:
+        """
+        Get the (address, tcp_port, throughput, connect_latency, failure_rate, last_seen) of the peers seen since
+        the given time
+        """
+        return self.db.execute_fetchall(
+            "select address, tcp_port, throughput, connect_latency, failure_rate, last_seen from peer_quality "
+            "where last_seen>=?", (seen_since, )
+        )
+
+    def save_peer_quality(self, peers: typing.List[typing.Tuple[str, int, float, typing.Optional[float], float, int]],
+                          seen_since: int):
+        """
+        Save the (address, tcp_port, throughput, connect_latency, failure_rate, last_seen) of peers and forget the
+        ones not seen since the given time
+        """
+        def _save_peer_quality(transaction: sqlite3.Connection):
+            transaction.executemany("insert or replace into peer_quality values (?, ?, ?, ?, ?, ?)", peers)
+            transaction.execute("delete from peer_quality where last_seen<?", (seen_since, ))
+        return self.db.run(_save_peer_quality)
@@ -121,7 +121,7 @@ class Source(Metadata):
 
     __slots__ = ()
 
-    def update(self, file_path=None):
+    def update(self, file_path=None, file_hash_bytes=None):
         if file_path is not None:
             self.name = os.path.basename(file_path)
             self.media_type, stream_type = guess_media_type(file_path)
@@ -130,7 +130,7 @@ class Source(Metadata):
             self.size = os.path.getsize(file_path)
             if self.size == 0:
                 raise Exception(f"Cannot publish empty file: {file_path}")
-            self.file_hash_bytes = calculate_sha256_file_hash(file_path)
+            self.file_hash_bytes = file_hash_bytes or calculate_sha256_file_hash(file_path)
             return stream_type
 
     @property
@@ -212,10 +212,11 @@ class Stream(BaseClaim):
 
         if 'sd_hash' in kwargs:
             self.source.sd_hash = kwargs.pop('sd_hash')
+        file_hash_bytes = kwargs.pop('file_hash_bytes', None)
 
         stream_type = None
         if file_path is not None:
-            stream_type = self.source.update(file_path=file_path)
+            stream_type = self.source.update(file_path=file_path, file_hash_bytes=file_hash_bytes)
         elif self.source.name:
             self.source.media_type, stream_type = guess_media_type(self.source.name)
         elif self.source.media_type:
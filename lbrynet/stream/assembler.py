@@ -28,6 +28,14 @@ async def get_next_available_file_name(loop: asyncio.BaseEventLoop, download_dir
     return await loop.run_in_executor(None, _get_next_available_file_name, download_directory, file_name)
 
 
+def is_decrypted(decrypted_blobs: bytearray, blob_num: int) -> bool:
+    return bool(decrypted_blobs[blob_num // 8] & (1 << (blob_num % 8)))
+
+
+def set_decrypted(decrypted_blobs: bytearray, blob_num: int):
+    decrypted_blobs[blob_num // 8] |= 1 << (blob_num % 8)
+
+
 class StreamAssembler:
     def __init__(self, loop: asyncio.BaseEventLoop, blob_manager: 'BlobFileManager', sd_hash: str,
                  output_file_name: typing.Optional[str] = None):
@@ -62,6 +70,13 @@ class StreamAssembler:
         await self.loop.run_in_executor(None, _decrypt_and_write)
         return True
 
+    @property
+    def assemble_window(self) -> int:
+        """
+        Number of blobs to wait for at once while assembling
+        """
+        return 1
+
     async def setup(self):
         pass
 
@@ -71,66 +86,138 @@ class StreamAssembler:
     async def after_finished(self):
         pass
 
-    async def assemble_decrypted_stream(self, output_dir: str, output_file_name: typing.Optional[str] = None):
-        if not os.path.isdir(output_dir):
+    async def fetch_blobs(self):
+        """
+        Download and verify the blobs of the stream without decrypting them to a file
+        """
+        save_tasks = []
+        for blob_info in self.descriptor.blobs[:-1]:
+            blob = await self.get_blob(blob_info.blob_hash, blob_info.length)
+            while blob.length != blob_info.length:
+                log.warning("Found incomplete, deleting: %s", blob_info.blob_hash)
+                await self.blob_manager.delete_blobs([blob_info.blob_hash])
+                blob = await self.get_blob(blob_info.blob_hash, blob_info.length)
+            self.blob_manager.record_blob_access(blob.blob_hash)
+            save_tasks.append(asyncio.ensure_future(self.blob_manager.blob_completed(blob)))
+            if not self.wrote_bytes_event.is_set():
+                self.wrote_bytes_event.set()
+        if save_tasks:
+            await asyncio.wait(save_tasks)
+        await self.after_finished()
+        self.stream_finished_event.set()
+
+    async def _open_output_file(self, output_dir: str, output_file_name: typing.Optional[str]) -> bytearray:
+        """
+        Pick the output path and return the bitmap of the blobs already decrypted into it, a partial file left by
+        an earlier assembly of the stream to the same path is resumed
+        """
+        self.output_file_name = output_file_name or self.descriptor.suggested_file_name
+        output_path = os.path.join(output_dir, self.output_file_name)
+        blob_count = len(self.descriptor.blobs) - 1
+        decrypted_blobs = await self.blob_manager.storage.get_decrypted_blobs(self.descriptor.stream_hash, output_path)
+        if decrypted_blobs and len(decrypted_blobs) == (blob_count + 7) // 8 and os.path.isfile(output_path):
+            self.output_path = output_path
+            return bytearray(decrypted_blobs)
+        await self.blob_manager.storage.delete_decrypted_blobs(self.descriptor.stream_hash)
+        self.output_file_name = await get_next_available_file_name(self.loop, output_dir, self.output_file_name)
+        self.output_path = os.path.join(output_dir, self.output_file_name)
+        return bytearray((blob_count + 7) // 8)
+
+    async def assemble_decrypted_stream(self, output_dir: str, output_file_name: typing.Optional[str] = None,
+                                        save_file: bool = True):
+        if save_file and not os.path.isdir(output_dir):
             raise OSError(f"output directory does not exist: '{output_dir}' '{output_file_name}'")
         await self.setup()
         self.sd_blob = await self.get_blob(self.sd_hash)
         self.descriptor = await StreamDescriptor.from_stream_descriptor_blob(self.loop, self.blob_manager.blob_dir,
                                                                              self.sd_blob)
         await self.after_got_descriptor()
-        self.output_file_name = output_file_name or self.descriptor.suggested_file_name
-        self.output_file_name = await get_next_available_file_name(self.loop, output_dir, self.output_file_name)
-        self.output_path = os.path.join(output_dir, self.output_file_name)
+        decrypted_blobs = None
+        if save_file:
+            decrypted_blobs = await self._open_output_file(output_dir, output_file_name)
         if not self.got_descriptor.is_set():
             self.got_descriptor.set()
         await self.blob_manager.storage.store_stream(
             self.sd_blob, self.descriptor
         )
         await self.blob_manager.blob_completed(self.sd_blob)
-        written_blobs = None
+        if not save_file:
+            return await self.fetch_blobs()
+        blob_infos = self.descriptor.blobs[:-1]
+        for i, blob_info in enumerate(blob_infos):
+            if blob_info.blob_num != i:
+                log.error("sd blob %s is invalid, cannot assemble stream", self.descriptor.sd_hash)
+                return
+        to_assemble = [blob_info for blob_info in blob_infos if not is_decrypted(decrypted_blobs, blob_info.blob_num)]
+        resumed = len(to_assemble) < len(blob_infos)
+        if resumed:
+            log.info("resuming assembly of %s, %i/%i blobs are already decrypted", self.output_path,
+                     len(blob_infos) - len(to_assemble), len(blob_infos))
+            self.written_bytes = (len(blob_infos) - len(to_assemble)) * (MAX_BLOB_SIZE - 1)
+            if is_decrypted(decrypted_blobs, blob_infos[-1].blob_num):  # the only blob that can be shorter
+                self.written_bytes += os.path.getsize(self.output_path) - len(blob_infos) * (MAX_BLOB_SIZE - 1)
+            self.wrote_bytes_event.set()
+        pending: typing.Dict[asyncio.Task, 'BlobInfo'] = {}
         save_tasks = []
         try:
-            with open(self.output_path, 'wb') as stream_handle:
+            with open(self.output_path, 'r+b' if resumed else 'wb') as stream_handle:
                 self.stream_handle = stream_handle
-                for i, blob_info in enumerate(self.descriptor.blobs[:-1]):
-                    if blob_info.blob_num != i:
-                        log.error("sd blob %s is invalid, cannot assemble stream", self.descriptor.sd_hash)
-                        return
-                    while self.stream_handle and not self.stream_handle.closed:
+                # wait for several blobs at once and write each one as soon as it arrives, whatever its position
+                while (to_assemble or pending) and not self.stream_handle.closed:
+                    while to_assemble and len(pending) < self.assemble_window:
+                        blob_info = to_assemble.pop(0)
+                        pending[self.loop.create_task(self.get_stream_blob(blob_info))] = blob_info
+                    done, _ = await asyncio.wait(list(pending), loop=self.loop, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        blob_info = pending.pop(task)
                         try:
-                            blob = await self.get_blob(blob_info.blob_hash, blob_info.length)
+                            blob = task.result()
                             if blob and blob.length != blob_info.length:
                                 log.warning("Found incomplete, deleting: %s", blob_info.blob_hash)
                                 await self.blob_manager.delete_blobs([blob_info.blob_hash])
+                                to_assemble.insert(0, blob_info)
+                                continue
+                            if not await self._decrypt_blob(blob, blob_info, self.descriptor.key):
+                                to_assemble.insert(0, blob_info)
                                 continue
-                            if await self._decrypt_blob(blob, blob_info, self.descriptor.key):
-                                save_tasks.append(asyncio.ensure_future(self.blob_manager.blob_completed(blob)))
-                                written_blobs = i
-                                if not self.wrote_bytes_event.is_set():
-                                    self.wrote_bytes_event.set()
-                                log.debug("written %i/%i", written_blobs, len(self.descriptor.blobs) - 2)
-                                break
                         except FileNotFoundError:
                             log.debug("stream assembler stopped")
                             return
                         except (ValueError, IOError, OSError):
                             log.warning("failed to decrypt blob %s for stream %s", blob_info.blob_hash,
                                         self.descriptor.sd_hash)
+                            to_assemble.insert(0, blob_info)
                             continue
+                        set_decrypted(decrypted_blobs, blob_info.blob_num)
+                        await self.blob_manager.storage.save_decrypted_blobs(
+                            self.descriptor.stream_hash, self.output_path, bytes(decrypted_blobs)
+                        )
+                        self.blob_manager.record_blob_access(blob.blob_hash)
+                        save_tasks.append(asyncio.ensure_future(self.blob_manager.blob_completed(blob)))
+                        if not self.wrote_bytes_event.is_set():
+                            self.wrote_bytes_event.set()
+                        log.debug("written blob %i of %i", blob_info.blob_num, len(blob_infos) - 1)
         finally:
-            if written_blobs == len(self.descriptor.blobs) - 2:
+            for task in pending:
+                task.cancel()
+            written_blobs = sum(1 for blob_info in blob_infos if is_decrypted(decrypted_blobs, blob_info.blob_num))
+            if written_blobs == len(blob_infos):
                 log.debug("finished decrypting and assembling stream")
                 if save_tasks:
                     await asyncio.wait(save_tasks)
+                await self.blob_manager.storage.delete_decrypted_blobs(self.descriptor.stream_hash)
                 await self.after_finished()
                 self.stream_finished_event.set()
             else:
-                log.debug("stream decryption and assembly did not finish (%i/%i blobs are done)", written_blobs or 0,
-                          len(self.descriptor.blobs) - 2)
-                if self.output_path and os.path.isfile(self.output_path):
-                    log.debug("erasing incomplete file assembly: %s", self.output_path)
+                log.debug("stream decryption and assembly did not finish (%i/%i blobs are done)", written_blobs,
+                          len(blob_infos))
+                # keep the partial file to resume from, unless nothing was written to it
+                if not written_blobs and self.output_path and os.path.isfile(self.output_path):
+                    log.debug("erasing empty file assembly: %s", self.output_path)
                     os.unlink(self.output_path)
 
+    async def get_stream_blob(self, blob_info: 'BlobInfo') -> 'BlobFile':
+        return await self.get_blob(blob_info.blob_hash, blob_info.length)
+
     async def get_blob(self, blob_hash: str, length: typing.Optional[int] = None) -> 'BlobFile':
         return self.blob_manager.get_blob(blob_hash, length)
@@ -1,14 +1,16 @@
 import os
 import json
+import hashlib
 import binascii
 import logging
 import typing
 import asyncio
-from collections import OrderedDict
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from cryptography.hazmat.primitives.ciphers.algorithms import AES
 from lbrynet.blob import MAX_BLOB_SIZE
 from lbrynet.blob.blob_info import BlobInfo
-from lbrynet.blob.blob_file import BlobFile
+from lbrynet.blob.blob_file import BlobFile, BlobFileStore, encrypt_blob_bytes
 from lbrynet.cryptoutils import get_lbry_hash_obj
 from lbrynet.error import InvalidStreamDescriptorError
 
@@ -58,6 +60,8 @@ class StreamDescriptor:
         self.blobs = blobs
         self.stream_hash = stream_hash or self.get_stream_hash()
         self.sd_hash = sd_hash
+        # sha256 of the unencrypted file, only known for streams made with create_stream
+        self.file_sha256: typing.Optional[bytes] = None
 
     @property
     def length(self):
@@ -109,13 +113,13 @@ class StreamDescriptor:
         return h.hexdigest()
 
     async def make_sd_blob(self, blob_file_obj: typing.Optional[BlobFile] = None,
-                           old_sort: typing.Optional[bool] = False):
+                           old_sort: typing.Optional[bool] = False, store: typing.Optional[BlobFileStore] = None):
         sd_hash = self.calculate_sd_hash() if not old_sort else self.calculate_old_sort_sd_hash()
         if not old_sort:
             sd_data = self.as_json()
         else:
             sd_data = self.old_sort_json()
-        sd_blob = blob_file_obj or BlobFile(self.loop, self.blob_dir, sd_hash, len(sd_data))
+        sd_blob = blob_file_obj or BlobFile(self.loop, self.blob_dir, sd_hash, len(sd_data), store=store)
         if blob_file_obj:
             blob_file_obj.set_length(len(sd_data))
         if not sd_blob.get_is_verified():
@@ -128,9 +132,8 @@ class StreamDescriptor:
     @classmethod
     def _from_stream_descriptor_blob(cls, loop: asyncio.BaseEventLoop, blob_dir: str,
                                      blob: BlobFile) -> 'StreamDescriptor':
-        assert os.path.isfile(blob.file_path)
-        with open(blob.file_path, 'rb') as f:
-            json_bytes = f.read()
+        assert blob.file_exists
+        json_bytes = blob.get_blob_bytes()
         try:
             decoded = json.loads(json_bytes.decode())
         except json.JSONDecodeError:
@@ -197,27 +200,81 @@ class StreamDescriptor:
     async def create_stream(cls, loop: asyncio.BaseEventLoop, blob_dir: str,
                             file_path: str, key: typing.Optional[bytes] = None,
                             iv_generator: typing.Optional[typing.Generator[bytes, None, None]] = None,
-                            old_sort: bool = False) -> 'StreamDescriptor':
+                            old_sort: bool = False,
+                            progress_callback: typing.Optional[typing.Callable[[int, int], None]] = None,
+                            max_workers: typing.Optional[int] = None,
+                            store: typing.Optional[BlobFileStore] = None) -> 'StreamDescriptor':
+        """
+        Encrypt a file into blobs and make the stream descriptor for them
+
+        The file is read, the blobs are encrypted and hashed by a pool of max_workers threads (the cpu count by
+        default) and written to the blob directory in order, with at most two blobs per worker held in memory.
+        progress_callback is called with the number of bytes of the file encrypted so far and the file size.
+        The sha256 of the file is calculated from the same reads and set as file_sha256 of the descriptor.
+        The blobs are written to `store`, a store of files in the blob directory if it isn't given.
+        """
 
         blobs: typing.List[BlobInfo] = []
 
         iv_generator = iv_generator or random_iv_generator()
         key = key or os.urandom(AES.block_size // 8)
-        blob_num = -1
-        for blob_bytes in file_reader(file_path):
-            blob_num += 1
-            blob_info = await BlobFile.create_from_unencrypted(
-                    loop, blob_dir, key, next(iv_generator), blob_bytes, blob_num
-                )
-            blobs.append(blob_info)
+        max_workers = max_workers or os.cpu_count() or 1
+        store = store or BlobFileStore(blob_dir)
+        reader = file_reader(file_path)
+        file_sha256 = hashlib.sha256()
+        file_size = os.stat(file_path).st_size
+        encrypted_bytes = 0
+        # blob number, iv, unencrypted length and the future for the encrypted blob bytes and hash
+        pending: typing.Deque[typing.Tuple[int, bytes, int, asyncio.Future]] = deque()
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+
+        def read_next_blob() -> typing.Optional[bytes]:
+            unencrypted = next(reader, None)
+            if unencrypted is not None:
+                file_sha256.update(unencrypted)
+            return unencrypted
+
+        async def write_next_blob():
+            nonlocal encrypted_bytes
+            blob_num, iv, unencrypted_length, encrypted = pending.popleft()
+            blob_bytes, blob_hash = await encrypted
+            await loop.run_in_executor(executor, store.write, blob_hash, blob_bytes)
+            blobs.append(BlobInfo(blob_num, len(blob_bytes), binascii.hexlify(iv).decode(), blob_hash))
+            encrypted_bytes += unencrypted_length
+            log.debug("encrypted blob %i of %s (%i/%i bytes)", blob_num, file_path, encrypted_bytes, file_size)
+            if progress_callback:
+                progress_callback(encrypted_bytes, file_size)
+
+        try:
+            blob_num = 0
+            while True:
+                blob_bytes = await loop.run_in_executor(executor, read_next_blob)
+                if blob_bytes is None:
+                    break
+                iv = next(iv_generator)
+                pending.append((
+                    blob_num, iv, len(blob_bytes),
+                    loop.run_in_executor(executor, encrypt_blob_bytes, key, iv, blob_bytes)
+                ))
+                blob_num += 1
+                if len(pending) >= 2 * max_workers:
+                    await write_next_blob()
+            while pending:
+                await write_next_blob()
+        finally:
+            for _, _, _, encrypted in pending:
+                encrypted.cancel()
+            reader.close()
+            executor.shutdown(wait=False)
         blobs.append(
             BlobInfo(len(blobs), 0, binascii.hexlify(next(iv_generator)).decode()))  # add the stream terminator
         descriptor = cls(
             loop, blob_dir, os.path.basename(file_path), binascii.hexlify(key).decode(), os.path.basename(file_path),
             blobs
         )
-        sd_blob = await descriptor.make_sd_blob(old_sort=old_sort)
+        sd_blob = await descriptor.make_sd_blob(old_sort=old_sort, store=store)
         descriptor.sd_hash = sd_blob.blob_hash
+        descriptor.file_sha256 = file_sha256.digest()
         return descriptor
 
     def lower_bound_decrypted_length(self) -> int:
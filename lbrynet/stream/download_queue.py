@@ -0,0 +1,83 @@
+import asyncio
+import heapq
+import itertools
+import typing
+import logging
+if typing.TYPE_CHECKING:
+    from lbrynet.conf import Config
+
+log = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0  # downloads asked for by the user, such as `get`
+PRIORITY_BACKGROUND = 1  # downloads resumed on startup, or paused to make room for an interactive one
+
+
+class DownloadQueue:
+    """
+    Limits the number of streams downloading at once to `max_concurrent_downloads`
+
+    Streams wait for a download slot in order of priority, then of arrival. A stream that finds every slot taken
+    pauses the most recently started stream of a lower priority, which is passed to `pause` to be stopped and
+    queued again.
+    """
+
+    def __init__(self, loop: asyncio.BaseEventLoop, config: 'Config', pause: typing.Callable[[str], None]):
+        self.loop = loop
+        self.config = config
+        self.pause = pause
+        self.active: typing.Dict[str, int] = {}  # sd hash: priority, in the order the downloads started
+        self.waiting: typing.List[typing.Tuple[int, int, str, asyncio.Future]] = []  # heap
+        self._order = itertools.count()
+
+    @property
+    def slots_taken(self) -> bool:
+        return 0 < self.config.max_concurrent_downloads <= len(self.active)
+
+    @property
+    def queued(self) -> typing.List[str]:
+        return [sd_hash for _, _, sd_hash, fut in sorted(self.waiting) if not fut.done()]
+
+    def _preempt(self, priority: int):
+        for sd_hash, active_priority in reversed(list(self.active.items())):
+            if active_priority > priority:
+                log.info("pausing the download of %s to start a download of a higher priority", sd_hash)
+                del self.active[sd_hash]
+                self.pause(sd_hash)
+                return
+
+    def _start_waiting(self):
+        while self.waiting and not self.slots_taken:
+            priority, _, sd_hash, fut = heapq.heappop(self.waiting)
+            if not fut.done():
+                self.active[sd_hash] = priority
+                fut.set_result(None)
+
+    async def acquire(self, sd_hash: str, priority: int):
+        """
+        Wait for a download slot for the stream, give it back with release()
+        """
+        if sd_hash in self.active:
+            return
+        fut = self.loop.create_future()
+        heapq.heappush(self.waiting, (priority, next(self._order), sd_hash, fut))
+        if self.slots_taken and self.waiting[0][3] is fut:
+            self._preempt(priority)
+        self._start_waiting()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.cancelled():
+                self.waiting = [entry for entry in self.waiting if entry[3] is not fut]
+                heapq.heapify(self.waiting)
+            else:
+                self.release(sd_hash)
+            raise
+
+    def release(self, sd_hash: str):
+        if self.active.pop(sd_hash, None) is not None:
+            self._start_waiting()
+
+    def stop(self):
+        while self.waiting:
+            self.waiting.pop()[3].cancel()
+        self.active.clear()
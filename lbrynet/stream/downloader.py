@@ -1,17 +1,19 @@
-import os
 import asyncio
 import typing
 import logging
 from lbrynet.utils import resolve_host
+from lbrynet.blob import MAX_BLOB_SIZE
 from lbrynet.stream.assembler import StreamAssembler
 from lbrynet.stream.descriptor import StreamDescriptor
 from lbrynet.blob_exchange.downloader import BlobDownloader
+from lbrynet.blob_exchange.connection_manager import ConnectionManager
 from lbrynet.dht.peer import KademliaPeer
 if typing.TYPE_CHECKING:
     from lbrynet.conf import Config
     from lbrynet.dht.node import Node
     from lbrynet.blob.blob_manager import BlobFileManager
     from lbrynet.blob.blob_file import BlobFile
+    from lbrynet.blob.blob_info import BlobInfo
 
 log = logging.getLogger(__name__)
 
@@ -23,11 +25,15 @@ def drain_into(a: list, b: list):
 
 class StreamDownloader(StreamAssembler):
     def __init__(self, loop: asyncio.BaseEventLoop, config: 'Config', blob_manager: 'BlobFileManager', sd_hash: str,
-                 output_dir: typing.Optional[str] = None, output_file_name: typing.Optional[str] = None):
+                 output_dir: typing.Optional[str] = None, output_file_name: typing.Optional[str] = None,
+                 connection_manager: typing.Optional[ConnectionManager] = None, save_file: bool = True):
         super().__init__(loop, blob_manager, sd_hash, output_file_name)
         self.config = config
+        self.connection_manager = connection_manager
         self.output_dir = output_dir or self.config.download_dir
         self.output_file_name = output_file_name
+        self.save_file = save_file  # when off the blobs are downloaded without writing a decrypted file
+        self.max_connections = config.max_connections_per_download
         self.blob_downloader: typing.Optional[BlobDownloader] = None
         self.search_queue = asyncio.Queue(loop=loop)
         self.peer_queue = asyncio.Queue(loop=loop)
@@ -38,24 +44,58 @@ class StreamDownloader(StreamAssembler):
         self.fixed_peers_handle: typing.Optional[asyncio.Handle] = None
         self.fixed_peers_delay: typing.Optional[float] = None
         self.added_fixed_peers = False
+        self.stream_blob_positions: typing.Dict[str, int] = {}
+        self.read_ahead_tasks: typing.Dict[str, asyncio.Task] = {}
+
+    @property
+    def read_ahead_window(self) -> int:
+        """
+        Number of blobs to download at once, including the one being waited for
+        """
+        return max(1, min(
+            self.config.stream_read_ahead_blobs, self.max_connections,
+            self.config.stream_read_ahead_memory * 2**20 // MAX_BLOB_SIZE
+        ))
+
+    @property
+    def assemble_window(self) -> int:
+        return self.read_ahead_window
 
     async def setup(self):  # start the peer accumulator and initialize the downloader
         if self.blob_downloader:
             raise Exception("downloader is already set up")
         if self.node:
             _, self.accumulate_task = self.node.accumulate_peers(self.search_queue, self.peer_queue)
-        self.blob_downloader = BlobDownloader(self.loop, self.config, self.blob_manager, self.peer_queue)
+        self.blob_downloader = BlobDownloader(
+            self.loop, self.config, self.blob_manager, self.peer_queue, self.connection_manager
+        )
+        self.blob_downloader.max_connections = self.max_connections
         self.search_queue.put_nowait(self.sd_hash)
 
     async def after_got_descriptor(self):
+        self.blob_downloader.set_stream(self.sd_hash, [blob.blob_hash for blob in self.descriptor.blobs[:-1]])
+        self.stream_blob_positions = {blob.blob_hash: i for i, blob in enumerate(self.descriptor.blobs[:-1])}
         self.search_queue.put_nowait(self.descriptor.blobs[0].blob_hash)
         log.info("added head blob to search")
 
     async def after_finished(self):
-        log.info("downloaded stream %s -> %s", self.sd_hash, self.output_path)
+        log.info("downloaded stream %s -> %s", self.sd_hash, self.output_path or "blobs only")
         await self.blob_manager.storage.change_file_status(self.descriptor.stream_hash, 'finished')
+        self.cancel_read_ahead()
         self.blob_downloader.close()
 
+    def set_max_connections(self, max_connections: int):
+        """
+        Set the number of blob requests the download may make at once
+        """
+        self.max_connections = max_connections
+        if self.blob_downloader:
+            self.blob_downloader.max_connections = max_connections
+
+    def cancel_read_ahead(self):
+        while self.read_ahead_tasks:
+            self.read_ahead_tasks.popitem()[1].cancel()
+
     def stop(self):
         if self.accumulate_task:
             self.accumulate_task.cancel()
@@ -66,17 +106,42 @@ class StreamDownloader(StreamAssembler):
         if self.fixed_peers_handle:
             self.fixed_peers_handle.cancel()
             self.fixed_peers_handle = None
+        self.cancel_read_ahead()
+        if self.blob_downloader:
+            self.blob_downloader.close()
         self.blob_downloader = None
         if self.stream_handle:
             if not self.stream_handle.closed:
                 self.stream_handle.close()
             self.stream_handle = None
-        if not self.stream_finished_event.is_set() and self.wrote_bytes_event.is_set() and \
-                self.output_path and os.path.isfile(self.output_path):
-            os.remove(self.output_path)
+
+    def read_ahead(self, position: int):
+        """
+        Start downloading the blobs after the one at `position` that fit in the read ahead window
+        """
+        last = min(position + self.read_ahead_window, len(self.descriptor.blobs) - 1)  # skip the stream terminator
+        for blob_info in self.descriptor.blobs[position + 1:last]:
+            if blob_info.blob_hash in self.read_ahead_tasks or \
+                    self.blob_manager.is_blob_verified(blob_info.blob_hash):
+                continue
+            self.read_ahead_tasks[blob_info.blob_hash] = self.loop.create_task(
+                self.blob_downloader.download_blob(blob_info.blob_hash, blob_info.length)
+            )
 
     async def get_blob(self, blob_hash: str, length: typing.Optional[int] = None) -> 'BlobFile':
-        return await self.blob_downloader.download_blob(blob_hash, length)
+        position = self.stream_blob_positions.get(blob_hash)
+        if position is None:
+            return await self.blob_downloader.download_blob(blob_hash, length)
+        # start this blob before the ones after it so it gets the first pick of the peers
+        task = self.read_ahead_tasks.pop(blob_hash, None) or self.loop.create_task(
+            self.blob_downloader.download_blob(blob_hash, length)
+        )
+        self.read_ahead(position)
+        return await task
+
+    async def get_stream_blob(self, blob_info: 'BlobInfo') -> 'BlobFile':
+        # the assembler keeps its own window of blobs in flight, don't read ahead of it
+        return await self.blob_downloader.download_blob(blob_info.blob_hash, blob_info.length)
 
     def add_fixed_peers(self):
         async def _add_fixed_peers():
@@ -104,5 +169,7 @@ class StreamDownloader(StreamAssembler):
 
     def download(self, node: typing.Optional['Node'] = None):
         self.node = node
-        self.assemble_task = self.loop.create_task(self.assemble_decrypted_stream(self.config.download_dir))
+        self.assemble_task = self.loop.create_task(
+            self.assemble_decrypted_stream(self.output_dir, self.output_file_name, self.save_file)
+        )
         self.add_fixed_peers()
@@ -105,7 +105,7 @@ class ManagedStream:
 
     @property
     def blobs_completed(self) -> int:
-        return sum([1 if self.blob_manager.get_blob(b.blob_hash).get_is_verified() else 0
+        return sum([1 if self.blob_manager.is_blob_verified(b.blob_hash) else 0
                     for b in self.descriptor.blobs[:-1]])
 
     @property
@@ -173,9 +173,11 @@ class ManagedStream:
     @classmethod
     async def create(cls, loop: asyncio.BaseEventLoop, blob_manager: 'BlobFileManager',
                      file_path: str, key: typing.Optional[bytes] = None,
-                     iv_generator: typing.Optional[typing.Generator[bytes, None, None]] = None) -> 'ManagedStream':
+                     iv_generator: typing.Optional[typing.Generator[bytes, None, None]] = None,
+                     progress_callback: typing.Optional[typing.Callable[[int, int], None]] = None) -> 'ManagedStream':
         descriptor = await StreamDescriptor.create_stream(
-            loop, blob_manager.blob_dir, file_path, key=key, iv_generator=iv_generator
+            loop, blob_manager.blob_dir, file_path, key=key, iv_generator=iv_generator,
+            progress_callback=progress_callback, store=blob_manager.store
         )
         sd_blob = blob_manager.get_blob(descriptor.sd_hash)
         await blob_manager.storage.store_stream(
@@ -80,7 +80,7 @@ class StreamReflectorClient(asyncio.Protocol):
                 sent_sd = True
                 if not needed:
                     for blob in self.descriptor.blobs[:-1]:
-                        if self.blob_manager.get_blob(blob.blob_hash, blob.length).get_is_verified():
+                        if self.blob_manager.is_blob_verified(blob.blob_hash):
                             needed.append(blob.blob_hash)
                 log.info("Sent reflector descriptor %s", sd_blob.blob_hash[:8])
                 self.reflected_blobs.append(sd_blob.blob_hash)
@@ -89,7 +89,7 @@ class ReflectorServerProtocol(asyncio.Protocol):
                     self.writer = None
                 self.send_response({"send_sd_blob": False, 'needed': [
                     blob.blob_hash for blob in self.descriptor.blobs[:-1]
-                    if not self.blob_manager.get_blob(blob.blob_hash).get_is_verified()
+                    if not self.blob_manager.is_blob_verified(blob.blob_hash)
                 ]})
                 return
             return
@@ -10,6 +10,8 @@ from lbrynet.error import ResolveError, InvalidStreamDescriptorError, KeyFeeAbov
 from lbrynet.utils import generate_id
 from lbrynet.stream.descriptor import StreamDescriptor
 from lbrynet.stream.downloader import StreamDownloader
+from lbrynet.stream.stream_reader import StreamReader
+from lbrynet.stream.download_queue import DownloadQueue, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
 from lbrynet.stream.managed_stream import ManagedStream
 from lbrynet.schema.claim import Claim
 from lbrynet.schema.uri import parse_lbry_uri
@@ -22,6 +24,7 @@ if typing.TYPE_CHECKING:
     from lbrynet.extras.daemon.storage import SQLiteStorage, StoredStreamClaim
     from lbrynet.wallet import LbryWalletManager
     from lbrynet.extras.daemon.exchange_rate_manager import ExchangeRateManager
+    from lbrynet.blob_exchange.connection_manager import ConnectionManager
 
 log = logging.getLogger(__name__)
 
@@ -55,9 +58,12 @@ comparison_operators = {
 
 
 class StreamManager:
+    STREAM_READER_IDLE_TIMEOUT = 60.0  # seconds to keep a stream reader around after its last request
+
     def __init__(self, loop: asyncio.BaseEventLoop, config: 'Config', blob_manager: 'BlobFileManager',
                  wallet: 'LbryWalletManager', storage: 'SQLiteStorage', node: typing.Optional['Node'],
-                 analytics_manager: typing.Optional['AnalyticsManager'] = None):
+                 analytics_manager: typing.Optional['AnalyticsManager'] = None,
+                 connection_manager: typing.Optional['ConnectionManager'] = None):
         self.loop = loop
         self.config = config
         self.blob_manager = blob_manager
@@ -65,72 +71,231 @@ class StreamManager:
         self.storage = storage
         self.node = node
         self.analytics_manager = analytics_manager
+        self.connection_manager = connection_manager
         self.streams: typing.Set[ManagedStream] = set()
         self.starting_streams: typing.Dict[str, asyncio.Future] = {}
         self.resume_downloading_task: asyncio.Task = None
         self.re_reflect_task: asyncio.Task = None
         self.update_stream_finished_futs: typing.List[asyncio.Future] = []
         self.running_reflector_uploads: typing.List[asyncio.Task] = []
+        self.stream_readers: typing.Dict[str, StreamReader] = {}
+        self.download_queue = DownloadQueue(loop, config, self._pause_download)
+        self.running_downloaders: typing.Dict[str, StreamDownloader] = {}  # downloads holding a download slot
+        self.queued_downloads: typing.Dict[str, asyncio.Task] = {}  # background downloads waiting for a slot
+
+    def _update_connection_budget(self):
+        """
+        Split max_download_connections evenly between the running downloads
+        """
+        if not self.running_downloaders:
+            return
+        max_connections = max(1, min(
+            self.config.max_connections_per_download,
+            self.config.max_download_connections // len(self.running_downloaders)
+        ))
+        for downloader in self.running_downloaders.values():
+            downloader.set_max_connections(max_connections)
+
+    async def _start_download(self, downloader: StreamDownloader, priority: int):
+        """
+        Wait for a download slot and start the downloader in it
+        """
+        await self.download_queue.acquire(downloader.sd_hash, priority)
+        self.running_downloaders[downloader.sd_hash] = downloader
+        downloader.download(self.node)
+        downloader.assemble_task.add_done_callback(lambda task: self._download_ended(downloader, task))
+        self._update_connection_budget()
+
+    def _download_ended(self, downloader: StreamDownloader, task: asyncio.Task):
+        # give back the slot of a download that failed, finished downloads are released by wait_for_stream_finished
+        if self.running_downloaders.get(downloader.sd_hash) is not downloader or \
+                downloader.stream_finished_event.is_set():
+            return
+        if not task.cancelled() and task.exception():
+            log.warning("failed to download %s: %s", downloader.sd_hash, task.exception())
+        self._release_download(downloader.sd_hash)
+
+    def _release_download(self, sd_hash: str):
+        queued = self.queued_downloads.pop(sd_hash, None)
+        if queued:
+            queued.cancel()
+        self.running_downloaders.pop(sd_hash, None)
+        self.download_queue.release(sd_hash)
+        self._update_connection_budget()
+
+    def _queue_download(self, stream: ManagedStream):
+        """
+        Start downloading a stream in the background once a download slot is free
+        """
+        async def _start():
+            await self._start_download(stream.downloader, PRIORITY_BACKGROUND)
+            self.wait_for_stream_finished(stream)
+
+        task = self.loop.create_task(_start())
+        self.queued_downloads[stream.sd_hash] = task
+        task.add_done_callback(
+            lambda _: None if self.queued_downloads.get(stream.sd_hash) is not task else
+            self.queued_downloads.pop(stream.sd_hash)
+        )
+
+    def _pause_download(self, sd_hash: str):
+        # the download queue took the slot of this background download for one of a higher priority
+        self.running_downloaders.pop(sd_hash, None)
+        self._update_connection_budget()
+        stream = self.get_filtered_streams(sd_hash=sd_hash)[0]
+        stream.stop_download()
+        stream.downloader = self.make_downloader(
+            stream.sd_hash, stream.download_directory, stream.file_name, stream.file_name is not None
+        )
+        self._queue_download(stream)
 
     async def _update_content_claim(self, stream: ManagedStream):
         claim_info = await self.storage.get_content_claim(stream.stream_hash)
         stream.set_claim(claim_info, claim_info['value'])
 
-    async def start_stream(self, stream: ManagedStream) -> bool:
+    async def start_stream(self, stream: ManagedStream, save_file: bool = False,
+                           file_name: typing.Optional[str] = None) -> bool:
         """
-        Resume or rebuild a partial or completed stream
+        Resume or rebuild a partial or completed stream, a stream downloaded without saving a file is only written
+        to one if `save_file` is set
         """
-        if not stream.running and not stream.output_file_exists:
+        blobs_only = stream.file_name is None and not save_file
+        queued = stream.sd_hash in self.queued_downloads  # start it now rather than waiting in the queue
+        if queued:
+            self.queued_downloads.pop(stream.sd_hash).cancel()
+        running = stream.running and not queued
+        if blobs_only and (running or stream.finished):
+            return True
+        if (not running or stream.file_name is None) and not (stream.finished and stream.output_file_exists):
             if stream.downloader:
                 stream.downloader.stop()
                 stream.downloader = None
 
-            # the directory is gone, can happen when the folder that contains a published file is deleted
-            # reset the download directory to the default and update the file name
-            if not os.path.isdir(stream.download_directory):
-                stream.download_directory = self.config.download_dir
+            if not blobs_only:
+                self._reset_missing_download_directory(stream)
 
             stream.downloader = self.make_downloader(
-                stream.sd_hash, stream.download_directory, stream.descriptor.suggested_file_name
+                stream.sd_hash, stream.download_directory,
+                None if blobs_only else file_name or stream.file_name or stream.descriptor.suggested_file_name,
+                not blobs_only
             )
             if stream.status != ManagedStream.STATUS_FINISHED:
                 await self.storage.change_file_status(stream.stream_hash, 'running')
-                stream.update_status('running')
-            stream.start_download(self.node)
+            stream.update_status('running')
+            downloader = stream.downloader
+
+            async def _start():
+                await self._start_download(downloader, PRIORITY_INTERACTIVE)
+                await downloader.wrote_bytes_event.wait()
+
+            # waiting for a download slot doesn't count against the download timeout
+            await self.download_queue.acquire(downloader.sd_hash, PRIORITY_INTERACTIVE)
+            if stream.downloader is not downloader:  # stopped while waiting
+                self.download_queue.release(downloader.sd_hash)
+                return False
             try:
-                await asyncio.wait_for(self.loop.create_task(stream.downloader.wrote_bytes_event.wait()),
-                                       self.config.download_timeout)
+                await asyncio.wait_for(_start(), self.config.download_timeout)
             except asyncio.TimeoutError:
                 await self.stop_stream(stream)
                 if stream in self.streams:
                     self.streams.remove(stream)
                 return False
-            file_name = os.path.basename(stream.downloader.output_path)
-            output_dir = os.path.dirname(stream.downloader.output_path)
-            await self.storage.change_file_download_dir_and_file_name(
-                stream.stream_hash, output_dir, file_name
-            )
-            stream._file_name = file_name
-            stream.download_directory = output_dir
+            if not blobs_only:
+                file_name = os.path.basename(stream.downloader.output_path)
+                output_dir = os.path.dirname(stream.downloader.output_path)
+                await self.storage.change_file_download_dir_and_file_name(
+                    stream.stream_hash, output_dir, file_name
+                )
+                stream._file_name = file_name
+                stream.download_directory = output_dir
             self.wait_for_stream_finished(stream)
             return True
         return True
 
+    def _reset_missing_download_directory(self, stream: ManagedStream) -> bool:
+        # the directory is gone, can happen when the folder that contains a published file is deleted
+        # reset the download directory to the default, the file name is updated once the download starts
+        if stream.download_directory and os.path.isdir(stream.download_directory):
+            return False
+        stream.download_directory = self.config.download_dir
+        return True
+
+    async def save_file(self, stream: ManagedStream, file_name: typing.Optional[str] = None,
+                        download_directory: typing.Optional[str] = None) -> bool:
+        """
+        Write the decrypted file of a stream that was downloaded without one, or whose file was deleted
+        """
+        if stream.finished and stream.output_file_exists:
+            return True
+        if download_directory:
+            if not os.path.isdir(download_directory):
+                raise OSError(f"output directory does not exist: '{download_directory}'")
+            stream.download_directory = download_directory
+        return await self.start_stream(stream, save_file=True, file_name=file_name)
+
     async def stop_stream(self, stream: ManagedStream):
+        # a partial file is kept, the download resumes into it from the blobs that were already decrypted
         stream.stop_download()
-        if not stream.finished and stream.output_file_exists:
-            try:
-                os.remove(stream.full_path)
-            except OSError as err:
-                log.warning("Failed to delete partial download %s from downloads directory: %s", stream.full_path,
-                            str(err))
+        self._release_download(stream.sd_hash)
         if stream.running:
             stream.update_status(ManagedStream.STATUS_STOPPED)
             await self.storage.change_file_status(stream.stream_hash, ManagedStream.STATUS_STOPPED)
 
-    def make_downloader(self, sd_hash: str, download_directory: str, file_name: str):
+    @staticmethod
+    def _get_reader_slot(sd_hash: str) -> str:
+        # the download slot of a stream reader, separate from the one of a download of the same stream
+        return f"reader:{sd_hash}"
+
+    async def get_stream_reader(self, sd_hash: str) -> StreamReader:
+        """
+        Open a reader for the stream, the readers are kept for a while after use so a player's following range
+        requests don't have to find peers again. Give it back with release_stream_reader().
+
+        A reader in use takes an interactive download slot, waiting for it doesn't count against the download
+        timeout.
+        """
+        reader = self.stream_readers.get(sd_hash)
+        if not reader:
+            reader = self.stream_readers[sd_hash] = StreamReader(
+                self.loop, self.config, self.blob_manager, sd_hash, self.connection_manager
+            )
+        if reader.close_handle:
+            reader.close_handle.cancel()
+            reader.close_handle = None
+        reader.users += 1
+        slot = self._get_reader_slot(sd_hash)
+        try:
+            await self.download_queue.acquire(slot, PRIORITY_INTERACTIVE)
+            self.running_downloaders[slot] = reader.downloader
+            self._update_connection_budget()
+            await asyncio.wait_for(reader.open(self.node), self.config.download_timeout, loop=self.loop)
+        except asyncio.TimeoutError:
+            self.close_stream_reader(sd_hash)
+            raise DownloadSDTimeout(sd_hash)
+        except Exception:
+            self.close_stream_reader(sd_hash)
+            raise
+        return reader
+
+    def release_stream_reader(self, reader: StreamReader):
+        reader.users -= 1
+        if not reader.users and self.stream_readers.get(reader.sd_hash) is reader:
+            self._release_download(self._get_reader_slot(reader.sd_hash))
+            reader.close_handle = self.loop.call_later(
+                self.STREAM_READER_IDLE_TIMEOUT, self.close_stream_reader, reader.sd_hash
+            )
+
+    def close_stream_reader(self, sd_hash: str):
+        reader = self.stream_readers.pop(sd_hash, None)
+        if reader:
+            self._release_download(self._get_reader_slot(sd_hash))
+            reader.close()
+
+    def make_downloader(self, sd_hash: str, download_directory: typing.Optional[str],
+                        file_name: typing.Optional[str], save_file: bool = True):
         return StreamDownloader(
-            self.loop, self.config, self.blob_manager, sd_hash, download_directory, file_name
+            self.loop, self.config, self.blob_manager, sd_hash, download_directory, file_name,
+            self.connection_manager, save_file
         )
 
     async def recover_streams(self, file_infos: typing.List[typing.Dict]):
@@ -158,7 +323,8 @@ class StreamManager:
             await self.storage.recover_streams(to_restore, self.config.download_dir)
         log.info("Recovered %i/%i attempted streams", len(to_restore), len(file_infos))
 
-    async def add_stream(self, rowid: int, sd_hash: str, file_name: str, download_directory: str, status: str,
+    async def add_stream(self, rowid: int, sd_hash: str, file_name: typing.Optional[str],
+                         download_directory: typing.Optional[str], status: str,
                          claim: typing.Optional['StoredStreamClaim']):
         sd_blob = self.blob_manager.get_blob(sd_hash)
         if not sd_blob.get_is_verified():
@@ -169,7 +335,7 @@ class StreamManager:
             log.warning("Failed to start stream for sd %s - %s", sd_hash, str(err))
             return
         if status == ManagedStream.STATUS_RUNNING:
-            downloader = self.make_downloader(descriptor.sd_hash, download_directory, file_name)
+            downloader = self.make_downloader(descriptor.sd_hash, download_directory, file_name, bool(file_name))
         else:
             downloader = None
         stream = ManagedStream(
@@ -196,8 +362,9 @@ class StreamManager:
 
         await asyncio.gather(*[
             self.add_stream(
-                file_info['rowid'], file_info['sd_hash'], binascii.unhexlify(file_info['file_name']).decode(),
-                binascii.unhexlify(file_info['download_directory']).decode(), file_info['status'],
+                file_info['rowid'], file_info['sd_hash'],
+                binascii.unhexlify(file_info['file_name']).decode() or None,  # empty for streams saved as blobs only
+                binascii.unhexlify(file_info['download_directory']).decode() or None, file_info['status'],
                 file_info['claim']
             ) for file_info in to_start
         ])
@@ -208,12 +375,16 @@ class StreamManager:
             await self.node.joined.wait()
         else:
             log.warning("no DHT node given, resuming downloads trusting that we can contact reflector")
-        t = [
-            (stream.start_download(self.node), self.wait_for_stream_finished(stream))
-            for stream in self.streams if stream.status == ManagedStream.STATUS_RUNNING
-        ]
-        if t:
-            log.info("resuming %i downloads", len(t))
+        to_resume = [stream for stream in self.streams if stream.status == ManagedStream.STATUS_RUNNING]
+        for stream in to_resume:
+            if stream.file_name is not None and self._reset_missing_download_directory(stream):
+                await self.storage.change_file_download_dir_and_file_name(
+                    stream.stream_hash, stream.download_directory, stream.file_name
+                )
+                stream.downloader = self.make_downloader(stream.sd_hash, stream.download_directory, stream.file_name)
+            self._queue_download(stream)
+        if to_resume:
+            log.info("resuming %i downloads", len(to_resume))
 
     async def reflect_streams(self):
         while True:
@@ -243,6 +414,10 @@ class StreamManager:
             self.resume_downloading_task.cancel()
         if self.re_reflect_task and not self.re_reflect_task.done():
             self.re_reflect_task.cancel()
+        while self.queued_downloads:
+            self.queued_downloads.popitem()[1].cancel()
+        self.download_queue.stop()
+        self.running_downloaders.clear()
         while self.streams:
             stream = self.streams.pop()
             stream.stop_download()
@@ -250,10 +425,25 @@ class StreamManager:
             self.update_stream_finished_futs.pop().cancel()
         while self.running_reflector_uploads:
             self.running_reflector_uploads.pop().cancel()
+        while self.stream_readers:
+            self.stream_readers.popitem()[1].close()
 
     async def create_stream(self, file_path: str, key: typing.Optional[bytes] = None,
                             iv_generator: typing.Optional[typing.Generator[bytes, None, None]] = None) -> ManagedStream:
-        stream = await ManagedStream.create(self.loop, self.blob_manager, file_path, key, iv_generator)
+        logged_percent = 0
+
+        def log_progress(encrypted_bytes: int, file_size: int):
+            # called for every blob, logged every 10% so publishing a large file doesn't flood the log
+            nonlocal logged_percent
+            percent = (100 * encrypted_bytes // file_size) if file_size else 100
+            if percent >= logged_percent + 10 or encrypted_bytes == file_size:
+                logged_percent = percent
+                log.info("publishing %s: encrypted %i%% (%i/%i bytes)", os.path.basename(file_path), percent,
+                         encrypted_bytes, file_size)
+
+        stream = await ManagedStream.create(
+            self.loop, self.blob_manager, file_path, key, iv_generator, progress_callback=log_progress
+        )
         self.streams.add(stream)
         self.storage.content_claim_callbacks[stream.stream_hash] = lambda: self._update_content_claim(stream)
         if self.config.reflect_streams and self.config.reflector_servers:
@@ -273,8 +463,11 @@ class StreamManager:
         blob_hashes = [stream.sd_hash] + [b.blob_hash for b in stream.descriptor.blobs[:-1]]
         await self.blob_manager.delete_blobs(blob_hashes, delete_from_db=False)
         await self.storage.delete_stream(stream.descriptor)
-        if delete_file and stream.output_file_exists:
-            os.remove(stream.full_path)
+        if (delete_file or not stream.finished) and stream.output_file_exists:
+            try:
+                os.remove(stream.full_path)
+            except OSError as err:
+                log.warning("Failed to delete %s from downloads directory: %s", stream.full_path, str(err))
 
     def get_stream_by_stream_hash(self, stream_hash: str) -> typing.Optional[ManagedStream]:
         streams = tuple(filter(lambda stream: stream.stream_hash == stream_hash, self.streams))
@@ -321,6 +514,7 @@ class StreamManager:
         async def _wait_for_stream_finished():
             if stream.downloader and stream.running:
                 await stream.downloader.stream_finished_event.wait()
+                self._release_download(stream.sd_hash)
                 stream.update_status(ManagedStream.STATUS_FINISHED)
                 if self.analytics_manager:
                     self.loop.create_task(self.analytics_manager.send_download_finished(
@@ -335,6 +529,7 @@ class StreamManager:
         )
 
     async def _store_stream(self, downloader: StreamDownloader) -> int:
+        # the file name and directory are left empty when the stream is downloaded without saving a file
         file_name = os.path.basename(downloader.output_path)
         download_directory = os.path.dirname(downloader.output_path)
         if not await self.storage.stream_exists(downloader.sd_hash):
@@ -347,11 +542,12 @@ class StreamManager:
         else:
             return await self.storage.rowid_for_stream(downloader.descriptor.stream_hash)
 
-    async def _check_update_or_replace(self, outpoint: str, claim_id: str, claim: Claim) -> typing.Tuple[
-                                                       typing.Optional[ManagedStream], typing.Optional[ManagedStream]]:
+    async def _check_update_or_replace(self, outpoint: str, claim_id: str, claim: Claim,
+                                       save_file: bool) -> typing.Tuple[typing.Optional[ManagedStream],
+                                                                        typing.Optional[ManagedStream]]:
         existing = self.get_filtered_streams(outpoint=outpoint)
         if existing:
-            await self.start_stream(existing[0])
+            await self.start_stream(existing[0], save_file)
             return existing[0], None
         existing = self.get_filtered_streams(sd_hash=claim.stream.source.sd_hash)
         if existing and existing[0].claim_id != claim_id:
@@ -363,7 +559,7 @@ class StreamManager:
                 existing[0].stream_hash, outpoint
             )
             await self._update_content_claim(existing[0])
-            await self.start_stream(existing[0])
+            await self.start_stream(existing[0], save_file)
             return existing[0], None
         else:
             existing_for_claim_id = self.get_filtered_streams(claim_id=claim_id)
@@ -373,25 +569,26 @@ class StreamManager:
         return None, None
 
     async def start_downloader(self, got_descriptor_time: asyncio.Future, downloader: StreamDownloader,
-                               download_id: str, outpoint: str, claim: Claim, resolved: typing.Dict,
-                               file_name: typing.Optional[str] = None) -> ManagedStream:
+                               download_id: str, outpoint: str, claim: Claim, resolved: typing.Dict) -> ManagedStream:
         start_time = self.loop.time()
-        downloader.download(self.node)
+        await self._start_download(downloader, PRIORITY_INTERACTIVE)  # the slot was taken by the caller
         await downloader.got_descriptor.wait()
         got_descriptor_time.set_result(self.loop.time() - start_time)
         rowid = await self._store_stream(downloader)
         await self.storage.save_content_claim(
             downloader.descriptor.stream_hash, outpoint
         )
-        stream = ManagedStream(self.loop, self.blob_manager, rowid, downloader.descriptor, self.config.download_dir,
-                               file_name, downloader, ManagedStream.STATUS_RUNNING, download_id=download_id)
+        stream = ManagedStream(self.loop, self.blob_manager, rowid, downloader.descriptor,
+                               os.path.dirname(downloader.output_path) or None, downloader.output_file_name,
+                               downloader, ManagedStream.STATUS_RUNNING, download_id=download_id)
         stream.set_claim(resolved, claim)
         await stream.downloader.wrote_bytes_event.wait()
         self.streams.add(stream)
         return stream
 
     async def _download_stream_from_uri(self, uri, timeout: float, exchange_rate_manager: 'ExchangeRateManager',
-                                        file_name: typing.Optional[str] = None) -> ManagedStream:
+                                        file_name: typing.Optional[str] = None,
+                                        save_file: bool = True) -> ManagedStream:
         start_time = self.loop.time()
         parsed_uri = parse_lbry_uri(uri)
         if parsed_uri.is_channel:
@@ -411,7 +608,9 @@ class StreamManager:
         resolved_time = self.loop.time() - start_time
 
         # resume or update an existing stream, if the stream changed download it and delete the old one after
-        updated_stream, to_replace = await self._check_update_or_replace(outpoint, resolved['claim_id'], claim)
+        updated_stream, to_replace = await self._check_update_or_replace(
+            outpoint, resolved['claim_id'], claim, save_file
+        )
         if updated_stream:
             return updated_stream
 
@@ -438,10 +637,13 @@ class StreamManager:
         # download the stream
         download_id = binascii.hexlify(generate_id()).decode()
         downloader = StreamDownloader(self.loop, self.config, self.blob_manager, claim.stream.source.sd_hash,
-                                      self.config.download_dir, file_name)
+                                      self.config.download_dir, file_name if save_file else None,
+                                      self.connection_manager, save_file)
 
         stream = None
         descriptor_time_fut = self.loop.create_future()
+        # waiting for a download slot doesn't count against the timeout
+        await self.download_queue.acquire(downloader.sd_hash, PRIORITY_INTERACTIVE)
         start_download_time = self.loop.time()
         time_to_descriptor = None
         time_to_first_bytes = None
@@ -449,8 +651,7 @@ class StreamManager:
         try:
             stream = await asyncio.wait_for(
                 asyncio.ensure_future(
-                    self.start_downloader(descriptor_time_fut, downloader, download_id, outpoint, claim, resolved,
-                                          file_name)
+                    self.start_downloader(descriptor_time_fut, downloader, download_id, outpoint, claim, resolved)
                 ), timeout
             )
             time_to_descriptor = await descriptor_time_fut
@@ -474,6 +675,7 @@ class StreamManager:
                 await self.stop_stream(stream)
             else:
                 downloader.stop()
+                self._release_download(downloader.sd_hash)
         if error:
             log.warning(error)
         if self.analytics_manager:
@@ -496,14 +698,16 @@ class StreamManager:
 
     async def download_stream_from_uri(self, uri, exchange_rate_manager: 'ExchangeRateManager',
                                        file_name: typing.Optional[str] = None,
-                                       timeout: typing.Optional[float] = None) -> ManagedStream:
+                                       timeout: typing.Optional[float] = None,
+                                       save_file: typing.Optional[bool] = None) -> ManagedStream:
         timeout = timeout or self.config.download_timeout
+        save_file = self.config.save_files if save_file is None else save_file
         if uri in self.starting_streams:
             return await self.starting_streams[uri]
         fut = asyncio.Future(loop=self.loop)
         self.starting_streams[uri] = fut
         try:
-            stream = await self._download_stream_from_uri(uri, timeout, exchange_rate_manager, file_name)
+            stream = await self._download_stream_from_uri(uri, timeout, exchange_rate_manager, file_name, save_file)
             fut.set_result(stream)
         except Exception as err:
             fut.set_exception(err)
@@ -0,0 +1,95 @@
+import asyncio
+import binascii
+import typing
+import logging
+from lbrynet.blob import MAX_BLOB_SIZE
+from lbrynet.error import DownloadDataTimeout
+from lbrynet.stream.descriptor import StreamDescriptor
+from lbrynet.stream.downloader import StreamDownloader
+if typing.TYPE_CHECKING:
+    from lbrynet.conf import Config
+    from lbrynet.dht.node import Node
+    from lbrynet.blob.blob_manager import BlobFileManager
+    from lbrynet.blob.blob_info import BlobInfo
+    from lbrynet.blob_exchange.connection_manager import ConnectionManager
+
+log = logging.getLogger(__name__)
+
+# every blob of a stream but the last holds this many bytes of the file
+BLOB_DATA_SIZE = MAX_BLOB_SIZE - 1
+
+
+class StreamReader:
+    """
+    Reads byte ranges of a stream without writing it to a file, only the blobs a range spans are downloaded (along
+    with the ones after them, see StreamDownloader.read_ahead) and they are decrypted as they arrive
+
+    The last blob is downloaded when the reader is opened to learn the size of the stream.
+    """
+
+    def __init__(self, loop: asyncio.BaseEventLoop, config: 'Config', blob_manager: 'BlobFileManager', sd_hash: str,
+                 connection_manager: typing.Optional['ConnectionManager'] = None):
+        self.loop = loop
+        self.config = config
+        self.blob_manager = blob_manager
+        self.sd_hash = sd_hash
+        self.downloader = StreamDownloader(loop, config, blob_manager, sd_hash, connection_manager=connection_manager)
+        self.descriptor: typing.Optional[StreamDescriptor] = None
+        self.size = 0
+        self.open_task: typing.Optional[asyncio.Task] = None
+        self.users = 0  # requests using the reader
+        self.close_handle: typing.Optional[asyncio.Handle] = None
+
+    async def _open(self, node: typing.Optional['Node']):
+        downloader = self.downloader
+        downloader.node = node
+        await downloader.setup()
+        downloader.add_fixed_peers()
+        downloader.sd_blob = await downloader.get_blob(self.sd_hash)
+        downloader.descriptor = await StreamDescriptor.from_stream_descriptor_blob(
+            self.loop, self.blob_manager.blob_dir, downloader.sd_blob
+        )
+        await downloader.after_got_descriptor()
+        await self.blob_manager.storage.store_stream(downloader.sd_blob, downloader.descriptor)
+        await self.blob_manager.blob_completed(downloader.sd_blob)
+        self.descriptor = downloader.descriptor
+        last_blob = self.descriptor.blobs[-2]
+        self.size = last_blob.blob_num * BLOB_DATA_SIZE + len(await self.decrypt_blob(last_blob))
+
+    async def open(self, node: typing.Optional['Node'] = None):
+        """
+        Get the stream descriptor and the size of the stream, can be awaited by several requests at once
+        """
+        if not self.open_task:
+            self.open_task = self.loop.create_task(self._open(node))
+        await asyncio.shield(self.open_task)
+
+    async def decrypt_blob(self, blob_info: 'BlobInfo') -> bytes:
+        try:
+            blob = await asyncio.wait_for(
+                self.downloader.get_blob(blob_info.blob_hash, blob_info.length), self.config.download_timeout,
+                loop=self.loop
+            )
+        except asyncio.TimeoutError:
+            raise DownloadDataTimeout(self.sd_hash)
+        self.blob_manager.record_blob_access(blob.blob_hash)
+        return await self.loop.run_in_executor(
+            None, blob.decrypt, binascii.unhexlify(self.descriptor.key), binascii.unhexlify(blob_info.iv.encode())
+        )
+
+    async def read(self, start: int, end: int) -> typing.AsyncIterator[bytes]:
+        """
+        Yield the bytes from `start` to `end` (inclusive), a blob at a time
+        """
+        for blob_info in self.descriptor.blobs[start // BLOB_DATA_SIZE:end // BLOB_DATA_SIZE + 1]:
+            data = await self.decrypt_blob(blob_info)
+            offset = blob_info.blob_num * BLOB_DATA_SIZE
+            yield data[max(start - offset, 0):end + 1 - offset]
+
+    def close(self):
+        if self.close_handle:
+            self.close_handle.cancel()
+            self.close_handle = None
+        if self.open_task and not self.open_task.done():
+            self.open_task.cancel()
+        self.downloader.stop()
@@ -0,0 +1,83 @@
+import os
+import sys
+import time
+import shutil
+import asyncio
+import tempfile
+from lbrynet.conf import Config
+from lbrynet.cryptoutils import get_lbry_hash_obj
+from lbrynet.extras.daemon.storage import SQLiteStorage
+from lbrynet.blob.blob_manager import BlobFileManager
+from lbrynet.blob_exchange.server import BlobServer
+from lbrynet.blob_exchange.client import BlobExchangeClientProtocol
+
+PORT = 33334
+
+
+async def make_blob_manager(loop, blob_dir: str) -> BlobFileManager:
+    conf = Config(data_dir=blob_dir, download_dir=blob_dir, wallet_dir=blob_dir, reflector_servers=[])
+    storage = SQLiteStorage(conf, os.path.join(blob_dir, "lbrynet.sqlite"))
+    blob_manager = BlobFileManager(loop, blob_dir, storage, config=conf)
+    await storage.open()
+    await blob_manager.setup()
+    return blob_manager
+
+
+async def download_all(loop, blob_manager: BlobFileManager, blob_hashes, binary_framing: bool,
+                       batch_size: int) -> float:
+    protocol = BlobExchangeClientProtocol(loop, 30, binary_framing=binary_framing)
+    await loop.create_connection(lambda: protocol, '127.0.0.1', PORT)
+    start = time.perf_counter()
+    for i in range(0, len(blob_hashes), batch_size):
+        blobs = [blob_manager.get_blob(blob_hash) for blob_hash in blob_hashes[i:i + batch_size]]
+        _, transport = await protocol.download_blobs(blobs)
+        if not transport:
+            raise Exception("download failed")
+    for blob_hash in blob_hashes:
+        await blob_manager.get_blob(blob_hash).verified.wait()
+    elapsed = time.perf_counter() - start
+    protocol.close()
+    return elapsed
+
+
+async def main(blob_count: int, blob_size: int, batch_size: int, rounds: int = 2):
+    loop = asyncio.get_running_loop()
+    server_dir = tempfile.mkdtemp()
+    try:
+        server_blob_manager = await make_blob_manager(loop, server_dir)
+        blob_hashes = []
+        for _ in range(blob_count):
+            blob_bytes = os.urandom(blob_size)
+            h = get_lbry_hash_obj()
+            h.update(blob_bytes)
+            blob = server_blob_manager.get_blob(h.hexdigest(), blob_size)
+            blob.open_for_writing().write(blob_bytes)
+            await blob.finished_writing.wait()
+            blob_hashes.append(blob.blob_hash)
+        server = BlobServer(loop, server_blob_manager, 'bQEaw42GXsgCAGio1nxFncJSyRmnztSCjP')
+        server.start_server(PORT, '127.0.0.1')
+        await server.started_listening.wait()
+
+        total = blob_count * blob_size / 2 ** 20
+        print(f"downloading {blob_count} blobs of {blob_size} bytes over loopback, {batch_size} requests at a time")
+        for name, binary_framing in (("json", False), ("binary", True)) * rounds:
+            client_dir = tempfile.mkdtemp()
+            try:
+                client_blob_manager = await make_blob_manager(loop, client_dir)
+                elapsed = await download_all(loop, client_blob_manager, blob_hashes, binary_framing, batch_size)
+                await client_blob_manager.storage.close()
+            finally:
+                shutil.rmtree(client_dir)
+            print(f"{name:>8}: {elapsed:.3f}s, {total / elapsed:.1f} MB/s, {blob_count / elapsed:.0f} blobs/s")
+        server.stop_server()
+        await server_blob_manager.storage.close()
+    finally:
+        shutil.rmtree(server_dir)
+
+
+if __name__ == "__main__":  # usage: python blob_exchange_benchmark.py [blob count] [blob size] [pipelined requests]
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 1000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 16 * 1024,
+        int(sys.argv[3]) if len(sys.argv) > 3 else 8
+    ))
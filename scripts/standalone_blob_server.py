@@ -1,33 +1,46 @@
 import sys
 import os
 import asyncio
+from lbrynet.conf import Config
 from lbrynet.blob.blob_manager import BlobFileManager
 from lbrynet.blob_exchange.server import BlobServer
+from lbrynet.blob_exchange.server_workers import BlobServerWorkers, can_use_workers
 from lbrynet.schema.address import decode_address
 from lbrynet.extras.daemon.storage import SQLiteStorage
 
 
-async def main(address: str):
+async def main(address: str, workers: int = 0):
     try:
         decode_address(address)
     except:
         print(f"'{address}' is not a valid lbrycrd address")
         return 1
     loop = asyncio.get_running_loop()
+    conf = Config()
 
-    storage = SQLiteStorage(os.path.expanduser("~/.lbrynet/lbrynet.sqlite"))
+    storage = SQLiteStorage(conf, os.path.join(conf.data_dir, "lbrynet.sqlite"))
     await storage.open()
-    blob_manager = BlobFileManager(loop, os.path.expanduser("~/.lbrynet/blobfiles"), storage)
+    blob_manager = BlobFileManager(loop, os.path.join(conf.data_dir, "blobfiles"), storage, config=conf)
     await blob_manager.setup()
 
-    server = await loop.create_server(
-        lambda: BlobServer(loop, blob_manager, address),
-        '0.0.0.0', 4444)
+    if workers and can_use_workers(conf):
+        server = BlobServerWorkers(loop, conf, blob_manager, address, workers)
+        await server.start(conf.tcp_port, conf.network_interface)
+    else:
+        server = BlobServer(
+            loop, blob_manager, address, conf.max_concurrent_blob_uploads, conf.blob_upload_rate_limit * 2**20,
+            conf.peer_blob_upload_rate_limit * 2**20
+        )
+        server.start_server(conf.tcp_port, conf.network_interface)
     try:
-        async with server:
-            await server.serve_forever()
+        await asyncio.Future()
     finally:
+        if isinstance(server, BlobServerWorkers):
+            await server.stop()
+        else:
+            server.stop_server()
+        blob_manager.stop()
         await storage.close()
 
-if __name__ == "__main__":
-    asyncio.run(main(sys.argv[1]))
+if __name__ == "__main__":  # usage: python standalone_blob_server.py <lbrycrd address> [worker processes]
+    asyncio.run(main(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 0))
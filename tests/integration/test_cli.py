@@ -7,7 +7,7 @@ from lbrynet.extras import cli
 from lbrynet.extras.daemon.Components import (
     DATABASE_COMPONENT, BLOB_COMPONENT, HEADERS_COMPONENT, WALLET_COMPONENT, DHT_COMPONENT,
     HASH_ANNOUNCER_COMPONENT, STREAM_MANAGER_COMPONENT, PEER_PROTOCOL_SERVER_COMPONENT,
-    UPNP_COMPONENT, EXCHANGE_RATE_MANAGER_COMPONENT
+    UPNP_COMPONENT, EXCHANGE_RATE_MANAGER_COMPONENT, BLOB_SCRUBBER_COMPONENT
 )
 from lbrynet.extras.daemon.Daemon import Daemon
 
@@ -22,7 +22,7 @@ class CLIIntegrationTest(AsyncioTestCase):
         conf.components_to_skip = (
             DATABASE_COMPONENT, BLOB_COMPONENT, HEADERS_COMPONENT, WALLET_COMPONENT, DHT_COMPONENT,
             HASH_ANNOUNCER_COMPONENT, STREAM_MANAGER_COMPONENT, PEER_PROTOCOL_SERVER_COMPONENT,
-            UPNP_COMPONENT, EXCHANGE_RATE_MANAGER_COMPONENT
+            UPNP_COMPONENT, EXCHANGE_RATE_MANAGER_COMPONENT, BLOB_SCRUBBER_COMPONENT
         )
         Daemon.component_attributes = {}
         self.daemon = Daemon(conf)
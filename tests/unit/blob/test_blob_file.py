@@ -34,3 +34,36 @@ class TestBlobfile(AsyncioTestCase):
         self.assertTrue(os.path.isfile(blob.file_path), True)
         self.assertEqual(blob.get_is_verified(), True)
         self.assertIn(blob_hash, blob_manager.completed_blob_hashes)
+
+    async def test_create_blob_spilling_to_disk(self):
+        blob_hash = "7f5ab2def99f0ddd008da71db3a3772135f4002b19b7605840ed1034c8955431bd7079549e65e6b2a3b9c17c773073ed"
+        blob_bytes = b'1' * ((2 * 2 ** 20) - 1)
+
+        loop = asyncio.get_event_loop()
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(lambda: shutil.rmtree(tmp_dir))
+
+        storage = SQLiteStorage(Config(), os.path.join(tmp_dir, "lbrynet.sqlite"))
+        blob_manager = BlobFileManager(loop, tmp_dir, storage, config=Config(spill_blob_writes_to_disk=True))
+
+        await storage.open()
+        await blob_manager.setup()
+
+        # a bad download attempt removes its temporary file
+        blob = blob_manager.get_blob(blob_hash, len(blob_bytes))
+        bad_writer = blob.open_for_writing()
+        bad_writer.write(b'2' * 1000)
+        self.assertTrue(os.path.isfile(bad_writer.temp_path))
+        self.assertEqual(blob_manager.store.temp_dir, os.path.dirname(bad_writer.temp_path))
+        bad_writer.write(b'2' * len(blob_bytes))
+        self.assertFalse(os.path.isfile(bad_writer.temp_path))
+        self.assertFalse(blob.get_is_verified())
+
+        writer = blob.open_for_writing()
+        for i in range(0, len(blob_bytes), 2 ** 16):
+            writer.write(blob_bytes[i:i + 2 ** 16])
+        await blob.finished_writing.wait()
+        self.assertEqual(blob.get_is_verified(), True)
+        self.assertIn(blob_hash, blob_manager.completed_blob_hashes)
+        self.assertEqual(blob_bytes, blob.get_blob_bytes())
+        self.assertListEqual([], os.listdir(blob_manager.store.temp_dir))
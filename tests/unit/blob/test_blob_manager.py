@@ -6,6 +6,7 @@ from torba.testcase import AsyncioTestCase
 from lbrynet.conf import Config
 from lbrynet.extras.daemon.storage import SQLiteStorage
 from lbrynet.blob.blob_manager import BlobFileManager
+from lbrynet.blob.blob_file import BlobFileStore
 
 
 class TestBlobManager(AsyncioTestCase):
@@ -52,3 +53,179 @@ class TestBlobManager(AsyncioTestCase):
                 await storage.run_and_return_one_or_none('select status from blob where blob_hash=?', blob_hash)
             )
         )
+
+    async def test_sharded_blob_dir_migration(self):
+        loop = asyncio.get_event_loop()
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(lambda: shutil.rmtree(tmp_dir))
+
+        storage = SQLiteStorage(Config(), os.path.join(tmp_dir, "lbrynet.sqlite"))
+        blob_manager = BlobFileManager(loop, tmp_dir, storage)
+
+        # add a blob file in the flat layout
+        blob_hash = "7f5ab2def99f0ddd008da71db3a3772135f4002b19b7605840ed1034c8955431bd7079549e65e6b2a3b9c17c773073ed"
+        blob_bytes = b'1' * ((2 * 2 ** 20) - 1)
+        with open(os.path.join(blob_manager.blob_dir, blob_hash), 'wb') as f:
+            f.write(blob_bytes)
+        await storage.open()
+        await blob_manager.setup()
+        await blob_manager.blob_completed(blob_manager.get_blob(blob_hash, len(blob_bytes)))
+        blob_manager.stop()
+
+        # restart with sharding turned on, the blob is moved into its shard directory
+        blob_manager = BlobFileManager(loop, tmp_dir, storage, config=Config(shard_blob_dir=True))
+        await blob_manager.setup()
+        self.assertSetEqual(blob_manager.completed_blob_hashes, {blob_hash})
+        self.assertEqual(1, await blob_manager.shard_migration_task)
+        sharded_path = os.path.join(tmp_dir, blob_hash[:2], blob_hash)
+        self.assertFalse(os.path.isfile(os.path.join(tmp_dir, blob_hash)))
+        self.assertTrue(os.path.isfile(sharded_path))
+        self.assertEqual(sharded_path, blob_manager.get_blob(blob_hash).file_path)
+        self.assertTrue(blob_manager.get_blob(blob_hash).get_is_verified())
+        # once the migration is done only the shard path is looked at
+        self.assertTrue(blob_manager.store.sharded_only)
+
+        # new blobs are written into the shards
+        sd_hash = "3e2706157a59aaa47ef52bc264fce488078b4026c0b9bab649a8f2fe1ecc5e5cad7182a2bb7722460f856831a1ac0f02"
+        self.assertEqual(os.path.join(tmp_dir, sd_hash[:2], sd_hash), blob_manager.get_blob(sd_hash).file_path)
+
+        # the sharded blobs are found on the next startup and can be deleted
+        blob_manager.stop()
+        await blob_manager.setup()
+        self.assertSetEqual(blob_manager.completed_blob_hashes, {blob_hash})
+        await blob_manager.delete_blobs([blob_hash])
+        self.assertFalse(os.path.isfile(sharded_path))
+        self.assertSetEqual(blob_manager.completed_blob_hashes, set())
+
+    def test_blob_moved_into_shard_while_being_read(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(lambda: shutil.rmtree(tmp_dir))
+        store = BlobFileStore(tmp_dir)
+        blob_hash = "7f5ab2def99f0ddd008da71db3a3772135f4002b19b7605840ed1034c8955431bd7079549e65e6b2a3b9c17c773073ed"
+        flat_path = os.path.join(tmp_dir, blob_hash)
+        os.mkdir(os.path.join(tmp_dir, blob_hash[:2]))
+        with open(flat_path, 'wb') as f:
+            f.write(b'1' * 100)
+        self.assertEqual(flat_path, store.get_blob_path(blob_hash))
+        # the migration moves the blob after its flat path was looked up
+        os.replace(flat_path, os.path.join(tmp_dir, blob_hash[:2], blob_hash))
+        store.get_blob_path = lambda _: flat_path
+        self.assertEqual(100, store.get_length(blob_hash))
+        self.assertEqual(b'1' * 100, store.read(blob_hash))
+        store.delete(blob_hash)
+        self.assertIsNone(store.get_length(blob_hash))
+
+    async def test_blob_cache_eviction(self):
+        loop = asyncio.get_event_loop()
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(lambda: shutil.rmtree(tmp_dir))
+
+        storage = SQLiteStorage(Config(), os.path.join(tmp_dir, "lbrynet.sqlite"))
+        blob_manager = BlobFileManager(loop, tmp_dir, storage, config=Config(blob_cache_size=2))
+        await storage.open()
+        await blob_manager.setup()
+
+        blob_hashes = [str(i) * 96 for i in range(4)]
+        writing = blob_manager.get_blob(blob_hashes[0], 100)
+        writer = writing.open_for_writing()
+        for blob_hash in blob_hashes[1:]:
+            blob_manager.get_blob(blob_hash)
+
+        # the blob with an active writer is kept, the least recently used blob is evicted
+        self.assertListEqual([blob_hashes[0], blob_hashes[3]], list(blob_manager.blobs))
+        writer.finished.cancel()
+        await asyncio.sleep(0)
+        blob_manager.get_blob(blob_hashes[1])
+        self.assertListEqual([blob_hashes[3], blob_hashes[1]], list(blob_manager.blobs))
+
+        # the verified check answers from the completed blobs without making a blob object
+        blob_manager.completed_blob_hashes.add(blob_hashes[0])
+        self.assertTrue(blob_manager.is_blob_verified(blob_hashes[0]))
+        self.assertFalse(blob_manager.is_blob_verified(blob_hashes[2]))
+        self.assertNotIn(blob_hashes[0], blob_manager.blobs)
+        self.assertNotIn(blob_hashes[2], blob_manager.blobs)
+
+    async def test_fast_startup_reconciles_in_background(self):
+        loop = asyncio.get_event_loop()
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(lambda: shutil.rmtree(tmp_dir))
+
+        storage = SQLiteStorage(Config(), os.path.join(tmp_dir, "lbrynet.sqlite"))
+        blob_manager = BlobFileManager(loop, tmp_dir, storage)
+        blob_hashes = [
+            "7f5ab2def99f0ddd008da71db3a3772135f4002b19b7605840ed1034c8955431bd7079549e65e6b2a3b9c17c773073ed",
+            "3e2706157a59aaa47ef52bc264fce488078b4026c0b9bab649a8f2fe1ecc5e5cad7182a2bb7722460f856831a1ac0f02"
+        ]
+        await storage.open()
+        await blob_manager.setup()
+        for blob_hash in blob_hashes:
+            with open(os.path.join(blob_manager.blob_dir, blob_hash), 'wb') as f:
+                f.write(b'1' * 100)
+            await blob_manager.blob_completed(blob_manager.get_blob(blob_hash, 100))
+        blob_manager.stop()
+        os.remove(os.path.join(blob_manager.blob_dir, blob_hashes[1]))
+
+        stale_temp_path = os.path.join(blob_manager.store.temp_dir, blob_hashes[0][:16] + '.stale.tmp')
+        with open(stale_temp_path, 'wb'):
+            pass
+
+        # the completed blobs are trusted from the database until the background check finds the missing blob
+        blob_manager = BlobFileManager(loop, tmp_dir, storage, config=Config(fast_blob_manager_startup=True))
+        await blob_manager.setup()
+        self.assertFalse(os.path.isfile(stale_temp_path))
+        # the temporary file of a download started before the check finishes is left alone
+        writing_temp_path = os.path.join(blob_manager.store.temp_dir, blob_hashes[1][:16] + '.writing.tmp')
+        with open(writing_temp_path, 'wb'):
+            pass
+        self.assertSetEqual(blob_manager.completed_blob_hashes, set(blob_hashes))
+        self.assertEqual(1, await blob_manager.reconcile_task)
+        self.assertTrue(os.path.isfile(writing_temp_path))
+        self.assertSetEqual(blob_manager.completed_blob_hashes, {blob_hashes[0]})
+        self.assertEqual(
+            'pending', (
+                await storage.run_and_return_one_or_none('select status from blob where blob_hash=?', blob_hashes[1])
+            )
+        )
+
+    async def test_disk_quota(self):
+        loop = asyncio.get_event_loop()
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(lambda: shutil.rmtree(tmp_dir))
+
+        storage = SQLiteStorage(Config(), os.path.join(tmp_dir, "lbrynet.sqlite"))
+        blob_manager = BlobFileManager(loop, tmp_dir, storage, config=Config(blob_storage_limit=3))
+        await storage.open()
+        await blob_manager.setup()
+        blob_manager.disk_quota_task.cancel()
+
+        blob_hashes = [str(i) * 96 for i in range(4)]
+        for blob_hash in blob_hashes:
+            with open(os.path.join(blob_manager.blob_dir, blob_hash), 'wb') as f:
+                f.write(b'1' * 2**20)
+            await blob_manager.blob_completed(blob_manager.get_blob(blob_hash, 2**20))
+        # the first blob is announced, the last one was uploaded and the second to last one was read
+        await storage.db.execute("update blob set should_announce=1 where blob_hash=?", (blob_hashes[0], ))
+        blob_manager.record_blob_access(blob_hashes[3], uploaded=True)
+        blob_manager.record_blob_access(blob_hashes[2])
+
+        self.assertEqual(2**20, await blob_manager.enforce_disk_quota())
+        self.assertSetEqual({blob_hashes[0], blob_hashes[2], blob_hashes[3]}, blob_manager.completed_blob_hashes)
+        self.assertFalse(os.path.isfile(os.path.join(blob_manager.blob_dir, blob_hashes[1])))
+        self.assertEqual(
+            'pending', (
+                await storage.run_and_return_one_or_none('select status from blob where blob_hash=?', blob_hashes[1])
+            )
+        )
+        self.assertEqual(
+            1, await storage.run_and_return_one_or_none(
+                'select upload_count from blob_access where blob_hash=?', blob_hashes[3]
+            )
+        )
+        # under the limit now
+        self.assertEqual(0, await blob_manager.enforce_disk_quota())
+        blob_manager.stop()
+
+        # accesses aren't kept in memory when there is no limit, nothing would flush them
+        blob_manager.config.blob_storage_limit = 0
+        blob_manager.record_blob_access(blob_hashes[3], uploaded=True)
+        self.assertDictEqual({}, blob_manager.blob_access)
@@ -0,0 +1,39 @@
+import asyncio
+import tempfile
+import shutil
+import os
+from torba.testcase import AsyncioTestCase
+from lbrynet.conf import Config
+from lbrynet.extras.daemon.storage import SQLiteStorage
+from lbrynet.blob.blob_manager import BlobFileManager
+from lbrynet.blob.blob_scrubber import BlobScrubber
+
+
+class TestBlobScrubber(AsyncioTestCase):
+    async def test_scrub_corrupt_blob(self):
+        loop = asyncio.get_event_loop()
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(lambda: shutil.rmtree(tmp_dir))
+
+        storage = SQLiteStorage(Config(), os.path.join(tmp_dir, "lbrynet.sqlite"))
+        blob_manager = BlobFileManager(loop, tmp_dir, storage)
+        await storage.open()
+        await blob_manager.setup()
+
+        good_hash = "7f5ab2def99f0ddd008da71db3a3772135f4002b19b7605840ed1034c8955431bd7079549e65e6b2a3b9c17c773073ed"
+        good_bytes = b'1' * ((2 * 2 ** 20) - 1)
+        bad_hash = "3e2706157a59aaa47ef52bc264fce488078b4026c0b9bab649a8f2fe1ecc5e5cad7182a2bb7722460f856831a1ac0f02"
+        for blob_hash, blob_bytes in ((good_hash, good_bytes), (bad_hash, b'not the right bytes')):
+            with open(os.path.join(tmp_dir, blob_hash), 'wb') as f:
+                f.write(blob_bytes)
+            await blob_manager.blob_completed(blob_manager.get_blob(blob_hash, len(blob_bytes)))
+
+        scrubber = BlobScrubber(loop, blob_manager, 100 * 2 ** 20)
+        await scrubber.scrub()
+        self.assertEqual(2, scrubber.scrubbed_blobs)
+        self.assertEqual(1, scrubber.corrupt_blobs)
+        self.assertEqual(1, scrubber.finished_passes)
+        self.assertSetEqual({good_hash}, blob_manager.completed_blob_hashes)
+        self.assertFalse(os.path.isfile(os.path.join(tmp_dir, bad_hash)))
+        self.assertEqual('pending', await storage.get_blob_status(bad_hash))
+        self.assertEqual('finished', await storage.get_blob_status(good_hash))
@@ -0,0 +1,32 @@
+import unittest
+from lbrynet.blob.memory_cache import BlobMemoryCache
+
+
+class TestBlobMemoryCache(unittest.TestCase):
+    def test_admit_hot_blobs(self):
+        cache = BlobMemoryCache(100)
+        self.assertIsNone(cache.get('a'))
+        self.assertFalse(cache.is_hot('a'))
+        self.assertIsNone(cache.get('a'))
+        self.assertTrue(cache.is_hot('a'))
+        cache.put('a', b'1' * 10)
+        self.assertEqual(b'1' * 10, cache.get('a'))
+        self.assertEqual((1, 2), (cache.hits, cache.misses))
+        self.assertEqual(10, cache.size)
+
+    def test_lru_eviction(self):
+        cache = BlobMemoryCache(100)
+        cache.put('a', b'1' * 40)
+        cache.put('b', b'2' * 40)
+        cache.get('a')
+        cache.put('c', b'3' * 40)
+        self.assertListEqual(['a', 'c'], list(cache.blobs.keys()))
+        self.assertEqual(80, cache.size)
+        # a blob larger than the whole cache isn't cached
+        cache.put('d', b'4' * 101)
+        self.assertNotIn('d', cache.blobs)
+        cache.remove('a')
+        self.assertEqual(40, cache.size)
+        cache.clear()
+        self.assertEqual(0, cache.size)
+        self.assertFalse(BlobMemoryCache(0).enabled)
@@ -0,0 +1,168 @@
+import asyncio
+import tempfile
+import shutil
+import os
+import threading
+from torba.testcase import AsyncioTestCase
+from lbrynet.conf import Config
+from lbrynet.extras.daemon.storage import SQLiteStorage
+from lbrynet.blob.blob_manager import BlobFileManager
+from lbrynet.blob.blob_file import BlobFile
+from lbrynet.blob.segment_store import SegmentBlobStore
+from lbrynet.stream.managed_stream import ManagedStream
+from lbrynet.cryptoutils import get_lbry_hash_obj
+
+
+def make_blob(data: bytes):
+    h = get_lbry_hash_obj()
+    h.update(data)
+    return h.hexdigest(), data
+
+
+class TestSegmentBlobStore(AsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(lambda: shutil.rmtree(self.tmp_dir))
+        self.storage = SQLiteStorage(Config(), os.path.join(self.tmp_dir, "lbrynet.sqlite"))
+        await self.storage.open()
+        self.addCleanup(self.storage.close)
+
+    async def setup_blob_manager(self) -> BlobFileManager:
+        blob_manager = BlobFileManager(
+            self.loop, self.tmp_dir, self.storage, config=Config(blob_storage='segments', blob_segment_size=1)
+        )
+        await blob_manager.setup()
+        return blob_manager
+
+    async def test_write_read_and_reload(self):
+        blob_manager = await self.setup_blob_manager()
+        self.assertIsInstance(blob_manager.store, SegmentBlobStore)
+        blob_hash, blob_bytes = make_blob(b'1' * 1000)
+
+        blob = blob_manager.get_blob(blob_hash, len(blob_bytes))
+        blob.open_for_writing().write(blob_bytes)
+        await blob.finished_writing.wait()
+        self.assertTrue(blob.get_is_verified())
+        self.assertEqual(blob_bytes, blob.get_blob_bytes())
+        self.assertFalse(os.path.isfile(os.path.join(self.tmp_dir, blob_hash)))
+        handle, offset, length = blob_manager.store.open(blob_hash)
+        with handle:
+            handle.seek(offset)
+            self.assertEqual(blob_bytes, handle.read(length))
+        blob_manager.stop()
+
+        # the blob is found in the segment index on startup
+        blob_manager = await self.setup_blob_manager()
+        self.assertIn(blob_hash, blob_manager.completed_blob_hashes)
+        blob = blob_manager.get_blob(blob_hash)
+        self.assertTrue(blob.get_is_verified())
+        self.assertEqual(len(blob_bytes), blob.length)
+        self.assertEqual(blob_bytes, blob.get_blob_bytes())
+        blob_manager.stop()
+
+    async def test_loose_blob_file_fallback(self):
+        blob_manager = await self.setup_blob_manager()
+        blob_hash, blob_bytes = make_blob(b'2' * 1000)
+        with open(os.path.join(self.tmp_dir, blob_hash), 'wb') as f:
+            f.write(blob_bytes)
+        blob = BlobFile(self.loop, self.tmp_dir, blob_hash, store=blob_manager.store)
+        self.assertTrue(blob.get_is_verified())
+        self.assertEqual(blob_bytes, blob.get_blob_bytes())
+        blob_manager.delete_blob(blob_hash)
+        self.assertFalse(os.path.isfile(os.path.join(self.tmp_dir, blob_hash)))
+        blob_manager.stop()
+
+    async def test_compact_after_delete(self):
+        blob_manager = await self.setup_blob_manager()
+        blobs = [make_blob(bytes([i]) * (300 * 1024)) for i in range(6)]
+        for blob_hash, blob_bytes in blobs:
+            blob = blob_manager.get_blob(blob_hash, len(blob_bytes))
+            blob.open_for_writing().write(blob_bytes)
+            await blob.finished_writing.wait()
+        store = blob_manager.store
+        # 1MB segments hold 3 blobs each
+        self.assertEqual(2, len(store.get_segment_usage()))
+        await blob_manager.delete_blobs([blobs[0][0], blobs[1][0]])
+        await blob_manager.compaction_task
+        self.assertFalse(os.path.isfile(store.get_segment_path(0)))
+        self.assertEqual(2, len(store.get_segment_usage()))
+        for blob_hash, blob_bytes in blobs[2:]:
+            self.assertEqual(blob_bytes, blob_manager.get_blob(blob_hash).get_blob_bytes())
+        for blob_hash, _ in blobs[:2]:
+            self.assertFalse(blob_manager.get_blob(blob_hash).get_is_verified())
+        blob_manager.stop()
+
+    async def test_delete_during_compaction(self):
+        blob_manager = await self.setup_blob_manager()
+        blobs = [make_blob(bytes([i]) * (300 * 1024)) for i in range(6)]
+        for blob_hash, blob_bytes in blobs:
+            blob = blob_manager.get_blob(blob_hash, len(blob_bytes))
+            blob.open_for_writing().write(blob_bytes)
+            await blob.finished_writing.wait()
+        store = blob_manager.store
+        store.delete(blobs[0][0])
+        store.delete(blobs[1][0])
+
+        # delete a blob from another thread while compaction is copying it, which shouldn't block on the copy
+        reserve_segment = store._reserve_segment
+
+        def reserve_and_delete():
+            segment = reserve_segment()
+            deleting = threading.Thread(target=store.delete, args=(blobs[2][0], ))
+            deleting.start()
+            deleting.join(1)
+            self.assertFalse(deleting.is_alive())
+            return segment
+
+        store._reserve_segment = reserve_and_delete
+        await self.loop.run_in_executor(None, store.compact)
+        self.assertFalse(os.path.isfile(store.get_segment_path(0)))
+        self.assertNotIn(blobs[2][0], store.index)
+        self.assertIsNone(store.get_length(blobs[2][0]))
+        for blob_hash, blob_bytes in blobs[3:]:
+            self.assertEqual(blob_bytes, blob_manager.get_blob(blob_hash).get_blob_bytes())
+        blob_manager.stop()
+
+    async def test_close_during_compaction(self):
+        blob_manager = await self.setup_blob_manager()
+        blobs = [make_blob(bytes([i]) * (300 * 1024)) for i in range(6)]
+        for blob_hash, blob_bytes in blobs:
+            blob = blob_manager.get_blob(blob_hash, len(blob_bytes))
+            blob.open_for_writing().write(blob_bytes)
+            await blob.finished_writing.wait()
+        store = blob_manager.store
+        store.delete(blobs[0][0])
+        store.delete(blobs[1][0])
+
+        # close the store from another thread once compaction has started, it should wait for compaction to stop
+        reserve_segment = store._reserve_segment
+        closing = threading.Thread(target=store.close)
+
+        def reserve_and_close():
+            segment = reserve_segment()
+            closing.start()
+            while not store.closing:
+                pass
+            self.assertTrue(closing.is_alive())
+            return segment
+
+        store._reserve_segment = reserve_and_close
+        self.assertEqual(0, await self.loop.run_in_executor(None, store.compact))
+        closing.join(1)
+        self.assertFalse(closing.is_alive())
+        self.assertIsNone(store.db)
+        self.assertTrue(os.path.isfile(store.get_segment_path(0)))
+        self.assertEqual(store.index[blobs[2][0]][0], 0)
+
+    async def test_published_blobs_go_to_segments(self):
+        blob_manager = await self.setup_blob_manager()
+        file_path = os.path.join(self.tmp_dir, "published_file")
+        with open(file_path, 'wb') as f:
+            f.write(os.urandom(3 * 1024 * 1024))
+        stream = await ManagedStream.create(self.loop, blob_manager, file_path)
+        blob_hashes = [stream.sd_hash] + [blob.blob_hash for blob in stream.descriptor.blobs[:-1]]
+        for blob_hash in blob_hashes:
+            self.assertIn(blob_hash, blob_manager.store.index)
+            self.assertFalse(os.path.isfile(os.path.join(self.tmp_dir, blob_hash)))
+            self.assertTrue(blob_manager.get_blob(blob_hash).get_is_verified())
+        blob_manager.stop()
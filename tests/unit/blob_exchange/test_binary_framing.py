@@ -0,0 +1,120 @@
+import unittest
+from lbrynet.cryptoutils import get_lbry_hash_obj
+from lbrynet.blob_exchange.client import request_blob, request_blobs, request_stream_availability
+from lbrynet.blob_exchange.server import BlobServerProtocol
+from lbrynet.blob_exchange.serialization import BinaryFrame, BlobRequest, BlobResponse, BlobFramingRequest
+from tests.unit.blob_exchange.test_transfer_blob import BlobExchangeTestBase
+
+
+class OldBlobServerProtocol(BlobServerProtocol):
+    async def handle_request(self, request: BlobRequest, binary: bool = False):
+        request.requests = [r for r in request.requests if not isinstance(r, BlobFramingRequest)]
+        return await super().handle_request(request, binary)
+
+
+class TestBinaryFrame(unittest.TestCase):
+    blob_hash = 'a' * 96
+
+    def test_blob_request(self):
+        data = BinaryFrame.make_blob_request(self.blob_hash)
+        self.assertEqual(BinaryFrame.header.size + 48, len(data))
+        self.assertTrue(BinaryFrame.is_frame(data))
+        self.assertFalse(BinaryFrame.is_frame(BlobRequest.make_request_for_blob_hash(self.blob_hash).serialize()))
+        self.assertTupleEqual((None, 0), BinaryFrame.deserialize(data[:-1]))
+        frame, used = BinaryFrame.deserialize(data + b'extra')
+        self.assertEqual(len(data), used)
+        self.assertEqual(BinaryFrame.REQUEST_BLOB, frame.frame_type)
+        self.assertEqual(self.blob_hash, frame.blob_hash)
+        self.assertEqual(self.blob_hash, BlobRequest.from_frame(frame).get_blob_request().requested_blob)
+
+    def test_blob(self):
+        data = BinaryFrame.make_blob_header(self.blob_hash, 1000) + b'1' * 1000
+        frame, used = BinaryFrame.deserialize(data)
+        self.assertEqual(BinaryFrame.header.size + 48, used)
+        self.assertEqual(1000, frame.data_length)
+        response = BlobResponse.from_frame(frame)
+        self.assertEqual(self.blob_hash, response.get_blob_response().blob_hash)
+        self.assertEqual(1000, response.get_blob_response().length)
+        self.assertListEqual([self.blob_hash], response.get_availability_response().available_blobs)
+
+        frame, _ = BinaryFrame.deserialize(BinaryFrame.make_blob_not_found(self.blob_hash))
+        response = BlobResponse.from_frame(frame)
+        self.assertIsNone(response.get_blob_response())
+        self.assertListEqual([], response.get_availability_response().available_blobs)
+
+    def test_message(self):
+        data = BinaryFrame.make_message(BlobRequest.make_request_for_stream_availability(self.blob_hash))
+        self.assertTupleEqual((None, 0), BinaryFrame.deserialize(data[:-1]))
+        frame, used = BinaryFrame.deserialize(data)
+        self.assertEqual(len(data), used)
+        self.assertEqual(self.blob_hash, BlobRequest.from_frame(frame).get_stream_availability_request().sd_hash)
+
+    def test_invalid_frames(self):
+        with self.assertRaises(ValueError):
+            BinaryFrame.deserialize(BinaryFrame.header.pack(9, 48) + b'1' * 48)
+        with self.assertRaises(ValueError):
+            BinaryFrame.deserialize(BinaryFrame.header.pack(BinaryFrame.REQUEST_BLOB, 47) + b'1' * 47)
+        with self.assertRaises(ValueError):
+            BinaryFrame.deserialize(BinaryFrame.header.pack(BinaryFrame.BLOB, 2 ** 31))
+
+
+class TestBinaryFraming(BlobExchangeTestBase):
+    async def _add_blob_to_server(self, blob_bytes: bytes) -> str:
+        h = get_lbry_hash_obj()
+        h.update(blob_bytes)
+        server_blob = self.server_blob_manager.get_blob(h.hexdigest(), len(blob_bytes))
+        server_blob.open_for_writing().write(blob_bytes)
+        await server_blob.finished_writing.wait()
+        return server_blob.blob_hash
+
+    async def _request_blob(self, blob_hash: str, connected_transport=None):
+        client_blob = self.client_blob_manager.get_blob(blob_hash)
+        received, transport = await request_blob(
+            self.loop, client_blob, self.server_from_client.address, self.server_from_client.tcp_port, 2, 3,
+            connected_transport=connected_transport
+        )
+        self.assertIsNotNone(transport)
+        await client_blob.finished_writing.wait()
+        self.assertTrue(client_blob.get_is_verified())
+        return received, transport
+
+    async def test_negotiate_binary_framing(self):
+        blob_hashes = [await self._add_blob_to_server(bytes([i]) * 1000) for i in range(4)]
+        _, transport = await self._request_blob(blob_hashes[0])
+        self.addCleanup(transport.close)
+        self.assertTrue(transport.get_protocol().binary_framing)
+
+        # the next requests on the connection are binary framed
+        received, transport = await self._request_blob(blob_hashes[1], transport)
+        self.assertEqual(1000, received)
+        self.assertTrue(transport.get_protocol()._binary_response)
+        received, transport = await request_blobs(
+            self.loop, [self.client_blob_manager.get_blob(blob_hash) for blob_hash in blob_hashes[2:]],
+            self.server_from_client.address, self.server_from_client.tcp_port, 2, 3, connected_transport=transport
+        )
+        self.assertListEqual([1000, 1000], received)
+        self.assertTrue(transport.get_protocol()._binary_response)
+        available, transport = await request_stream_availability(
+            self.loop, 'a' * 96, self.server_from_client.address, self.server_from_client.tcp_port, 2, 3,
+            connected_transport=transport
+        )
+        self.assertListEqual([], available)
+
+        # a missing blob is answered with a not found frame
+        client_blob = self.client_blob_manager.get_blob('b' * 96)
+        received, transport = await request_blob(
+            self.loop, client_blob, self.server_from_client.address, self.server_from_client.tcp_port, 2, 3,
+            connected_transport=transport
+        )
+        self.assertEqual(0, received)
+        self.assertIsNone(transport)
+
+    async def test_fall_back_to_json(self):
+        self.server.server_protocol_class = OldBlobServerProtocol
+        blob_hashes = [await self._add_blob_to_server(bytes([i]) * 1000) for i in range(2)]
+        _, transport = await self._request_blob(blob_hashes[0])
+        self.addCleanup(transport.close)
+        self.assertFalse(transport.get_protocol().binary_framing)
+        received, transport = await self._request_blob(blob_hashes[1], transport)
+        self.assertEqual(1000, received)
+        self.assertFalse(transport.get_protocol()._binary_response)
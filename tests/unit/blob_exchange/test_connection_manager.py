@@ -0,0 +1,156 @@
+import json
+import asyncio
+from lbrynet.cryptoutils import get_lbry_hash_obj
+from lbrynet.blob_exchange.connection_manager import ConnectionManager
+from lbrynet.blob_exchange.downloader import BlobDownloader
+from tests.unit.blob_exchange.test_transfer_blob import BlobExchangeTestBase
+
+
+def make_blob(data: bytes):
+    h = get_lbry_hash_obj()
+    h.update(data)
+    return h.hexdigest(), data
+
+
+class TestConnectionManager(BlobExchangeTestBase):
+    async def _add_blob_to_server(self, blob_bytes: bytes) -> str:
+        blob_hash, blob_bytes = make_blob(blob_bytes)
+        server_blob = self.server_blob_manager.get_blob(blob_hash, len(blob_bytes))
+        server_blob.open_for_writing().write(blob_bytes)
+        await server_blob.finished_writing.wait()
+        return blob_hash
+
+    def make_downloader(self, connection_manager: ConnectionManager) -> BlobDownloader:
+        peer_queue = asyncio.Queue(loop=self.loop)
+        peer_queue.put_nowait([self.server_from_client])
+        return BlobDownloader(self.loop, self.client_config, self.client_blob_manager, peer_queue, connection_manager)
+
+    async def test_reuse_connection_across_downloaders(self):
+        connection_manager = ConnectionManager(self.loop)
+        self.addCleanup(connection_manager.stop)
+        first_hash = await self._add_blob_to_server(b'1' * 1000)
+        second_hash = await self._add_blob_to_server(b'2' * 1000)
+        key = (self.server_from_client.address, self.server_from_client.tcp_port)
+
+        first = self.make_downloader(connection_manager)
+        await first.download_blob(first_hash)
+        first.close()
+        self.assertEqual(1, connection_manager.idle_connections)
+        transport = connection_manager.idle[key][0][0]
+        self.assertFalse(transport.is_closing())
+        self.assertGreater(connection_manager.get_score(*key), 0)
+
+        second = self.make_downloader(connection_manager)
+        await second.download_blob(second_hash)
+        second.close()
+        self.assertTrue(self.client_blob_manager.get_blob(second_hash).get_is_verified())
+        self.assertEqual(1, connection_manager.idle_connections)
+        self.assertIs(transport, connection_manager.idle[key][0][0])
+
+        connection_manager.stop()
+        self.assertEqual(0, connection_manager.idle_connections)
+        self.assertTrue(transport.is_closing())
+
+    async def test_close_idle_connections(self):
+        connection_manager = ConnectionManager(self.loop, idle_timeout=0.1)
+        self.addCleanup(connection_manager.stop)
+        blob_hash = await self._add_blob_to_server(b'1' * 1000)
+        bytes_received, transport = await connection_manager.request_blob(
+            self.client_blob_manager.get_blob(blob_hash), self.server_from_client.address,
+            self.server_from_client.tcp_port, 2, 3
+        )
+        self.assertEqual(1000, bytes_received)
+        self.assertEqual(1, connection_manager.idle_connections)
+        await asyncio.sleep(0.2, loop=self.loop)
+        self.assertEqual(0, connection_manager.idle_connections)
+        self.assertTrue(transport.is_closing())
+
+    async def test_connections_per_peer_limit(self):
+        connection_manager = ConnectionManager(self.loop, max_connections_per_peer=1)
+        self.addCleanup(connection_manager.stop)
+        blob_hashes = [await self._add_blob_to_server(bytes([i]) * 1000) for i in range(3)]
+        results = await asyncio.gather(*(
+            connection_manager.request_blob(
+                self.client_blob_manager.get_blob(blob_hash), self.server_from_client.address,
+                self.server_from_client.tcp_port, 2, 3
+            ) for blob_hash in blob_hashes
+        ), loop=self.loop)
+        self.assertListEqual([1000, 1000, 1000], [bytes_received for bytes_received, _ in results])
+        # the requests waited their turn and went over the same connection
+        self.assertEqual(1, len({transport for _, transport in results}))
+        self.assertEqual(1, connection_manager.idle_connections)
+        self.assertEqual(0, connection_manager.active_connections)
+
+    async def test_pipelined_requests(self):
+        connection_manager = ConnectionManager(self.loop)
+        self.addCleanup(connection_manager.stop)
+        blob_hashes = [await self._add_blob_to_server(bytes([i]) * 1000) for i in range(3)]
+        received, transport = await connection_manager.request_blobs(
+            [self.client_blob_manager.get_blob(blob_hash) for blob_hash in blob_hashes],
+            self.server_from_client.address, self.server_from_client.tcp_port, 2, 3
+        )
+        self.assertListEqual([1000, 1000, 1000], received)
+        self.assertIsNotNone(transport)
+        self.assertEqual(1, connection_manager.idle_connections)
+        self.assertSetEqual(set(), connection_manager.unpipelined_peers)
+
+    async def test_only_mark_unpipelined_when_peer_drops_connection(self):
+        connection_manager = ConnectionManager(self.loop)
+        self.addCleanup(connection_manager.stop)
+        blobs = [self.client_blob_manager.get_blob(str(i) * 96, 1000) for i in range(2)]
+
+        # nothing is listening, failing to connect says nothing about pipelining
+        received, transport = await connection_manager.request_blobs(blobs, '127.0.0.1', 33334, 2, 3)
+        self.assertListEqual([0, 0], received)
+        self.assertIsNone(transport)
+        self.assertSetEqual(set(), connection_manager.unpipelined_peers)
+
+        # a peer that hangs up on the pipelined requests gets one request at a time
+        class HangUp(asyncio.Protocol):
+            def connection_made(self, transport):
+                self.transport = transport
+
+            def data_received(self, data):
+                self.transport.close()
+
+        server = await self.loop.create_server(HangUp, '127.0.0.1', 33334)
+        self.addCleanup(server.close)
+        received, transport = await connection_manager.request_blobs(blobs, '127.0.0.1', 33334, 2, 3)
+        self.assertListEqual([0, 0], received)
+        self.assertIsNone(transport)
+        self.assertSetEqual({('127.0.0.1', 33334)}, connection_manager.unpipelined_peers)
+
+    async def test_blob_finished_elsewhere_is_not_a_peer_failure(self):
+        connection_manager = ConnectionManager(self.loop)
+        self.addCleanup(connection_manager.stop)
+        blob_hash, blob_bytes = make_blob(b'1' * 1000)
+
+        # a peer that sends the first half of the blob and then stalls
+        class Stall(asyncio.Protocol):
+            def connection_made(self, transport):
+                self.transport = transport
+
+            def data_received(self, data):
+                self.transport.write(json.dumps({
+                    'available_blobs': [blob_hash], 'blob_data_payment_rate': 'RATE_ACCEPTED',
+                    'incoming_blob': {'blob_hash': blob_hash, 'length': len(blob_bytes)}
+                }).encode() + blob_bytes[:500])
+
+        server = await self.loop.create_server(Stall, '127.0.0.1', 33334)
+        self.addCleanup(server.close)
+        key = ('127.0.0.1', 33334)
+
+        # the blob is downloaded from another peer while the stalled peer is sending it
+        blob = self.client_blob_manager.get_blob(blob_hash, len(blob_bytes))
+        request = self.loop.create_task(connection_manager.request_blob(blob, *key, 2, 3))
+        while not blob.writers or not blob.writers[0].len_so_far:
+            await asyncio.sleep(0.01, loop=self.loop)
+        blob.open_for_writing().write(blob_bytes)
+        self.assertEqual((500, None), await request)
+        self.assertEqual(0, connection_manager.peer_quality.peers[key].failure_rate)
+
+        # timing out is still the peer's fault
+        self.client_blob_manager.delete_blob(blob_hash)
+        blob = self.client_blob_manager.get_blob(blob_hash, len(blob_bytes))
+        self.assertEqual((500, None), await connection_manager.request_blob(blob, *key, 2, 0.1))
+        self.assertGreater(connection_manager.peer_quality.peers[key].failure_rate, 0)
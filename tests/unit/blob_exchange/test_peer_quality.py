@@ -0,0 +1,64 @@
+import asyncio
+from torba.testcase import AsyncioTestCase
+from lbrynet.conf import Config
+from lbrynet.extras.daemon.storage import SQLiteStorage
+from lbrynet.blob_exchange.peer_quality import PeerQualityStore
+from lbrynet.blob_exchange.connection_manager import ConnectionManager
+from lbrynet.blob_exchange.downloader import BlobDownloader
+from lbrynet.dht.peer import KademliaPeer
+
+
+class TestPeerQualityStore(AsyncioTestCase):
+    async def test_moving_averages(self):
+        peer_quality = PeerQualityStore(self.loop, alpha=0.5)
+        self.assertEqual(0.0, peer_quality.get_score('1.2.3.4', 3333))
+        peer_quality.record_connect('1.2.3.4', 3333, 0.2)
+        peer_quality.record_connect('1.2.3.4', 3333, 0.1)
+        peer_quality.record_download('1.2.3.4', 3333, 1000, 1.0)
+        peer_quality.record_download('1.2.3.4', 3333, 3000, 1.0)
+        stats = peer_quality.get_stats('1.2.3.4', 3333)
+        self.assertAlmostEqual(0.15, stats.connect_latency)
+        self.assertAlmostEqual(2000.0, stats.throughput)
+        self.assertEqual(0.0, stats.failure_rate)
+        peer_quality.record_failure('1.2.3.4', 3333)
+        self.assertEqual(0.5, stats.failure_rate)
+        self.assertAlmostEqual(1000.0, peer_quality.get_score('1.2.3.4', 3333))
+
+    async def test_save_and_load(self):
+        storage = SQLiteStorage(Config(), ':memory:')
+        await storage.open()
+        self.addCleanup(storage.close)
+        peer_quality = PeerQualityStore(self.loop)
+        await peer_quality.open(storage)
+        peer_quality.record_connect('1.2.3.4', 3333, 0.1)
+        peer_quality.record_download('1.2.3.4', 3333, 1000, 1.0)
+        peer_quality.record_failure('5.6.7.8', 3333)
+        await peer_quality.close()
+
+        loaded = PeerQualityStore(self.loop)
+        await loaded.open(storage)
+        self.addCleanup(loaded.close)
+        self.assertSetEqual({('1.2.3.4', 3333), ('5.6.7.8', 3333)}, set(loaded.peers.keys()))
+        stats = loaded.get_stats('1.2.3.4', 3333)
+        self.assertAlmostEqual(0.1, stats.connect_latency)
+        self.assertAlmostEqual(1000.0, stats.throughput)
+        self.assertAlmostEqual(0.3, loaded.get_stats('5.6.7.8', 3333).failure_rate)
+
+    async def test_known_fast_peers_are_tried_first(self):
+        connection_manager = ConnectionManager(self.loop)
+        self.addCleanup(connection_manager.stop)
+        slow = KademliaPeer(self.loop, '1.2.3.4', tcp_port=3333)
+        fast = KademliaPeer(self.loop, '5.6.7.8', tcp_port=3333)
+        unknown = KademliaPeer(self.loop, '9.9.9.9', tcp_port=3333)
+        connection_manager.peer_quality.record_download(slow.address, slow.tcp_port, 1000, 1.0)
+        connection_manager.peer_quality.record_download(fast.address, fast.tcp_port, 100000, 1.0)
+        downloader = BlobDownloader(self.loop, Config(), None, asyncio.Queue(loop=self.loop), connection_manager)
+        self.assertListEqual([fast, slow, unknown], sorted([unknown, slow, fast], key=downloader.get_score,
+                                                           reverse=True))
+
+    async def test_connect_failure_recorded(self):
+        connection_manager = ConnectionManager(self.loop)
+        self.addCleanup(connection_manager.stop)
+        result = await connection_manager.request_stream_availability('a' * 96, '127.0.0.1', 3334, 1, 1)
+        self.assertTupleEqual((None, None), result)
+        self.assertEqual(0.3, connection_manager.peer_quality.get_stats('127.0.0.1', 3334).failure_rate)
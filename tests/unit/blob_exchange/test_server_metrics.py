@@ -0,0 +1,77 @@
+import unittest
+from lbrynet.cryptoutils import get_lbry_hash_obj
+from lbrynet.blob_exchange.client import request_blob
+from lbrynet.blob_exchange.server_metrics import BlobServerMetrics
+from tests.unit.blob_exchange.test_transfer_blob import BlobExchangeTestBase
+
+
+class TestBlobServerMetrics(unittest.TestCase):
+    def test_counts(self):
+        metrics = BlobServerMetrics()
+        metrics.connection_made()
+        metrics.record_request('1.2.3.4', 'a' * 96)
+        metrics.record_upload('1.2.3.4', 'a' * 96, 1000, 0.02)
+        metrics.record_request('1.2.3.4', 'b' * 96)
+        metrics.record_not_found('1.2.3.4', 'b' * 96)
+        metrics.record_error('5.6.7.8')
+        stats = metrics.to_dict()
+        self.assertEqual(1, stats['active_connections'])
+        self.assertDictEqual(
+            {'requests': 2, 'blobs_sent': 1, 'bytes_sent': 1000, 'not_found': 1, 'errors': 1},
+            {key: value for key, value in stats['total'].items() if key != 'send_time'}
+        )
+        self.assertEqual(0.02, stats['total']['send_time']['average'])
+        self.assertListEqual([0, 1, 0, 0, 0, 0, 0, 0, 0, 0],
+                             [bucket['count'] for bucket in stats['total']['send_time']['histogram']])
+        self.assertListEqual(['a' * 96, 'b' * 96], [blob['blob_hash'] for blob in stats['blobs']])
+        self.assertListEqual(['1.2.3.4', '5.6.7.8'], [peer['address'] for peer in stats['peers']])
+        self.assertEqual(1, stats['peers'][1]['errors'])
+
+    def test_bounded_cardinality(self):
+        metrics = BlobServerMetrics(max_tracked=2)
+        for i in range(3):
+            metrics.record_upload(f'1.2.3.{i}', str(i) * 96, 1000, 0.1)
+        metrics.record_upload('1.2.3.1', '1' * 96, 1000, 20.0)
+        self.assertListEqual(['2' * 96, '1' * 96], list(metrics.blobs.keys()))
+        self.assertListEqual(['1.2.3.2', '1.2.3.1'], list(metrics.peers.keys()))
+        self.assertListEqual(['1.2.3.1'], [peer['address'] for peer in metrics.to_dict(top=1)['peers']])
+        self.assertEqual(4000, metrics.total.bytes_sent)
+        self.assertEqual(1, metrics.total.send_times[-1])
+
+    def test_add_snapshots(self):
+        first, second = BlobServerMetrics(), BlobServerMetrics()
+        first.record_upload('1.2.3.4', 'a' * 96, 1000, 0.1)
+        second.record_upload('1.2.3.4', 'a' * 96, 3000, 0.3)
+        second.connection_made()
+        combined = BlobServerMetrics()
+        combined.add_snapshot(first.to_snapshot())
+        combined.add_snapshot(second.to_snapshot())
+        self.assertEqual(1, combined.active_connections)
+        self.assertEqual(4000, combined.blobs['a' * 96].bytes_sent)
+        self.assertEqual(2, combined.peers['1.2.3.4'].blobs_sent)
+        self.assertAlmostEqual(0.2, combined.to_dict()['total']['send_time']['average'])
+
+
+class TestBlobServerTraffic(BlobExchangeTestBase):
+    async def test_traffic_is_counted(self):
+        blob_bytes = b'1' * 1000
+        h = get_lbry_hash_obj()
+        h.update(blob_bytes)
+        server_blob = self.server_blob_manager.get_blob(h.hexdigest(), len(blob_bytes))
+        server_blob.open_for_writing().write(blob_bytes)
+        await server_blob.finished_writing.wait()
+
+        for blob_hash in (server_blob.blob_hash, 'a' * 96):
+            _, transport = await request_blob(
+                self.loop, self.client_blob_manager.get_blob(blob_hash), self.server_from_client.address,
+                self.server_from_client.tcp_port, 2, 3
+            )
+            if transport:
+                transport.close()
+        stats = self.server.metrics.to_dict()
+        self.assertEqual(2, stats['connections'])
+        self.assertEqual(2, stats['total']['requests'])
+        self.assertEqual(1000, stats['total']['bytes_sent'])
+        self.assertEqual(1, stats['total']['not_found'])
+        self.assertEqual(server_blob.blob_hash, stats['blobs'][0]['blob_hash'])
+        self.assertEqual(1000, stats['peers'][0]['bytes_sent'])
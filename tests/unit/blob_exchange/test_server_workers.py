@@ -0,0 +1,59 @@
+import socket
+import unittest
+from lbrynet.cryptoutils import get_lbry_hash_obj
+from lbrynet.blob_exchange.client import request_blob
+from lbrynet.blob_exchange.server_workers import BlobServerWorkers
+from tests.unit.blob_exchange.test_transfer_blob import BlobExchangeTestBase
+
+
+@unittest.skipUnless(hasattr(socket, 'SO_REUSEPORT'), "SO_REUSEPORT is not supported")
+class TestBlobServerWorkers(BlobExchangeTestBase):
+    async def _add_blob_to_server(self, blob_bytes: bytes) -> str:
+        h = get_lbry_hash_obj()
+        h.update(blob_bytes)
+        server_blob = self.server_blob_manager.get_blob(h.hexdigest(), len(blob_bytes))
+        server_blob.open_for_writing().write(blob_bytes)
+        await server_blob.finished_writing.wait()
+        return server_blob.blob_hash
+
+    async def _request_blob(self, blob_hash: str) -> int:
+        client_blob = self.client_blob_manager.get_blob(blob_hash)
+        received, transport = await request_blob(self.loop, client_blob, '127.0.0.1', 33335, 2, 3)
+        if transport:
+            transport.close()
+        return received
+
+    async def test_workers_serve_blobs_completed_by_the_daemon(self):
+        before_start = await self._add_blob_to_server(b'1' * 1000)
+        workers = BlobServerWorkers(
+            self.loop, self.server_config, self.server_blob_manager, 'bQEaw42GXsgCAGio1nxFncJSyRmnztSCjP', 2
+        )
+        self.addCleanup(workers.stop)
+        await workers.start(33335, '127.0.0.1')
+        after_start = await self._add_blob_to_server(b'2' * 1000)
+
+        self.assertEqual(1000, await self._request_blob(before_start))
+        self.assertEqual(1000, await self._request_blob(after_start))
+
+        # deleted blobs are no longer served by the workers
+        deleted = await self._add_blob_to_server(b'3' * 1000)
+        self.server_blob_manager.delete_blob(deleted)
+        self.assertEqual(0, await self._request_blob(deleted))
+
+        await workers.stop()
+        self.assertListEqual([], self.server_blob_manager.blob_listeners)
+
+    async def test_workers_record_blob_uploads(self):
+        self.server_config.blob_storage_limit = 100
+        blob_hash = await self._add_blob_to_server(b'1' * 1000)
+        workers = BlobServerWorkers(
+            self.loop, self.server_config, self.server_blob_manager, 'bQEaw42GXsgCAGio1nxFncJSyRmnztSCjP', 1
+        )
+        self.addCleanup(workers.stop)
+        await workers.start(33335, '127.0.0.1')
+        self.assertEqual(1000, await self._request_blob(blob_hash))
+        # the worker writes the uploads it recorded to the database when it stops
+        await workers.stop()
+        self.assertEqual(1, await self.server_storage.run_and_return_one_or_none(
+            "select upload_count from blob_access where blob_hash=?", blob_hash
+        ))
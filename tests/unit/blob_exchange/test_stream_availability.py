@@ -0,0 +1,110 @@
+import os
+import asyncio
+import unittest
+from lbrynet.blob.blob_file import MAX_BLOB_SIZE
+from lbrynet.blob_exchange.client import request_stream_availability
+from lbrynet.blob_exchange.downloader import BlobDownloader
+from lbrynet.blob_exchange.serialization import encode_bitmap, decode_bitmap
+from lbrynet.stream.descriptor import StreamDescriptor
+from tests.unit.blob_exchange.test_transfer_blob import BlobExchangeTestBase
+
+
+class TestBitmap(unittest.TestCase):
+    def test_encode_decode(self):
+        bits = [True, False, False, True, True, False, True, False, True]
+        self.assertEqual('9a80', encode_bitmap(bits))
+        self.assertListEqual(bits, decode_bitmap('9a80', len(bits)))
+        self.assertEqual('', encode_bitmap([]))
+        self.assertListEqual([], decode_bitmap('', 0))
+
+    def test_wrong_length(self):
+        with self.assertRaises(ValueError):
+            decode_bitmap('9a80', 17)
+
+
+class TestStreamAvailability(BlobExchangeTestBase):
+    async def setup_stream(self, blob_count: int = 3):
+        file_path = os.path.join(self.server_dir, "test_file")
+        with open(file_path, 'wb') as f:
+            f.write(os.urandom((MAX_BLOB_SIZE - 1) * blob_count))
+        descriptor = await StreamDescriptor.create_stream(self.loop, self.server_blob_manager.blob_dir, file_path)
+        self.sd_hash = descriptor.calculate_sd_hash()
+        self.blob_hashes = [blob_info.blob_hash for blob_info in descriptor.blobs[:-1]]
+        await self.server_storage.store_stream(self.server_blob_manager.get_blob(self.sd_hash), descriptor)
+
+    async def add_blobs_to_server(self, *positions: int):
+        for position in positions:
+            await self.server_blob_manager.blob_completed(
+                self.server_blob_manager.get_blob(self.blob_hashes[position])
+            )
+
+    async def test_request_stream_availability(self):
+        await self.setup_stream()
+        await self.add_blobs_to_server(0, 2)
+        available, transport = await request_stream_availability(
+            self.loop, self.sd_hash, self.server_from_client.address, self.server_from_client.tcp_port, 2, 3
+        )
+        self.addCleanup(transport.close)
+        self.assertListEqual([True, False, True], available)
+
+        # the server doesn't know the stream
+        available, transport = await request_stream_availability(
+            self.loop, 'a' * 96, self.server_from_client.address, self.server_from_client.tcp_port, 2, 3,
+            connected_transport=transport
+        )
+        self.assertListEqual([], available)
+        self.assertIsNotNone(transport)
+
+    async def test_downloader_skips_peers_without_blob(self):
+        await self.setup_stream()
+        await self.add_blobs_to_server(0)
+        peer_queue = asyncio.Queue(loop=self.loop)
+        peer_queue.put_nowait([self.server_from_client])
+        downloader = BlobDownloader(self.loop, self.client_config, self.client_blob_manager, peer_queue)
+        self.addCleanup(downloader.close)
+        downloader.set_stream(self.sd_hash, self.blob_hashes)
+
+        blob = await downloader.download_blob(self.blob_hashes[0])
+        self.assertTrue(blob.get_is_verified())
+        self.assertListEqual([True, False, False], downloader.stream_availability[self.server_from_client][1])
+
+        # the server has the file for the second blob, but its bitmap says it doesn't have it so it isn't asked
+        download = self.loop.create_task(downloader.download_blob(self.blob_hashes[1]))
+        await asyncio.sleep(0.2, loop=self.loop)
+        self.assertDictEqual({}, downloader.active_connections)
+        self.assertFalse(download.done())
+        download.cancel()
+        await asyncio.sleep(0, loop=self.loop)
+
+        # once the bitmap is refreshed the blob is downloaded
+        await self.add_blobs_to_server(1)
+        downloader.stream_availability[self.server_from_client] = (0.0, [True, False, False])
+        downloader.AVAILABILITY_TTL = 0.0
+        peer_queue.put_nowait([self.server_from_client])
+        blob = await downloader.download_blob(self.blob_hashes[1])
+        self.assertTrue(blob.get_is_verified())
+
+    async def test_downloader_pipelines_blobs_the_peer_has(self):
+        await self.setup_stream()
+        await self.add_blobs_to_server(0, 1, 2)
+        peer_queue = asyncio.Queue(loop=self.loop)
+        peer_queue.put_nowait([self.server_from_client])
+        downloader = BlobDownloader(self.loop, self.client_config, self.client_blob_manager, peer_queue)
+        self.addCleanup(downloader.close)
+        downloader.set_stream(self.sd_hash, self.blob_hashes)
+        downloader.stream_availability[self.server_from_client] = (self.loop.time(), [True, True, True])
+        pipelined = []
+        request_blobs = downloader.connection_manager.request_blobs
+
+        async def record_request_blobs(blobs, *args):
+            pipelined.append([blob.blob_hash for blob in blobs])
+            return await request_blobs(blobs, *args)
+
+        downloader.connection_manager.request_blobs = record_request_blobs
+        blobs = await asyncio.gather(*(
+            downloader.download_blob(blob_hash) for blob_hash in self.blob_hashes
+        ), loop=self.loop)
+        self.assertTrue(all(blob.get_is_verified() for blob in blobs))
+        # the one peer was asked for all of the blobs at once
+        self.assertListEqual([self.blob_hashes], pipelined)
+        self.assertDictEqual({}, downloader.requested)
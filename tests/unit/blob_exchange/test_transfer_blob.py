@@ -11,7 +11,8 @@ from lbrynet.conf import Config
 from lbrynet.extras.daemon.storage import SQLiteStorage
 from lbrynet.blob.blob_manager import BlobFileManager
 from lbrynet.blob_exchange.server import BlobServer, BlobServerProtocol
-from lbrynet.blob_exchange.client import BlobExchangeClientProtocol, request_blob
+from lbrynet.blob_exchange.client import BlobExchangeClientProtocol, request_blob, request_blobs
+from lbrynet.cryptoutils import get_lbry_hash_obj
 from lbrynet.dht.peer import KademliaPeer, PeerManager
 
 # import logging
@@ -159,3 +160,90 @@ class TestBlobExchange(BlobExchangeTestBase):
             server_protocol.data_received(bytes([byte]))
         await asyncio.sleep(0.1)  # yield execution
         self.assertTrue(len(received_data.getvalue()) > 0)
+
+    async def test_server_pipelined_requests(self):
+        server_protocol = BlobServerProtocol(self.loop, self.server_blob_manager, self.server.lbrycrd_address)
+        transport = asyncio.Transport(extra={'peername': ('ip', 90)})
+        received_data = BytesIO()
+        transport.write = received_data.write
+        server_protocol.connection_made(transport)
+        blob_hashes = ['1' * 96, '2' * 96]
+        requests = b''.join(BlobRequest.make_request_for_blob_hash(blob_hash).serialize() for blob_hash in blob_hashes)
+        server_protocol.data_received(requests[:-10])
+        server_protocol.data_received(requests[-10:])
+        await asyncio.sleep(0.1)  # yield execution
+        # both requests were answered, neither blob is available
+        self.assertEqual(2, received_data.getvalue().count(b'"available_blobs": []'))
+
+    async def test_transfer_pipelined_blobs(self):
+        blobs = []
+        for i in range(3):
+            blob_bytes = bytes([i]) * (2 ** 20 + i)
+            h = get_lbry_hash_obj()
+            h.update(blob_bytes)
+            await self._add_blob_to_server(h.hexdigest(), blob_bytes)
+            blobs.append(self.client_blob_manager.get_blob(h.hexdigest()))
+        received, transport = await request_blobs(
+            self.loop, blobs, self.server_from_client.address, self.server_from_client.tcp_port, 2, 3
+        )
+        self.assertIsNotNone(transport)
+        self.addCleanup(transport.close)
+        self.assertListEqual([2 ** 20, 2 ** 20 + 1, 2 ** 20 + 2], received)
+        for blob in blobs:
+            await blob.finished_writing.wait()
+            self.assertTrue(blob.get_is_verified())
+
+        # the connection can be reused for another pipeline, already downloaded blobs aren't requested again
+        received, transport = await request_blobs(
+            self.loop, blobs, self.server_from_client.address, self.server_from_client.tcp_port, 2, 3,
+            connected_transport=transport
+        )
+        self.assertListEqual([0, 0, 0], received)
+        self.assertIsNotNone(transport)
+
+    async def test_client_chunked_response(self):
+        blob_bytes = b'1' * 1000
+        h = get_lbry_hash_obj()
+        h.update(blob_bytes)
+        blob_hash = h.hexdigest()
+        client_blob = self.client_blob_manager.get_blob(blob_hash)
+        protocol = BlobExchangeClientProtocol(self.loop, 2)
+        transport = asyncio.Transport(extra={'peername': ('ip', 90)})
+        transport.write = lambda _: None
+        transport.is_closing = lambda: False
+        protocol.connection_made(transport)
+        download = self.loop.create_task(protocol.download_blob(client_blob))
+        await asyncio.sleep(0)
+        response = b'{"incoming_blob": {"blob_hash": "%s", "length": 1000}, "available_blobs": ["%s"], ' \
+                   b'"blob_data_payment_rate": "RATE_ACCEPTED"}' % (blob_hash.encode(), blob_hash.encode())
+        # the response header arrives a few bytes at a time, the last fragment also holds the start of the blob
+        fragments = [response[i:i + 3] for i in range(0, len(response), 3)]
+        for fragment in fragments[:-1]:
+            protocol.data_received(fragment)
+        protocol.data_received(fragments[-1] + blob_bytes[:100])
+        protocol.data_received(blob_bytes[100:])
+        self.assertEqual((1000, transport), await download)
+        await client_blob.finished_writing.wait()
+        self.assertTrue(client_blob.get_is_verified())
+
+    async def test_serve_hot_blob_from_memory(self):
+        blob_bytes = b'1' * 1000
+        h = get_lbry_hash_obj()
+        h.update(blob_bytes)
+        blob_hash = h.hexdigest()
+        await self._add_blob_to_server(blob_hash, blob_bytes)
+        cache = self.server_blob_manager.memory_cache
+        for _ in range(3):
+            client_blob = self.client_blob_manager.get_blob(blob_hash)
+            received, transport = await request_blob(self.loop, client_blob, self.server_from_client.address,
+                                                     self.server_from_client.tcp_port, 2, 3)
+            transport.close()
+            self.assertEqual(len(blob_bytes), received)
+            await client_blob.finished_writing.wait()
+            self.assertTrue(client_blob.get_is_verified())
+            self.client_blob_manager.delete_blob(blob_hash)
+        # read from disk the first time, read into the cache the second time and served from it the third time
+        self.assertEqual((1, 2), (cache.hits, cache.misses))
+        self.assertIn(blob_hash, cache.blobs)
+        self.server_blob_manager.delete_blob(blob_hash)
+        self.assertNotIn(blob_hash, cache.blobs)
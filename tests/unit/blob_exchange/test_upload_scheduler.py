@@ -0,0 +1,95 @@
+import asyncio
+from torba.testcase import AsyncioTestCase
+from lbrynet.cryptoutils import get_lbry_hash_obj
+from lbrynet.blob_exchange.client import request_blob
+from lbrynet.blob_exchange.upload_scheduler import UploadScheduler
+from tests.unit.blob_exchange.test_transfer_blob import BlobExchangeTestBase
+
+
+class TestUploadScheduler(AsyncioTestCase):
+    async def test_upload_slots(self):
+        scheduler = UploadScheduler(self.loop, max_concurrent_uploads=2)
+        await scheduler.wait_for_slot('1.2.3.4')
+        await scheduler.wait_for_slot('1.2.3.4')
+        self.assertTrue(scheduler.full)
+        started = []
+
+        async def upload(peer_address, priority=False):
+            await scheduler.wait_for_slot(peer_address, priority)
+            started.append(peer_address)
+
+        uploads = [
+            self.loop.create_task(upload('1.2.3.4')),
+            self.loop.create_task(upload('5.6.7.8')),
+            self.loop.create_task(upload('9.9.9.9', priority=True)),
+        ]
+        await asyncio.sleep(0)
+        self.assertListEqual([], started)
+
+        # sd and head blobs go first
+        scheduler.release('1.2.3.4')
+        await asyncio.sleep(0)
+        self.assertListEqual(['9.9.9.9'], started)
+
+        # then the peer without a running upload, even though it asked later
+        scheduler.release('9.9.9.9')
+        await asyncio.sleep(0)
+        self.assertListEqual(['9.9.9.9', '5.6.7.8'], started)
+
+        scheduler.release('1.2.3.4')
+        await asyncio.gather(*uploads)
+        self.assertListEqual(['9.9.9.9', '5.6.7.8', '1.2.3.4'], started)
+        scheduler.release('5.6.7.8')
+        scheduler.release('1.2.3.4')
+        self.assertEqual(0, scheduler.running_uploads)
+        self.assertFalse(scheduler.full)
+
+    async def test_cancelled_waiter(self):
+        scheduler = UploadScheduler(self.loop, max_concurrent_uploads=1)
+        await scheduler.wait_for_slot('1.2.3.4')
+        waiting = self.loop.create_task(scheduler.wait_for_slot('5.6.7.8'))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.sleep(0)
+        self.assertListEqual([], scheduler.waiting)
+        scheduler.release('1.2.3.4')
+        self.assertEqual(0, scheduler.running_uploads)
+
+    async def test_rate_limits(self):
+        scheduler = UploadScheduler(self.loop, peer_rate_limit=50000)
+        self.assertTrue(scheduler.throttled)
+        start = self.loop.time()
+        await scheduler.throttle('1.2.3.4', 5000)
+        await scheduler.throttle('5.6.7.8', 5000)
+        self.assertLess(self.loop.time() - start, 0.05)
+        await scheduler.throttle('1.2.3.4', 5000)
+        self.assertGreaterEqual(self.loop.time() - start, 0.09)
+
+        # the overall limit is shared by every peer
+        scheduler = UploadScheduler(self.loop, rate_limit=50000)
+        start = self.loop.time()
+        await scheduler.throttle('1.2.3.4', 5000)
+        await scheduler.throttle('5.6.7.8', 5000)
+        self.assertGreaterEqual(self.loop.time() - start, 0.09)
+
+
+class TestThrottledUpload(BlobExchangeTestBase):
+    async def test_peer_upload_rate_limit(self):
+        blob_bytes = b'1' * (256 * 1024)
+        h = get_lbry_hash_obj()
+        h.update(blob_bytes)
+        server_blob = self.server_blob_manager.get_blob(h.hexdigest(), len(blob_bytes))
+        server_blob.open_for_writing().write(blob_bytes)
+        await server_blob.finished_writing.wait()
+        self.server.upload_scheduler = UploadScheduler(self.loop, peer_rate_limit=2 ** 20)
+
+        client_blob = self.client_blob_manager.get_blob(server_blob.blob_hash)
+        start = self.loop.time()
+        received, transport = await request_blob(self.loop, client_blob, self.server_from_client.address,
+                                                 self.server_from_client.tcp_port, 2, 3)
+        self.addCleanup(transport.close)
+        # four 64KB chunks at 1MB/s, the first one goes out right away
+        self.assertGreaterEqual(self.loop.time() - start, 0.18)
+        self.assertEqual(len(blob_bytes), received)
+        await client_blob.finished_writing.wait()
+        self.assertTrue(client_blob.get_is_verified())
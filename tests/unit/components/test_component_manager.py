@@ -6,7 +6,7 @@ from lbrynet.extras.daemon.ComponentManager import ComponentManager
 from lbrynet.extras.daemon.Components import DATABASE_COMPONENT, DHT_COMPONENT
 from lbrynet.extras.daemon.Components import HASH_ANNOUNCER_COMPONENT, UPNP_COMPONENT
 from lbrynet.extras.daemon.Components import PEER_PROTOCOL_SERVER_COMPONENT, EXCHANGE_RATE_MANAGER_COMPONENT
-from lbrynet.extras.daemon.Components import HEADERS_COMPONENT
+from lbrynet.extras.daemon.Components import HEADERS_COMPONENT, BLOB_SCRUBBER_COMPONENT
 from lbrynet.extras.daemon import Components
 
 
@@ -26,6 +26,7 @@ class TestComponentManager(AsyncioTestCase):
                 Components.WalletComponent
             ],
             [
+                Components.BlobScrubberComponent,
                 Components.HashAnnouncerComponent,
                 Components.PeerProtocolServerComponent,
                 Components.StreamManagerComponent,
@@ -152,7 +153,7 @@ class TestComponentManagerProperStart(AdvanceTimeTestCase):
             skip_components=[
                 DATABASE_COMPONENT, DHT_COMPONENT, HASH_ANNOUNCER_COMPONENT,
                 PEER_PROTOCOL_SERVER_COMPONENT, UPNP_COMPONENT,
-                HEADERS_COMPONENT, EXCHANGE_RATE_MANAGER_COMPONENT],
+                HEADERS_COMPONENT, EXCHANGE_RATE_MANAGER_COMPONENT, BLOB_SCRUBBER_COMPONENT],
             wallet=FakeDelayedWallet,
             stream_manager=FakeDelayedStreamManager,
             blob_manager=FakeDelayedBlobManager
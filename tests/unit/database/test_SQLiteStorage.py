@@ -120,6 +120,23 @@ class TestSQLiteStorage(StorageTest):
         blob_hashes = await self.storage.get_all_blob_hashes()
         self.assertEqual(blob_hashes, [])
 
+    async def test_write_behind_blob_updates(self):
+        self.storage.conf.blob_write_behind_interval = 60.0
+        blob_hashes = [random_lbry_hash() for _ in range(3)]
+        flushed = [self.storage.add_completed_blob(blob_hash, 100) for blob_hash in blob_hashes]
+        flushed.append(self.storage.update_last_announced_blobs(blob_hashes[:1]))
+        self.assertEqual(1, len(set(flushed)))
+        self.assertEqual([], await self.storage.get_all_finished_blobs())
+
+        # a queued update for a blob that gets deleted isn't written
+        await self.storage.delete_blobs_from_db(blob_hashes[2:])
+        await self.storage.flush_queued_writes()
+        self.assertTrue(flushed[0].done())
+        self.assertSetEqual(set(blob_hashes[:2]), set(await self.storage.get_all_finished_blobs()))
+        self.assertNotEqual(0, await self.storage.run_and_return_one_or_none(
+            "select last_announced_time from blob where blob_hash=?", blob_hashes[0]
+        ))
+
     async def test_supports_storage(self):
         claim_ids = [random_lbry_hash() for _ in range(10)]
         random_supports = [{
@@ -91,6 +91,66 @@ class TestStreamAssembler(AsyncioTestCase):
         self.cleartext = os.urandom(20000000)
         await self.test_create_and_decrypt_one_blob_stream()
 
+    async def test_resume_out_of_order_assembly(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(lambda: shutil.rmtree(tmp_dir))
+        download_dir = tempfile.mkdtemp()
+        self.addCleanup(lambda: shutil.rmtree(download_dir))
+        self.cleartext = os.urandom(MAX_BLOB_SIZE * 4)
+        file_path = os.path.join(tmp_dir, "test_file")
+        with open(file_path, 'wb') as f:
+            f.write(self.cleartext)
+        sd = await StreamDescriptor.create_stream(self.loop, tmp_dir, file_path, key=self.key)
+        for blob_hash in [sd.sd_hash] + [blob_info.blob_hash for blob_info in sd.blobs[:-1]]:
+            shutil.copy(os.path.join(tmp_dir, blob_hash), os.path.join(download_dir, blob_hash))
+        storage = SQLiteStorage(Config(), os.path.join(download_dir, "lbrynet.sqlite"))
+        await storage.open()
+        self.addCleanup(storage.close)
+        blob_manager = BlobFileManager(self.loop, download_dir, storage)
+        await blob_manager.setup()
+        output_path = os.path.join(download_dir, "test_file")
+
+        # the second blob is held back, the ones after it are written first
+        held_back = sd.blobs[1].blob_hash
+        release = asyncio.Event(loop=self.loop)
+
+        class HoldingAssembler(StreamAssembler):
+            assemble_window = 3
+
+            async def get_stream_blob(self, blob_info):
+                if blob_info.blob_hash == held_back:
+                    await release.wait()
+                return await super().get_stream_blob(blob_info)
+
+        async def wait_for_decrypted_blobs(expected: bytes):
+            while await storage.get_decrypted_blobs(sd.stream_hash, output_path) != expected:
+                await asyncio.sleep(0.01)
+
+        assembler = HoldingAssembler(self.loop, blob_manager, sd.sd_hash)
+        task = self.loop.create_task(assembler.assemble_decrypted_stream(download_dir))
+        await asyncio.wait_for(wait_for_decrypted_blobs(bytes([0b11101])), 5)
+        task.cancel()
+        await asyncio.wait([task])
+        self.assertTrue(os.path.isfile(output_path))
+        self.assertFalse(assembler.stream_finished_event.is_set())
+
+        # a new assembly to the same file only decrypts the missing blob
+        decrypted = []
+
+        class CountingAssembler(StreamAssembler):
+            async def _decrypt_blob(self, blob, blob_info, key):
+                decrypted.append(blob_info.blob_num)
+                return await super()._decrypt_blob(blob, blob_info, key)
+
+        assembler = CountingAssembler(self.loop, blob_manager, sd.sd_hash)
+        await assembler.assemble_decrypted_stream(download_dir, "test_file")
+        self.assertListEqual([1], decrypted)
+        self.assertTrue(assembler.stream_finished_event.is_set())
+        self.assertEqual(len(self.cleartext), assembler.written_bytes)
+        with open(output_path, "rb") as f:
+            self.assertEqual(self.cleartext, f.read())
+        self.assertIsNone(await storage.get_decrypted_blobs(sd.stream_hash, output_path))
+
     async def test_create_managed_stream_announces(self):
         # setup a blob manager
         storage = SQLiteStorage(Config(), ":memory:")
@@ -106,7 +166,9 @@ class TestStreamAssembler(AsyncioTestCase):
         with open(file_path, 'wb') as f:
             f.write(b'testtest')
 
-        stream = await stream_manager.create_stream(file_path)
+        with self.assertLogs('lbrynet.stream.stream_manager', level='INFO') as logs:
+            stream = await stream_manager.create_stream(file_path)
+        self.assertIn("publishing test_file: encrypted 100% (8/8 bytes)", logs.output[-1])
         self.assertEqual(
             [stream.sd_hash, stream.descriptor.blobs[0].blob_hash],
             await storage.get_blobs_to_announce())
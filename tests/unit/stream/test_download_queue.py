@@ -0,0 +1,53 @@
+import asyncio
+from torba.testcase import AsyncioTestCase
+from lbrynet.conf import Config
+from lbrynet.stream.download_queue import DownloadQueue, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+
+
+class TestDownloadQueue(AsyncioTestCase):
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+        self.config = Config(max_concurrent_downloads=1)
+        self.paused = []
+        self.queue = DownloadQueue(self.loop, self.config, self.paused.append)
+
+    def acquire(self, sd_hash: str, priority: int) -> asyncio.Task:
+        return self.loop.create_task(self.queue.acquire(sd_hash, priority))
+
+    async def test_waits_in_order_of_priority(self):
+        await self.queue.acquire('a', PRIORITY_INTERACTIVE)
+        background = self.acquire('b', PRIORITY_BACKGROUND)
+        await asyncio.sleep(0)
+        interactive = self.acquire('c', PRIORITY_INTERACTIVE)
+        await asyncio.sleep(0)
+        self.assertListEqual(['c', 'b'], self.queue.queued)
+        self.assertListEqual([], self.paused)  # interactive downloads aren't paused
+
+        self.queue.release('a')
+        await interactive
+        self.assertFalse(background.done())
+        self.queue.release('c')
+        await background
+        self.assertDictEqual({'b': PRIORITY_BACKGROUND}, self.queue.active)
+
+    async def test_interactive_download_pauses_background_one(self):
+        await self.queue.acquire('a', PRIORITY_BACKGROUND)
+        await asyncio.wait_for(self.queue.acquire('b', PRIORITY_INTERACTIVE), 1)
+        self.assertListEqual(['a'], self.paused)
+        self.assertDictEqual({'b': PRIORITY_INTERACTIVE}, self.queue.active)
+
+    async def test_cancel_waiting(self):
+        await self.queue.acquire('a', PRIORITY_INTERACTIVE)
+        waiting = self.acquire('b', PRIORITY_BACKGROUND)
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.sleep(0)
+        self.assertListEqual([], self.queue.queued)
+        self.queue.release('a')
+        self.assertDictEqual({}, self.queue.active)
+
+    async def test_unlimited(self):
+        self.config.max_concurrent_downloads = 0
+        for sd_hash in 'abc':
+            await asyncio.wait_for(self.queue.acquire(sd_hash, PRIORITY_BACKGROUND), 1)
+        self.assertEqual(3, len(self.queue.active))
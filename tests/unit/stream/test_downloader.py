@@ -5,7 +5,7 @@ from unittest import mock
 import asyncio
 
 from lbrynet.blob_exchange.serialization import BlobResponse
-from lbrynet.blob_exchange.server import BlobServerProtocol
+from lbrynet.blob_exchange.server import BlobServer, BlobServerProtocol
 from lbrynet.conf import Config
 from lbrynet.stream.descriptor import StreamDescriptor
 from lbrynet.stream.downloader import StreamDownloader
@@ -100,3 +100,36 @@ class TestStreamDownloader(BlobExchangeTestBase):
         self.assertEqual(0, len(self.client_blob_manager.completed_blob_hashes))
         await asyncio.wait_for(self._test_transfer_stream(10), timeout=2)
         self.assertEqual(11, len(self.client_blob_manager.completed_blob_hashes))
+
+    async def test_read_ahead_from_other_peers(self):
+        in_flight = set()
+        most_in_flight = []
+
+        class SlowServerProtocol(BlobServerProtocol):
+            async def handle_request(self, request, binary=False):
+                blob_request = request.get_blob_request()
+                if not blob_request:
+                    return await super().handle_request(request, binary)
+                in_flight.add(blob_request.requested_blob)
+                most_in_flight.append(len(in_flight))
+                try:
+                    await asyncio.sleep(0.05)
+                    return await super().handle_request(request, binary)
+                finally:
+                    in_flight.discard(blob_request.requested_blob)
+
+        second_server = BlobServer(self.loop, self.server_blob_manager, 'bQEaw42GXsgCAGio1nxFncJSyRmnztSCjP')
+        self.server.server_protocol_class = second_server.server_protocol_class = SlowServerProtocol
+        second_server.start_server(33336, '127.0.0.1')
+        self.addCleanup(second_server.stop_server)
+        await second_server.started_listening.wait()
+        second_peer = KademliaPeer(self.loop, "127.0.0.1", b'2' * 48, tcp_port=33336)
+
+        def _mock_accumulate_peers(q1, q2):
+            async def _task():
+                pass
+            q2.put_nowait([self.server_from_client, second_peer])
+            return q2, self.loop.create_task(_task())
+
+        await self._test_transfer_stream(6, _mock_accumulate_peers)
+        self.assertGreater(max(most_in_flight), 1)
@@ -3,6 +3,7 @@ import asyncio
 import tempfile
 import shutil
 import json
+import hashlib
 
 from lbrynet.blob.blob_file import BlobFile
 from torba.testcase import AsyncioTestCase
@@ -46,6 +47,28 @@ class TestStreamDescriptor(AsyncioTestCase):
         descriptor = await self.blob_manager.get_stream_descriptor(self.sd_hash)
         self.assertEqual(descriptor.calculate_sd_hash(), self.sd_hash)
 
+    async def test_parallel_create_stream(self):
+        ivs = [os.urandom(16) for _ in range(len(self.descriptor.blobs))]
+        sequential_dir, parallel_dir = tempfile.mkdtemp(), tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, sequential_dir)
+        self.addCleanup(shutil.rmtree, parallel_dir)
+        progress = []
+        sequential = await StreamDescriptor.create_stream(
+            self.loop, sequential_dir, self.file_path, key=self.key, iv_generator=iter(ivs), max_workers=1
+        )
+        parallel = await StreamDescriptor.create_stream(
+            self.loop, parallel_dir, self.file_path, key=self.key, iv_generator=iter(ivs), max_workers=4,
+            progress_callback=lambda done, total: progress.append((done, total))
+        )
+        self.assertEqual(sequential.sd_hash, parallel.sd_hash)
+        self.assertEqual(hashlib.sha256(self.cleartext).digest(), parallel.file_sha256)
+        self.assertListEqual([blob.blob_num for blob in parallel.blobs], list(range(len(parallel.blobs))))
+        # called once per data blob, the stream terminator isn't counted
+        self.assertEqual(len(parallel.blobs) - 1, len(progress))
+        self.assertEqual((len(self.cleartext), len(self.cleartext)), progress[-1])
+        for blob in parallel.blobs[:-1]:
+            self.assertTrue(os.path.isfile(os.path.join(parallel_dir, blob.blob_hash)))
+
     async def test_missing_terminator(self):
         self.sd_dict['blobs'].pop()
         await self._test_invalid_sd()
@@ -14,6 +14,7 @@ from lbrynet.wallet.manager import LbryWalletManager
 from lbrynet.extras.daemon.analytics import AnalyticsManager
 from lbrynet.stream.stream_manager import StreamManager
 from lbrynet.stream.descriptor import StreamDescriptor
+from lbrynet.stream.download_queue import PRIORITY_INTERACTIVE
 from lbrynet.dht.node import Node
 from lbrynet.dht.protocol.protocol import KademliaProtocol
 from lbrynet.dht.protocol.routing_table import TreeRoutingTable
@@ -205,6 +206,7 @@ class TestStreamManager(BlobExchangeTestBase):
 
     async def test_download_stop_resume_delete(self):
         await self.setup_stream_manager()
+        self.client_config.max_download_connections = 3
         received = []
         expected_events = ['Time To First Bytes', 'Download Finished']
 
@@ -220,6 +222,9 @@ class TestStreamManager(BlobExchangeTestBase):
         self.assertTrue(stream.running)
         self.assertFalse(stream.finished)
         self.assertTrue(os.path.isfile(os.path.join(self.client_dir, "test_file")))
+        # the download holds a slot and gets the connection budget
+        self.assertDictEqual({stream.sd_hash: stream.downloader}, self.stream_manager.running_downloaders)
+        self.assertEqual(3, stream.downloader.blob_downloader.max_connections)
         stored_status = await self.client_storage.run_and_return_one_or_none(
             "select status from file where stream_hash=?", stream_hash
         )
@@ -229,7 +234,8 @@ class TestStreamManager(BlobExchangeTestBase):
 
         self.assertFalse(stream.finished)
         self.assertFalse(stream.running)
-        self.assertFalse(os.path.isfile(os.path.join(self.client_dir, "test_file")))
+        self.assertDictEqual({}, self.stream_manager.running_downloaders)
+        self.assertTrue(os.path.isfile(os.path.join(self.client_dir, "test_file")))  # kept to resume into
         stored_status = await self.client_storage.run_and_return_one_or_none(
             "select status from file where stream_hash=?", stream_hash
         )
@@ -343,3 +349,79 @@ class TestStreamManager(BlobExchangeTestBase):
 
     def test_download_then_recover_old_sort_stream_on_startup(self):
         return self.test_download_then_recover_stream_on_startup(old_sort=True)
+
+    async def test_download_blobs_only_then_save_file(self):
+        self.client_config.save_files = False
+        await self.setup_stream_manager()
+        stream = await self.stream_manager.download_stream_from_uri(self.uri, self.exchange_rate_manager)
+        await stream.downloader.stream_finished_event.wait()
+        await asyncio.sleep(0, loop=self.loop)
+        self.assertTrue(stream.finished)
+        self.assertEqual(0, stream.blobs_remaining)
+        self.assertIsNone(stream.full_path)
+        self.assertFalse(os.path.isfile(os.path.join(self.client_dir, "test_file")))
+        stored_file = await self.client_storage.run_and_return_one_or_none(
+            "select file_name, download_directory, status from file where stream_hash=?", stream.stream_hash
+        )
+        self.assertEqual(('', '', 'finished'), tuple(stored_file))
+
+        # the stream is loaded back without a file and can be saved later
+        self.stream_manager.stop()
+        await self.stream_manager.start()
+        await self.stream_manager.resume_downloading_task
+        stream = list(self.stream_manager.streams)[0]
+        self.assertIsNone(stream.file_name)
+        self.assertTrue(stream.finished)
+        self.assertTrue(await self.stream_manager.save_file(stream))
+        await stream.downloader.stream_finished_event.wait()
+        self.assertEqual("test_file", stream.file_name)
+        with open(os.path.join(self.client_dir, "test_file"), 'rb') as f, \
+                open(os.path.join(self.server_dir, "test_file"), 'rb') as expected:
+            self.assertEqual(expected.read(), f.read())
+
+    async def test_failed_download_gives_back_its_slot(self):
+        await self.setup_stream_manager()
+        stream = await self.stream_manager.download_stream_from_uri(self.uri, self.exchange_rate_manager)
+        await self.stream_manager.stop_stream(stream)
+        stream.downloader = self.stream_manager.make_downloader(
+            stream.sd_hash, os.path.join(self.client_dir, "missing"), stream.file_name
+        )
+        self.stream_manager._queue_download(stream)
+        await self.stream_manager.queued_downloads[stream.sd_hash]
+        with self.assertRaises(OSError):
+            await stream.downloader.assemble_task
+        await asyncio.sleep(0, loop=self.loop)
+        self.assertDictEqual({}, self.stream_manager.running_downloaders)
+        self.assertDictEqual({}, self.stream_manager.download_queue.active)
+
+    async def test_resume_into_default_directory_when_directory_is_gone(self):
+        await self.setup_stream_manager()
+        stream = await self.stream_manager.download_stream_from_uri(self.uri, self.exchange_rate_manager)
+        self.stream_manager.stop()
+        missing_dir = os.path.join(self.client_dir, "missing")
+        await self.client_storage.change_file_download_dir_and_file_name(
+            stream.stream_hash, missing_dir, stream.file_name
+        )
+        await self.stream_manager.start()
+        await self.stream_manager.resume_downloading_task
+        stream = list(self.stream_manager.streams)[0]
+        self.assertEqual(self.client_config.download_dir, stream.download_directory)
+        self.assertEqual(self.client_config.download_dir, stream.downloader.output_dir)
+        await stream.downloader.stream_finished_event.wait()
+        self.assertTrue(stream.output_file_exists)
+
+    async def test_waiting_for_a_slot_doesnt_time_out(self):
+        await self.setup_stream_manager()
+        self.client_config.max_concurrent_downloads = 1
+        download_queue = self.stream_manager.download_queue
+        await download_queue.acquire('a' * 96, PRIORITY_INTERACTIVE)
+        download = self.loop.create_task(
+            self.stream_manager.download_stream_from_uri(self.uri, self.exchange_rate_manager, timeout=0.5)
+        )
+        await asyncio.sleep(0.6, loop=self.loop)
+        self.assertFalse(download.done())
+        self.assertListEqual([self.sd_hash], download_queue.queued)
+        download_queue.release('a' * 96)
+        stream = await download
+        await stream.downloader.stream_finished_event.wait()
+        self.assertTrue(stream.finished)
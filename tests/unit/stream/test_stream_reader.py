@@ -0,0 +1,120 @@
+import os
+import asyncio
+from unittest import mock
+import aiohttp
+from aiohttp import web
+from aiohttp import test_utils
+
+from lbrynet.extras.daemon.Components import STREAM_MANAGER_COMPONENT
+from lbrynet.extras.daemon.Daemon import Daemon
+from lbrynet.stream.descriptor import StreamDescriptor
+from lbrynet.stream.stream_manager import StreamManager
+from lbrynet.stream.stream_reader import BLOB_DATA_SIZE
+from lbrynet.stream.download_queue import PRIORITY_INTERACTIVE
+from lbrynet.dht.node import Node
+from tests.unit.blob_exchange.test_transfer_blob import BlobExchangeTestBase
+
+
+class TestStreamReader(BlobExchangeTestBase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.stream_bytes = os.urandom(BLOB_DATA_SIZE * 2 + 1000)
+        file_path = os.path.join(self.server_dir, "test_file.mp4")
+        with open(file_path, 'wb') as f:
+            f.write(self.stream_bytes)
+        descriptor = await StreamDescriptor.create_stream(self.loop, self.server_blob_manager.blob_dir, file_path)
+        self.sd_hash = descriptor.sd_hash
+        self.blob_hashes = [blob.blob_hash for blob in descriptor.blobs[:-1]]
+
+        node = mock.Mock(spec=Node)
+
+        def _mock_accumulate_peers(q1, q2):
+            async def _task():
+                pass
+            q2.put_nowait([self.server_from_client])
+            return q2, self.loop.create_task(_task())
+
+        node.accumulate_peers = _mock_accumulate_peers
+        self.stream_manager = StreamManager(
+            self.loop, self.client_config, self.client_blob_manager, None, self.client_storage, node
+        )
+        self.addCleanup(self.stream_manager.stop)
+
+    async def _read(self, reader, start: int, end: int) -> bytes:
+        data = b''
+        async for chunk in reader.read(start, end):
+            data += chunk
+        return data
+
+    async def test_read_ranges(self):
+        reader = await self.stream_manager.get_stream_reader(self.sd_hash)
+        self.assertEqual(len(self.stream_bytes), reader.size)
+        # only the last blob was needed to learn the size
+        self.assertFalse(self.client_blob_manager.is_blob_verified(self.blob_hashes[0]))
+        self.assertTrue(self.client_blob_manager.is_blob_verified(self.blob_hashes[-1]))
+
+        start = BLOB_DATA_SIZE * 2 - 10
+        self.assertEqual(self.stream_bytes[start:start + 20], await self._read(reader, start, start + 19))
+        self.assertEqual(self.stream_bytes[:100], await self._read(reader, 0, 99))
+        self.assertEqual(self.stream_bytes, await self._read(reader, 0, reader.size - 1))
+
+        # the reader is kept for the next requests until it has been idle for a while
+        self.stream_manager.release_stream_reader(reader)
+        self.assertIs(reader, await self.stream_manager.get_stream_reader(self.sd_hash))
+        self.stream_manager.release_stream_reader(reader)
+        self.assertIsNotNone(reader.close_handle)
+
+    async def test_reader_takes_a_download_slot(self):
+        self.client_config.max_concurrent_downloads = 1
+        self.client_config.download_timeout = 0.5
+        download_queue = self.stream_manager.download_queue
+        slot = "reader:" + self.sd_hash
+        await download_queue.acquire('a' * 96, PRIORITY_INTERACTIVE)
+        # waiting for the slot doesn't count against the download timeout
+        getting = self.loop.create_task(self.stream_manager.get_stream_reader(self.sd_hash))
+        await asyncio.sleep(0.6, loop=self.loop)
+        self.assertFalse(getting.done())
+        self.assertListEqual([slot], download_queue.queued)
+        download_queue.release('a' * 96)
+        reader = await getting
+        self.assertIn(slot, download_queue.active)
+        self.assertIs(reader.downloader, self.stream_manager.running_downloaders[slot])
+        # the slot is given back once the reader isn't used, the idle reader is kept
+        self.stream_manager.release_stream_reader(reader)
+        self.assertNotIn(slot, download_queue.active)
+        self.assertIs(reader, self.stream_manager.stream_readers[self.sd_hash])
+
+    async def test_http_range_requests(self):
+        daemon = mock.Mock()
+        daemon.component_manager.get_components_status.return_value = {STREAM_MANAGER_COMPONENT: True}
+        daemon.stream_manager = self.stream_manager
+        app = web.Application()
+        app.router.add_get('/stream/{sd_hash}', lambda request: Daemon.handle_stream_range_request(daemon, request))
+        server = test_utils.TestServer(app)
+        await server.start_server()
+        self.addCleanup(server.close)
+        size = len(self.stream_bytes)
+
+        async with aiohttp.ClientSession() as session:
+            url = server.make_url(f'/stream/{self.sd_hash}')
+            async with session.get(url, headers={'Range': 'bytes=100-199'}) as response:
+                self.assertEqual(206, response.status)
+                self.assertEqual(f'bytes 100-199/{size}', response.headers['Content-Range'])
+                self.assertEqual('video/mp4', response.headers['Content-Type'])
+                self.assertEqual(self.stream_bytes[100:200], await response.read())
+            async with session.get(url, headers={'Range': 'bytes=-10'}) as response:
+                self.assertEqual(206, response.status)
+                self.assertEqual(self.stream_bytes[-10:], await response.read())
+            async with session.get(url, headers={'Range': f'bytes={BLOB_DATA_SIZE}-'}) as response:
+                self.assertEqual(f'bytes {BLOB_DATA_SIZE}-{size - 1}/{size}', response.headers['Content-Range'])
+                self.assertEqual(self.stream_bytes[BLOB_DATA_SIZE:], await response.read())
+            async with session.get(url) as response:
+                self.assertEqual(200, response.status)
+                self.assertEqual('bytes', response.headers['Accept-Ranges'])
+                self.assertEqual(self.stream_bytes, await response.read())
+            async with session.get(url, headers={'Range': f'bytes={size}-'}) as response:
+                self.assertEqual(416, response.status)
+                self.assertEqual(f'bytes */{size}', response.headers['Content-Range'])
+            async with session.get(server.make_url('/stream/abcd')) as response:
+                self.assertEqual(404, response.status)
+        await asyncio.sleep(0.01)